@@ -0,0 +1,82 @@
+"""Asyncio access to omdbapi used by ASGI application.
+
+Lookups run `api.services.get_omdb_movie` in a dedicated pool of threads,
+so they share its pooled session, retries, circuit breaker and cache and
+raise the same `requests` exceptions. Waiting for omdbapi holds only
+threads of this pool, which is as large as the connection pool of the
+session, not threads running Django views.
+
+Lookup holds the same advisory lock as movie creation in the view, so
+concurrent WSGI requests for the title wait for it instead of calling
+omdbapi too.
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+from django.utils.text import slugify
+
+from api import services
+from api.locks import AdvisoryLock
+from core import settings
+
+
+logger = logging.getLogger(__name__)
+
+# threads waiting for omdbapi, one per pooled connection
+executor = ThreadPoolExecutor(max_workers=settings.OMDB_API_POOL_SIZE)
+# lookups in progress by normalized title
+_in_flight = {}
+
+
+async def run_in_thread(func, *args, executor=None):
+    """Call function using database in executor thread."""
+    def call():
+        close_old_connections()
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(executor, call)
+
+
+def get_omdb_movie_locked(movie_title, use_cache):
+    """Get movie holding lock of its creation or None if it's taken.
+
+    Lock isn't waited for, request holding it calls omdbapi itself.
+    """
+    with AdvisoryLock('movie:' + slugify(movie_title), 0) as lock:
+        if not lock.acquired:
+            return None
+        return services.get_omdb_movie(movie_title, use_cache)
+
+
+async def get_omdb_movie_async(movie_title, use_cache=True):
+    """Get movie details from OMDB lookups cache or external omdbapi.
+
+    Asyncio version of `api.services.get_omdb_movie`. Concurrent lookups
+    of the same normalized title are merged - only the first one calls
+    omdbapi and the rest wait for its result.
+
+    :raise requests.exceptions.RequestException: OMDB API call failed
+
+    :param movie_title: unescaped movie title
+    :param use_cache: set to False to skip cache and always call omdbapi
+    :return: JSON with movie details or None if another request holds
+        lock of the movie creation
+    """
+    key = services.normalize_title(movie_title)
+    task = _in_flight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(run_in_thread(
+            get_omdb_movie_locked, movie_title, use_cache,
+            executor=executor,
+        ))
+        _in_flight[key] = task
+        task.add_done_callback(lambda _: _in_flight.pop(key, None))
+    else:
+        logger.debug('omdbapi lookup in progress: %s', movie_title)
+    # cancelled caller mustn't cancel lookup awaited by others
+    return await asyncio.shield(task)
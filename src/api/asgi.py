@@ -0,0 +1,214 @@
+"""ASGI application which doesn't hold a thread while calling omdbapi.
+
+Django 2.1 can't handle ASGI requests, so they're passed to the WSGI
+application running in a thread pool. Before POST /movies is passed on,
+movie is fetched from omdbapi by `api.aio` and handed to the view in
+`PREFETCHED_OMDB_MOVIE` key of WSGI environ.
+"""
+import asyncio
+import io
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from django.http import QueryDict
+from django.urls import Resolver404, resolve
+from django.utils.text import slugify
+from requests.exceptions import RequestException
+
+from api.aio import get_omdb_movie_async, run_in_thread
+from api.models import Movie
+from api.serializers import MovieRequestSerializer
+from api.utils import is_flag_set
+from core import settings
+
+
+# WSGI environ key of movie details or exception raised by omdbapi call
+PREFETCHED_OMDB_MOVIE = 'api.prefetched_omdb_movie'
+# size of response body read from WSGI application at once
+BODY_CHUNK_SIZE = 64 * 1024
+
+
+def get_path_info(scope):
+    """Return path of request below `root_path` application is mounted at."""
+    path = scope['path']
+    root_path = scope.get('root_path', '')
+    if root_path and path.startswith(root_path):
+        return path[len(root_path):]
+    return path
+
+
+def resolve_route(path_info):
+    """Return name of URL pattern matching path or None."""
+    try:
+        return resolve(path_info, settings.ROOT_URLCONF).url_name
+    except Resolver404:
+        return None
+
+
+def build_environ(scope, body):
+    """Return WSGI environ of ASGI HTTP request."""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+        'PATH_INFO': get_path_info(scope).encode().decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        value = value.decode('latin-1')
+        if name in environ:
+            value = environ[name] + ',' + value
+        environ[name] = value
+    return environ
+
+
+def read_chunks(chunks):
+    """Return next part of WSGI response body or None at its end."""
+    body = []
+    size = 0
+    for chunk in chunks:
+        body.append(chunk)
+        size += len(chunk)
+        if size >= BODY_CHUNK_SIZE:
+            break
+    if not body:
+        return None
+    return b''.join(body)
+
+
+def movie_exists(title):
+    """Return True if title is slug of a movie, its known variant or
+    pending movie, which the view answers without calling omdbapi.
+    """
+    return bool(Movie.objects.get_known_slugs(
+        [slugify(title)], include_pending=True
+    ))
+
+
+class ASGIHandler:
+    """ASGI 3 application passing requests to WSGI application."""
+    def __init__(self, wsgi_application, max_workers=None):
+        self.wsgi_application = wsgi_application
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or settings.ASGI_THREADS
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError('Unsupported scope type: ' + scope['type'])
+        body = b''
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        environ = build_environ(scope, body)
+        if (scope['method'] == 'POST' and
+                resolve_route(get_path_info(scope)) == 'movie-list'):
+            await self.prefetch_movie(environ, body)
+        await self.run_wsgi(environ, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def prefetch_movie(self, environ, body):
+        """Fetch movie from omdbapi for valid POST /movies request.
+
+        Invalid requests, titles of existing movies and movies created by
+        another request are left to the view which sends the same
+        response as to WSGI request. Requests
+        with `async` query param don't wait for omdbapi, the view only
+        enqueues their movie job.
+        """
+        if is_flag_set(QueryDict(environ['QUERY_STRING']), 'async'):
+            return
+        if not environ.get('CONTENT_TYPE', '').startswith(
+                'application/json'):
+            return
+        try:
+            data = json.loads(body.decode())
+        except ValueError:
+            return
+        movie_request = MovieRequestSerializer(data=data)
+        if not isinstance(data, dict) or not movie_request.is_valid():
+            return
+        title = movie_request.validated_data['title']
+        if await run_in_thread(movie_exists, title, executor=self.executor):
+            return
+        try:
+            details = await get_omdb_movie_async(title)
+        except RequestException as e:
+            details = e
+        # view of request holding the lock creates the movie, this one
+        # waits for it
+        if details is not None:
+            environ[PREFETCHED_OMDB_MOVIE] = details
+
+    async def run_wsgi(self, environ, send):
+        """Run WSGI application in one of the executor threads.
+
+        The whole request is handled by a single thread, as Django
+        expects, and response is sent through the event loop.
+        """
+        loop = asyncio.get_event_loop()
+
+        def send_threadsafe(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def start_response(status, headers, exc_info=None):
+            send_threadsafe({
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [
+                    (name.lower().encode('latin-1'), value.encode('latin-1'))
+                    for name, value in headers
+                ],
+            })
+
+        def call():
+            iterable = self.wsgi_application(environ, start_response)
+            try:
+                chunks = iter(iterable)
+                while True:
+                    body = read_chunks(chunks)
+                    if body is None:
+                        break
+                    send_threadsafe({
+                        'type': 'http.response.body',
+                        'body': body,
+                        'more_body': True,
+                    })
+                send_threadsafe({'type': 'http.response.body', 'body': b''})
+            finally:
+                if hasattr(iterable, 'close'):
+                    iterable.close()
+
+        await loop.run_in_executor(self.executor, call)
@@ -0,0 +1,144 @@
+"""Cache of /top responses keyed by requested date range.
+
+Every month has a generation counter, bumped atomically by writes of
+its comments, and movie writes bump generation of all lists. Key of a
+range contains digest of generations of its months, so invalidation only
+bumps counters and cached lists of old generations expire unused. Ranges
+longer than MAX_MONTHS use generation bumped by writes of all comments
+instead, so key is made of a bounded number of counters. Counters are
+kept in their own cache alias, so culling cached lists doesn't reset
+them to an earlier state. Generations are bumped after writes commit and
+key is made before the list is counted, so list counted while comments
+are written is cached under the old generation.
+"""
+import datetime
+import hashlib
+import logging
+
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils import timezone
+
+from core import settings
+
+
+logger = logging.getLogger(__name__)
+
+DATE_FORMAT = '%Y-%m-%d'
+# bumped by writes of movies, which are listed in every range
+GENERATION_KEY = 'top:generation'
+# bumped by writes of comments of any day, used by long ranges
+COMMENTS_GENERATION_KEY = 'top:generation:comments'
+MONTH_GENERATION_KEY = 'top:generation:{:04d}-{:02d}'
+MAX_MONTHS = 24
+HITS_KEY = 'top:hits'
+MISSES_KEY = 'top:misses'
+
+
+def get_cache():
+    return caches[settings.TOP_CACHE_ALIAS]
+
+
+def get_generations_cache():
+    return caches[settings.TOP_CACHE_GENERATIONS_ALIAS]
+
+
+def get_generation_keys(start, end):
+    """Return keys of generations of range from `start` to `end`
+    (exclusively).
+    """
+    start = datetime.datetime.strptime(start, DATE_FORMAT).date()
+    end = datetime.datetime.strptime(end, DATE_FORMAT).date()
+    if end <= start:
+        return [GENERATION_KEY]
+    last = end - datetime.timedelta(days=1)
+    first_month = start.year * 12 + start.month - 1
+    last_month = last.year * 12 + last.month - 1
+    if last_month - first_month >= MAX_MONTHS:
+        return [GENERATION_KEY, COMMENTS_GENERATION_KEY]
+    return [GENERATION_KEY] + [
+        MONTH_GENERATION_KEY.format(month // 12, month % 12 + 1)
+        for month in range(first_month, last_month + 1)
+    ]
+
+
+def make_key(start, end, variant=''):
+    """Return key of top list for range in current generation of its
+    months.
+
+    `variant` tells apart lists of the same range with different params.
+    """
+    keys = get_generation_keys(start, end)
+    generations = get_generations_cache().get_many(keys)
+    state = ':'.join(str(generations.get(key, 0)) for key in keys)
+    return 'top:{}:{}:{}:{}'.format(
+        start, end, variant, hashlib.md5(state.encode()).hexdigest()
+    )
+
+
+def get_timeout(end):
+    """Return cache timeout for range ending (exclusively) on `end`.
+
+    Local memory cache isn't invalidated by writes of other processes
+    (workers, commands), so its lists are cached shortly for any range.
+    """
+    today = timezone.now().strftime(DATE_FORMAT)
+    if end <= today and not isinstance(get_cache(), LocMemCache):
+        return settings.TOP_CACHE_PAST_TIMEOUT
+    return settings.TOP_CACHE_TIMEOUT
+
+
+def incr(key, cache=None):
+    cache = cache or get_cache()
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # key was removed between add and incr
+        cache.set(key, 1, timeout=None)
+
+
+def get_top(key):
+    """Return cached top list or None if it's not cached."""
+    movies = get_cache().get(key)
+    if movies is None:
+        incr(MISSES_KEY)
+    else:
+        incr(HITS_KEY)
+    return movies
+
+
+def set_top(key, end, movies):
+    """Cache top list under key made before it was counted."""
+    get_cache().set(key, movies, timeout=get_timeout(end))
+
+
+def invalidate_top(day=None):
+    """Invalidate cached top lists containing `day` or all if it's None.
+
+    Generation is bumped when the current transaction commits, list
+    counted before it would be cached under the new generation otherwise.
+    """
+    cache = get_generations_cache()
+    if day is None:
+        transaction.on_commit(lambda: incr(GENERATION_KEY, cache))
+        logger.debug('Invalidated all cached top lists')
+        return
+    key = MONTH_GENERATION_KEY.format(day.year, day.month)
+
+    def bump():
+        incr(key, cache)
+        incr(COMMENTS_GENERATION_KEY, cache)
+
+    transaction.on_commit(bump)
+    logger.debug('Invalidated cached top lists of %s', day)
+
+
+def top_cache_stats():
+    """Return number of /top cache hits and misses."""
+    counters = get_cache().get_many([HITS_KEY, MISSES_KEY])
+    return {
+        'hits': counters.get(HITS_KEY, 0),
+        'misses': counters.get(MISSES_KEY, 0),
+    }
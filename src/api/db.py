@@ -0,0 +1,104 @@
+"""Routing of read-heavy requests to database replicas.
+
+`ReplicaMiddleware` marks GET requests of lists, movies and top lists to
+read from one of DATABASE_REPLICAS, picked per request. Everything else
+(writes, transactions, commands and workers) uses the primary database.
+Client which has just written gets a cookie and reads from the primary
+until it expires, so it sees its own writes despite replication lag.
+"""
+import random
+import threading
+from contextlib import contextmanager
+from functools import partial
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core import settings
+
+
+_local = threading.local()
+
+
+def current_replica():
+    """Return replica alias used by reads of the current thread or None."""
+    return getattr(_local, 'replica', None)
+
+
+def set_replica(alias):
+    """Route reads of the current thread to `alias`, None stops it."""
+    _local.replica = alias
+
+
+@contextmanager
+def reading_primary():
+    """Route reads of the current thread to the primary inside the block."""
+    replica = current_replica()
+    set_replica(None)
+    try:
+        yield
+    finally:
+        set_replica(replica)
+
+
+def pick_replica():
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+class ReplicaRouter:
+    """Send reads of the thread to its replica set by `set_replica`.
+
+    Reads inside transaction of the primary (eg. advancing rolling
+    windows) use the primary, as they may depend on its locks and writes.
+    """
+    def db_for_read(self, model, **hints):
+        replica = current_replica()
+        if replica is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def close_if_unusable(connection):
+    """Close persistent connection which stopped working (eg. after
+    database restart or replica failover), if it wasn't checked yet.
+    """
+    if not getattr(connection, 'health_check_needed', False):
+        return
+    connection.health_check_needed = False
+    if connection.connection is None or connection.in_atomic_block:
+        return
+    if not connection.is_usable():
+        connection.close()
+
+
+def check_connections_on_first_use():
+    """Check connections of databases with CONN_HEALTH_CHECKS option when
+    request uses them for the first time, before it fails on broken one.
+
+    Like CONN_HEALTH_CHECKS of newer Django, connections which request
+    doesn't use (eg. of other replicas) aren't queried.
+    """
+    for connection in connections.all():
+        if not connection.settings_dict.get('CONN_HEALTH_CHECKS'):
+            continue
+        if not hasattr(connection, 'health_check_needed'):
+            connection.ensure_connection = partial(
+                ensure_checked_connection, connection,
+                connection.ensure_connection,
+            )
+        connection.health_check_needed = True
+
+
+def ensure_checked_connection(connection, ensure_connection):
+    """`ensure_connection` of connection checked on first use."""
+    close_if_unusable(connection)
+    ensure_connection()
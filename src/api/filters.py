@@ -0,0 +1,119 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import F
+from rest_framework import exceptions
+
+from api.models import Movie
+from api.projection import split_param
+
+
+def parse_rating(value):
+    try:
+        rating = Decimal(value)
+    except InvalidOperation:
+        raise ValueError(value)
+    if not rating.is_finite():
+        raise ValueError(value)
+    return rating
+
+
+class MovieFilter:
+    """Filters and ordering of movies requested by query params.
+
+    Params filter typed columns extracted from details at write time, so
+    they're answered by indexes instead of scanning details of all movies:
+    `year`, `year_gte`, `year_lte`, `imdb_rating_gte`, `imdb_rating_lte`,
+    `runtime_gte`, `runtime_lte` and `genre` (comma separated genres, movie
+    has to have all of them). `ordering` is comma separated list of fields,
+    prefixed with `-` for descending order. Movies with unknown value are
+    always ordered last.
+    """
+    RANGE_FIELDS = {
+        'year': int,
+        'imdb_rating': parse_rating,
+        'runtime': int,
+    }
+    LOOKUPS = ('gte', 'lte')
+    EXACT_FIELDS = ('year',)
+    ORDERING_FIELDS = (
+        'id', 'title', 'year', 'imdb_rating', 'runtime', 'comment_count',
+        'last_comment_at',
+    )
+
+    def __init__(self, filters=None, genres=None, ordering=None):
+        self.filters = filters or {}
+        self.genres = genres or []
+        self.ordering = ordering or []
+
+    @classmethod
+    def get_params(cls):
+        """Return query params of filters by lookup they're applied with."""
+        params = {field: field for field in cls.EXACT_FIELDS}
+        for field in cls.RANGE_FIELDS:
+            for lookup in cls.LOOKUPS:
+                name = '{}_{}'.format(field, lookup)
+                params[name] = '{}__{}'.format(field, lookup)
+        return params
+
+    @classmethod
+    def from_query_params(cls, params):
+        """Return filter of requested movies.
+
+        :raise rest_framework.exceptions.ValidationError: invalid values
+        """
+        errors = {}
+        filters = {}
+        for param, lookup in cls.get_params().items():
+            if param not in params:
+                continue
+            parse = cls.RANGE_FIELDS[lookup.split('__')[0]]
+            try:
+                filters[lookup] = parse(params[param])
+            except ValueError:
+                errors[param] = ['A valid number is required.']
+        genres = [
+            genre.lower() for genre in split_param(params.get('genre', ''))
+        ]
+        ordering = split_param(params.get('ordering', ''))
+        unknown_fields = [
+            field for field in ordering
+            if field.lstrip('-') not in cls.ORDERING_FIELDS
+        ]
+        if unknown_fields:
+            errors['ordering'] = [
+                'Unknown fields: {}. Expected: {}.'.format(
+                    ', '.join(unknown_fields), ', '.join(cls.ORDERING_FIELDS)
+                )
+            ]
+        if errors:
+            raise exceptions.ValidationError(errors)
+        return cls(filters, genres, ordering)
+
+    def filter(self, queryset):
+        """Return queryset of movies matching filters."""
+        if self.filters:
+            queryset = queryset.filter(**self.filters)
+        if self.genres:
+            # uses GIN index on genres
+            queryset = queryset.filter(genres__contains=self.genres)
+        return queryset
+
+    def get_ordering(self):
+        """Return order_by expressions, `id` makes the order stable."""
+        expressions = []
+        for field in self.ordering:
+            name = field.lstrip('-')
+            if not Movie._meta.get_field(name).null:
+                # plain order matches indexes of not null fields
+                expressions.append(field)
+            elif field.startswith('-'):
+                expressions.append(F(name).desc(nulls_last=True))
+            else:
+                expressions.append(F(name).asc(nulls_last=True))
+        return expressions + ['id']
+
+    def apply(self, queryset):
+        queryset = self.filter(queryset)
+        if self.ordering:
+            queryset = queryset.order_by(*self.get_ordering())
+        return queryset
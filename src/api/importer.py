@@ -0,0 +1,157 @@
+import logging
+
+from django.db import IntegrityError, transaction
+from django.utils.text import slugify
+from requests.exceptions import HTTPError
+from rest_framework import status
+
+from api.cache import invalidate_top
+from api.models import Movie, MovieAlias, Version
+from api.serializers import MovieSerializer
+from api.services import get_omdb_movies
+
+
+logger = logging.getLogger(__name__)
+
+CREATED = 'created'
+EXISTS = 'exists'
+NOT_FOUND = 'not found'
+UPSTREAM_ERROR = 'upstream error'
+
+
+def movie_exists_error():
+    """Return status and data of response to already existing movie."""
+    return status.HTTP_409_CONFLICT, {
+        'title': ['Movie with given title already exists.']
+    }
+
+
+def omdb_error(exception):
+    """Return status and data of response to failed OMDB API call."""
+    if isinstance(exception, HTTPError):
+        logger.error(
+            'omdabpi http error: %s - %r', exception.errno, exception.strerror
+        )
+        message = exception.strerror
+    else:
+        logger.error('omdbapi raised exception: %r', exception)
+        message = 'External service is unavailable. Please try again later.'
+    return status.HTTP_503_SERVICE_UNAVAILABLE, {'OMDB API': [message]}
+
+
+def make_result(title, result, response_status, data):
+    return {
+        'title': title,
+        'result': result,
+        'status': response_status,
+        'data': data,
+    }
+
+
+def save_movies(movies):
+    """Insert movies, the ones which already exist are left without pk.
+
+    Movies are inserted with one query, if any of them was inserted in
+    the meantime by another request they are saved one by one.
+    """
+    try:
+        with transaction.atomic():
+            Movie.objects.bulk_create(movies)
+        return
+    except IntegrityError:
+        pass
+    for movie in movies:
+        try:
+            with transaction.atomic():
+                movie.save()
+        except IntegrityError:
+            movie.pk = None
+
+
+def import_movies(titles, max_workers=None):
+    """Create movies for many titles at once.
+
+    Titles of existing movies and their known variants are skipped using
+    one query, the rest is fetched from OMDB API concurrently and inserted
+    in bulk. Slugs of found titles are saved as aliases of the movies.
+
+    :param titles: list of movie titles
+    :param max_workers: number of concurrent OMDB API requests
+    :return: list of per title results - dicts with `title`, `result`
+        (created, exists, not found or upstream error) and `status` and
+        `data` of response which POST /movies would send for the title
+    """
+    slugs = {title: slugify(title) for title in titles}
+    existing_slugs = Movie.objects.get_known_slugs(set(slugs.values()))
+    new_titles = []
+    for title in titles:
+        if slugs[title] not in existing_slugs:
+            new_titles.append(title)
+            # following titles with the same slug are duplicates
+            existing_slugs.add(slugs[title])
+    details = get_omdb_movies(new_titles, max_workers=max_workers)
+
+    # movies found by incomplete title may exist under the full title
+    found_titles = [
+        title for title in new_titles
+        if not isinstance(details[title], Exception)
+    ]
+    canonical_slugs = {
+        title: slugify(details[title]['Title']) for title in found_titles
+    }
+    existing_canonical_slugs = set(Movie.objects.filter(
+        slug__in=set(canonical_slugs.values())
+    ).values_list('slug', flat=True))
+    movies = {}
+    for title in found_titles:
+        slug = canonical_slugs[title]
+        if slug in existing_canonical_slugs:
+            continue
+        existing_canonical_slugs.add(slug)
+        movies[title] = Movie(title=details[title]['Title'], slug=slug)
+        movies[title].set_details(details[title])
+    if movies:
+        save_movies(list(movies.values()))
+        # signals aren't sent by bulk_create
+        invalidate_top()
+        Version.objects.bump(Version.MOVIES)
+    MovieAlias.objects.add({
+        slugs[title]: canonical_slugs[title] for title in found_titles
+    })
+
+    results = {}
+    for title in new_titles:
+        movie = movies.get(title)
+        if isinstance(details[title], Exception):
+            result = NOT_FOUND if details[title].errno == 404 else (
+                UPSTREAM_ERROR
+            )
+            results[title] = make_result(
+                title, result, *omdb_error(details[title])
+            )
+        elif movie is None or movie.pk is None:
+            results[title] = make_result(
+                title, EXISTS, *movie_exists_error()
+            )
+        else:
+            logger.info('Created new movie: %s', movie.title)
+            results[title] = make_result(
+                title, CREATED, status.HTTP_201_CREATED,
+                MovieSerializer(movie).data,
+            )
+    # duplicated titles share result of the first one, unless it created
+    # the movie - then they're reported as existing
+    output = []
+    reported_titles = set()
+    new_titles_by_slug = {slugs[title]: title for title in new_titles}
+    for title in titles:
+        first_title = new_titles_by_slug.get(slugs[title])
+        result = results.get(first_title)
+        if first_title is None or first_title in reported_titles and (
+                result['result'] == CREATED):
+            result = make_result(title, EXISTS, *movie_exists_error())
+        elif first_title in reported_titles:
+            result = dict(result, title=title)
+        reported_titles.add(first_title)
+        output.append(result)
+    return output
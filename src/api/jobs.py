@@ -0,0 +1,157 @@
+import datetime
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.text import slugify
+from rest_framework import status
+
+from api.cache import invalidate_top
+from api.importer import CREATED, EXISTS, NOT_FOUND, UPSTREAM_ERROR
+from api.importer import make_result, movie_exists_error, omdb_error
+from api.models import Movie, MovieAlias, MovieJob
+from api.serializers import MovieSerializer
+from api.services import get_omdb_movies
+from core import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_movie(title):
+    """Create pending movie and job fetching its details.
+
+    :param title: movie title sent by client
+    :return: tuple of job and flag if it was created, job is None if
+        movie with the same slug or alias already exists
+    """
+    slug = slugify(title)
+    if MovieAlias.objects.filter(slug=slug).exists():
+        return None, False
+    try:
+        with transaction.atomic():
+            movie = Movie.objects.create(
+                title=title, details={}, slug=slug, pending=True
+            )
+            return MovieJob.objects.create(title=title, movie=movie), True
+    except IntegrityError:
+        pass
+    # the same title may be already waiting for details
+    return get_pending_job(slug), False
+
+
+def get_pending_job(slug):
+    """Return job fetching details of pending movie `slug` or None."""
+    return MovieJob.objects.filter(
+        movie__slug=slug, movie__pending=True, status=MovieJob.PENDING
+    ).order_by('id').last()
+
+
+def claim_jobs(batch_size):
+    """Return jobs ready to be processed and postpone them by lease time.
+
+    Jobs locked by other workers are skipped.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(MovieJob.objects.select_for_update(
+            skip_locked=True
+        ).filter(
+            status=MovieJob.PENDING, run_after__lte=now
+        ).order_by('run_after', 'id')[:batch_size])
+        if not jobs:
+            return jobs
+        MovieJob.objects.filter(id__in=[job.id for job in jobs]).update(
+            attempts=F('attempts') + 1,
+            run_after=now + datetime.timedelta(
+                seconds=settings.MOVIE_JOBS_LEASE
+            ),
+        )
+    for job in jobs:
+        job.attempts += 1
+    return jobs
+
+
+def publish_movie(movie, details):
+    """Fill pending movie with details, return False if movie exists.
+
+    Movie found by incomplete title may exist under the full title.
+    """
+    movie.title = details['Title']
+    movie.slug = slugify(movie.title)
+    movie.set_details(details)
+    movie.pending = False
+    try:
+        with transaction.atomic():
+            movie.save()
+    except IntegrityError:
+        return False
+    return True
+
+
+def finish_job(job, job_status, result, movie=None):
+    job.status = job_status
+    job.result = result
+    job.save()
+    if movie is not None and movie.pk is not None:
+        Movie.objects.filter(pk=movie.pk, pending=True).delete()
+
+
+def retry_job(job, result):
+    delay = settings.MOVIE_JOBS_RETRY_DELAY * 2 ** (job.attempts - 1)
+    job.run_after = timezone.now() + datetime.timedelta(seconds=delay)
+    # last error is visible until the next attempt
+    job.result = result
+    job.save()
+
+
+def process_jobs(jobs, max_workers=None, rate_limiter=None):
+    """Fetch details of claimed jobs from OMDB API and publish movies.
+
+    Failed calls are retried, except not found movies, until
+    MOVIE_JOBS_MAX_ATTEMPTS. Pending movies of failed jobs are deleted.
+
+    :return: list of results of processed jobs
+    """
+    details = get_omdb_movies(
+        [job.title for job in jobs],
+        max_workers=max_workers, rate_limiter=rate_limiter,
+    )
+    movies = Movie.objects.in_bulk([
+        job.movie_id for job in jobs if job.movie_id is not None
+    ])
+    results = []
+    aliases = {}
+    for job in jobs:
+        # pending movie may be deleted in the meantime
+        movie = movies.get(job.movie_id) or Movie()
+        job_details = details[job.title]
+        if isinstance(job_details, Exception):
+            not_found = job_details.errno == 404
+            result = make_result(
+                job.title, NOT_FOUND if not_found else UPSTREAM_ERROR,
+                *omdb_error(job_details)
+            )
+            if not not_found and (
+                    job.attempts < settings.MOVIE_JOBS_MAX_ATTEMPTS):
+                retry_job(job, result)
+            else:
+                finish_job(job, MovieJob.FAILED, result, movie)
+        elif publish_movie(movie, job_details):
+            aliases[slugify(job.title)] = movie.slug
+            logger.info('Created new movie: %s', job_details['Title'])
+            result = make_result(
+                job.title, CREATED, status.HTTP_201_CREATED,
+                MovieSerializer(movie).data,
+            )
+            finish_job(job, MovieJob.DONE, result)
+        else:
+            aliases[slugify(job.title)] = movie.slug
+            result = make_result(job.title, EXISTS, *movie_exists_error())
+            finish_job(job, MovieJob.FAILED, result, movie)
+        results.append(result)
+    MovieAlias.objects.add(aliases)
+    if any(result['result'] == CREATED for result in results):
+        invalidate_top()
+    return results
@@ -0,0 +1,172 @@
+"""Rolling window leaderboards kept up to date incrementally.
+
+Every window holds number of comments of movies from the last `days`
+days ending on `end` day. Comments written on days inside the window are
+counted as they arrive. When the day changes the window is advanced:
+counts of days leaving the window are subtracted and counts of days
+entering it are added from the daily rollup, with one query.
+
+Windows are advanced by `advance_rolling_windows` command, never by
+requests reading them. Until window is advanced to today, leaderboard is
+counted from the daily rollup instead. Writers hold shared transaction
+lock and advancing holds exclusive one, so comment is counted either by
+its writer or by the advance.
+"""
+import datetime
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Q, Sum, When
+from django.db.models.expressions import Window
+from django.db.models.functions import DenseRank
+from django.utils import timezone
+
+from api.locks import lock_transaction
+from api.models import DailyCommentCount, RollingCommentCount, RollingWindow
+from core import settings
+
+
+LOCK_NAME = 'rolling_windows'
+
+APPLY_DELTAS_SQL = '''
+INSERT INTO {table} (window_id, movie_id, count)
+SELECT %s, movie_id, delta FROM ({deltas}) AS deltas WHERE delta <> 0
+ON CONFLICT (window_id, movie_id)
+DO UPDATE SET count = {table}.count + EXCLUDED.count
+'''
+
+
+def get_windows():
+    """Return windows of configured sizes."""
+    return list(RollingWindow.objects.filter(
+        days__in=settings.TOP_ROLLING_WINDOWS
+    ))
+
+
+def can_advance(window, today):
+    """Check if window can be moved forward to `today` incrementally."""
+    return window.end is not None and (
+        0 < (today - window.end).days < window.days
+    )
+
+
+def get_deltas(window, today):
+    """Return query of count changes of movies when window ends `today`.
+
+    Window which can't be advanced is counted from scratch.
+    """
+    days = datetime.timedelta(days=window.days)
+    start = today - days
+    if can_advance(window, today):
+        entering = Q(day__gt=window.end, day__lte=today)
+        leaving = Q(day__gt=window.end - days, day__lte=start)
+        filters = entering | leaving
+    else:
+        entering = filters = Q(day__gt=start, day__lte=today)
+    return DailyCommentCount.objects.filter(filters).values(
+        'movie'
+    ).annotate(
+        delta=Sum(Case(
+            When(entering, then=F('count')),
+            default=-F('count'),
+            output_field=IntegerField(),
+        )),
+    ).order_by()
+
+
+def advance_window(window, today):
+    """Move window to end on `today`, it requires exclusive lock."""
+    if not can_advance(window, today):
+        # new, too far behind or moved back (eg. after clock change)
+        window.counts.all().delete()
+    deltas, params = get_deltas(window, today).query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(APPLY_DELTAS_SQL.format(
+            table=RollingCommentCount._meta.db_table, deltas=deltas,
+        ), [window.id] + list(params))
+    window.counts.filter(count__lte=0).delete()
+    window.end = today
+    window.save()
+
+
+def advance_windows(today):
+    """Create missing windows and advance them to end on `today`."""
+    with transaction.atomic():
+        lock_transaction(LOCK_NAME)
+        windows = {window.days: window for window in get_windows()}
+        for days in settings.TOP_ROLLING_WINDOWS:
+            window = windows.get(days)
+            if window is None:
+                window = RollingWindow.objects.create(days=days)
+            if window.end != today:
+                advance_window(window, today)
+
+
+def needs_advance(today):
+    """Check if any window is missing or doesn't end `today`."""
+    ends = dict(RollingWindow.objects.filter(
+        days__in=settings.TOP_ROLLING_WINDOWS
+    ).values_list('days', 'end'))
+    return any(
+        ends.get(days) != today for days in settings.TOP_ROLLING_WINDOWS
+    )
+
+
+def rebuild_windows(today=None):
+    """Rebuild all windows from the daily rollup."""
+    RollingWindow.objects.update(end=None)
+    advance_windows(today or timezone.now().date())
+
+
+class WindowsCounter:
+    def __init__(self, windows):
+        self.windows = windows
+
+    def add(self, movie_id, day, delta):
+        """Count comments of `movie_id` created on `day` in windows."""
+        for window in self.windows:
+            if window.contains(day):
+                RollingCommentCount.objects.add(window.id, movie_id, delta)
+
+
+@contextmanager
+def counting():
+    """Open transaction counting comments in windows.
+
+    Daily rollup has to be updated in the same transaction, otherwise
+    advancing window could count the comment again. Comments of days
+    after window end are counted when the window is advanced.
+    """
+    with transaction.atomic():
+        lock_transaction(LOCK_NAME, shared=True)
+        yield WindowsCounter(get_windows())
+
+
+def count_leaderboard(days, today):
+    """Return leaderboard counted from the daily rollup, it's used until
+    window is advanced to `today`.
+    """
+    start = today - datetime.timedelta(days=days)
+    rows = DailyCommentCount.objects.filter(
+        day__gt=start, day__lte=today,
+    ).values('movie_id').annotate(
+        total=Sum('count'),
+    ).filter(total__gt=0).annotate(
+        rank=Window(expression=DenseRank(), order_by=F('total').desc()),
+    ).order_by('-total', 'movie_id')
+    return [
+        {'movie_id': row['movie_id'], 'count': row['total'],
+         'rank': row['rank']}
+        for row in rows
+    ]
+
+
+def get_leaderboard(days):
+    """Return ranked movies by number of comments in the last `days`."""
+    today = timezone.now().date()
+    window = RollingWindow.objects.filter(days=days, end=today).first()
+    if window is None:
+        return count_leaderboard(days, today)
+    return list(window.counts.filter(count__gt=0).annotate(
+        rank=Window(expression=DenseRank(), order_by=F('count').desc()),
+    ).order_by('-count', 'movie_id').values('movie_id', 'count', 'rank'))
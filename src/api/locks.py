@@ -0,0 +1,67 @@
+"""PostgreSQL advisory locks coordinating requests of all processes."""
+import hashlib
+import time
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+# how often (in seconds) taken lock is checked again
+POLL_INTERVAL = 0.05
+
+
+def get_lock_id(name):
+    """Return signed 64-bit id of advisory lock with given name."""
+    digest = hashlib.blake2b(name.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+class AdvisoryLock:
+    """Session advisory lock used as a context manager.
+
+    When lock is held by another session it's polled for `timeout`
+    seconds. After the timeout block runs without the lock, so callers
+    must still handle conflicts. `acquired` tells if lock is held and
+    `waited` if another session held it before.
+    """
+    def __init__(self, name, timeout, using=DEFAULT_DB_ALIAS):
+        self.lock_id = get_lock_id(name)
+        self.timeout = timeout
+        self.using = using
+        self.acquired = False
+        self.waited = False
+
+    def try_lock(self):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute('SELECT pg_try_advisory_lock(%s)', [self.lock_id])
+            return cursor.fetchone()[0]
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            self.acquired = self.try_lock()
+            if self.acquired or time.monotonic() >= deadline:
+                return self
+            self.waited = True
+            time.sleep(POLL_INTERVAL)
+
+    def __exit__(self, *exc_info):
+        if not self.acquired:
+            return
+        with connections[self.using].cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_unlock(%s)', [self.lock_id])
+        self.acquired = False
+
+
+def lock_transaction(name, shared=False, using=DEFAULT_DB_ALIAS):
+    """Wait for advisory lock held until the end of current transaction.
+
+    Shared lock is held by many transactions at once, exclusive lock
+    waits until all of them end.
+    """
+    function = 'pg_advisory_xact_lock_shared' if shared else (
+        'pg_advisory_xact_lock'
+    )
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            'SELECT {}(%s)'.format(function), [get_lock_id(name)]
+        )
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from api import leaderboards
+
+
+class Command(BaseCommand):
+    help = (
+        'Advance rolling window leaderboards to end today, run it '
+        'continuously to move them soon after midnight.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=60,
+            help='Seconds between checks if windows end today.',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Advance windows once and exit.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            today = timezone.now().date()
+            # exclusive lock blocks comment writers, take it only if needed
+            if leaderboards.needs_advance(today):
+                leaderboards.advance_windows(today)
+                self.stdout.write('Advanced windows to {}.'.format(today))
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,91 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from api import leaderboards
+from api.locks import lock_transaction
+from api.models import Comment, Movie
+
+
+def get_comments(aggregate):
+    """Return subquery of aggregate over comments of outer movie."""
+    return Subquery(Comment.objects.filter(
+        movie_id=OuterRef('pk'),
+    ).order_by().values('movie_id').annotate(
+        value=aggregate,
+    ).values('value'))
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare comment counters of movies with Comment table and '
+        'optionally repair the wrong ones.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repair', action='store_true',
+            help='Write counted values to movies with wrong counters.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of movies checked in one transaction.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        comment_count = Coalesce(
+            get_comments(Count('id')), 0, output_field=IntegerField()
+        )
+        last_comment_at = get_comments(Max('created'))
+        movie_ids = Movie.objects.order_by('id').values_list('id', flat=True)
+        wrong = 0
+        last_id = 0
+        while True:
+            ids = list(movie_ids.filter(id__gt=last_id)[:batch_size])
+            if not ids:
+                break
+            last_id = ids[-1]
+            with transaction.atomic():
+                # comment writers hold shared lock while updating counters
+                lock_transaction(leaderboards.LOCK_NAME)
+                movies = Movie.objects.filter(id__in=ids).annotate(
+                    counted_comments=comment_count,
+                    counted_last_comment_at=last_comment_at,
+                ).values_list(
+                    'id', 'title', 'comment_count', 'counted_comments',
+                    'last_comment_at', 'counted_last_comment_at',
+                )
+                wrong_ids = []
+                for (movie_id, title, count, counted, last,
+                     counted_last) in movies:
+                    if count == counted and last == counted_last:
+                        continue
+                    wrong_ids.append(movie_id)
+                    self.stdout.write(
+                        '{} ({}): {} comments, last at {}, counted {} '
+                        'comments, last at {}'.format(
+                            title, movie_id, count, last, counted,
+                            counted_last,
+                        )
+                    )
+                wrong += len(wrong_ids)
+                if options['repair'] and wrong_ids:
+                    Movie.objects.filter(id__in=wrong_ids).update(
+                        comment_count=comment_count,
+                        last_comment_at=last_comment_at,
+                    )
+        if not wrong:
+            self.stdout.write(self.style.SUCCESS(
+                'Comment counters of all movies are correct.'
+            ))
+        elif options['repair']:
+            self.stdout.write(self.style.SUCCESS(
+                'Repaired comment counters of {} movies.'.format(wrong)
+            ))
+        else:
+            self.stdout.write(self.style.WARNING(
+                'Found wrong comment counters of {} movies, run with '
+                '--repair to fix them.'.format(wrong)
+            ))
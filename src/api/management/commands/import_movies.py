@@ -0,0 +1,57 @@
+import sys
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from api.importer import import_movies
+
+
+class Command(BaseCommand):
+    help = 'Create movies for titles read from file or stdin, one per line.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'file', nargs='?', default='-',
+            help='File with titles, reads stdin if omitted or "-".',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Number of titles imported at once.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Number of concurrent OMDB API requests.',
+        )
+
+    def handle(self, *args, **options):
+        if options['file'] == '-':
+            self.import_titles(sys.stdin, options)
+        else:
+            with open(options['file'], encoding='utf-8') as titles:
+                self.import_titles(titles, options)
+
+    def import_titles(self, lines, options):
+        summary = Counter()
+        batch = []
+        for line in lines:
+            title = line.strip()
+            if not title:
+                continue
+            batch.append(title)
+            if len(batch) >= options['batch_size']:
+                summary.update(self.import_batch(batch, options))
+                batch = []
+        if batch:
+            summary.update(self.import_batch(batch, options))
+        self.stdout.write(self.style.SUCCESS(', '.join(
+            '{}: {}'.format(result, count)
+            for result, count in sorted(summary.items())
+        ) or 'No titles to import.'))
+
+    def import_batch(self, titles, options):
+        results = import_movies(titles, max_workers=options['workers'])
+        for result in results:
+            self.stdout.write('{}: {}'.format(
+                result['title'], result['result']
+            ))
+        return [result['result'] for result in results]
@@ -0,0 +1,63 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.jobs import claim_jobs, process_jobs
+from api.services import RateLimiter
+from core import settings
+
+
+class Command(BaseCommand):
+    help = 'Fetch OMDB API details of movies created asynchronously.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.MOVIE_JOBS_BATCH_SIZE,
+            help='Number of jobs claimed at once.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Number of concurrent OMDB API requests.',
+        )
+        parser.add_argument(
+            '--rate', type=float, default=settings.MOVIE_JOBS_RATE_LIMIT,
+            help='Maximum number of OMDB API requests per second, '
+                 '0 disables the limit.',
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1,
+            help='Seconds to wait when there are no jobs.',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit when there are no more jobs ready.',
+        )
+
+    def handle(self, *args, **options):
+        workers = options['workers'] or settings.OMDB_API_WORKERS
+        rate_limiter = None
+        if options['rate']:
+            rate_limiter = RateLimiter(options['rate'], burst=workers)
+        summary = Counter()
+        while True:
+            close_old_connections()
+            jobs = claim_jobs(options['batch_size'])
+            if not jobs:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+            results = process_jobs(
+                jobs, max_workers=workers, rate_limiter=rate_limiter
+            )
+            for result in results:
+                self.stdout.write('{}: {}'.format(
+                    result['title'], result['result']
+                ))
+            summary.update(result['result'] for result in results)
+        self.stdout.write(self.style.SUCCESS(', '.join(
+            '{}: {}'.format(result, count)
+            for result, count in sorted(summary.items())
+        ) or 'No jobs to process.'))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+from api.leaderboards import rebuild_windows
+from api.models import Comment, DailyCommentCount
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild daily comments rollup used by /top from Comment table '
+        'and rolling leaderboards from the rollup.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of rollup rows inserted in one query.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        daily_counts = Comment.objects.annotate(
+            day=TruncDate('created'),
+        ).values('movie_id', 'day').annotate(
+            count=Count('id'),
+        ).order_by()
+        rows = 0
+        with transaction.atomic():
+            DailyCommentCount.objects.all().delete()
+            batch = []
+            for daily_count in daily_counts.iterator():
+                batch.append(DailyCommentCount(
+                    movie_id=daily_count['movie_id'],
+                    day=daily_count['day'],
+                    count=daily_count['count'],
+                ))
+                if len(batch) >= batch_size:
+                    DailyCommentCount.objects.bulk_create(batch)
+                    rows += len(batch)
+                    batch = []
+            DailyCommentCount.objects.bulk_create(batch)
+            rows += len(batch)
+            rebuild_windows()
+        self.stdout.write(self.style.SUCCESS(
+            'Rebuilt {} daily comment counts.'.format(rows)
+        ))
@@ -0,0 +1,57 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from api.refresh import refresh_movies
+from api.services import RateLimiter
+from core import settings
+
+
+class Command(BaseCommand):
+    help = ('Fetch details of movies again from OMDB API, resuming '
+            'interrupted refresh.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--age', type=int, default=settings.MOVIES_REFRESH_AGE,
+            help='Refresh movies not refreshed for this many seconds.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=settings.MOVIES_REFRESH_BATCH_SIZE,
+            help='Number of movies refreshed at once.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Number of concurrent OMDB API requests.',
+        )
+        parser.add_argument(
+            '--rate', type=float, default=settings.MOVIES_REFRESH_RATE_LIMIT,
+            help='Maximum number of OMDB API requests per second, '
+                 '0 disables the limit.',
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Ignore position of interrupted refresh.',
+        )
+
+    def handle(self, *args, **options):
+        workers = options['workers'] or settings.OMDB_API_WORKERS
+        rate_limiter = None
+        if options['rate']:
+            rate_limiter = RateLimiter(options['rate'], burst=workers)
+        summary = Counter()
+        batches = refresh_movies(
+            options['age'], options['batch_size'], max_workers=workers,
+            rate_limiter=rate_limiter, restart=options['restart'],
+        )
+        for batch_summary in batches:
+            summary.update(batch_summary)
+            self.stdout.write(', '.join(
+                '{}: {}'.format(result, count)
+                for result, count in sorted(batch_summary.items())
+            ))
+        self.stdout.write(self.style.SUCCESS(', '.join(
+            '{}: {}'.format(result, count)
+            for result, count in sorted(summary.items())
+        ) or 'No movies to refresh.'))
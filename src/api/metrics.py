@@ -0,0 +1,406 @@
+"""Process metrics exposed by /metrics in Prometheus text format.
+
+Values are recorded into a dict of the recording thread, so hot paths
+don't take any lock. Dicts of all threads are summed when metrics are
+collected. With METRICS_DIR setting every process periodically writes
+its values to own file in the directory, and /metrics sums files of all
+processes (eg. gunicorn workers). Gauges are reported per live process.
+"""
+import bisect
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+
+from requests.exceptions import HTTPError
+
+from core import settings
+
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# default histogram buckets (in seconds)
+BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf')
+)
+
+
+class Registry:
+    """Values of metrics recorded by threads of the process.
+
+    Every thread increments values in own dict, which is registered in
+    `shards` once. Copying dict is atomic, so collecting doesn't need to
+    stop recording threads.
+    """
+    def __init__(self):
+        self.metrics = OrderedDict()
+        self.shards = []
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.pid = None
+        self.flushed = 0
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def get_shard(self):
+        shard = getattr(self.local, 'shard', None)
+        if shard is None:
+            shard = self.local.shard = defaultdict(float)
+            with self.lock:
+                self.shards.append(shard)
+        return shard
+
+    def inc(self, key, value=1):
+        self.get_shard()[key] += value
+
+    def collect(self):
+        """Return values summed over all threads by (name, labels) key."""
+        values = defaultdict(float)
+        with self.lock:
+            shards = list(self.shards)
+        for shard in shards:
+            for key, value in shard.copy().items():
+                values[key] += value
+        return values
+
+    def reset(self):
+        with self.lock:
+            for shard in self.shards:
+                shard.clear()
+
+    def get_path(self):
+        """Return file of this process, it changes in forked process."""
+        pid = os.getpid()
+        if self.pid != pid:
+            self.pid = pid
+            name = '{}-{}.json'.format(pid, uuid.uuid4().hex[:8])
+            self.path = os.path.join(settings.METRICS_DIR, name)
+        return self.path
+
+    def flush(self, force=False):
+        """Write values of the process to its file in METRICS_DIR.
+
+        It's called after every request, but file is written at most
+        once per METRICS_FLUSH_INTERVAL seconds.
+        """
+        if not settings.METRICS_DIR:
+            return
+        now = time.monotonic()
+        interval = settings.METRICS_FLUSH_INTERVAL
+        if not force and now - self.flushed < interval:
+            return
+        self.flushed = now
+        path = self.get_path()
+        data = {
+            'pid': self.pid,
+            'values': [
+                [name, list(labels), value]
+                for (name, labels), value in self.collect().items()
+            ],
+            'gauges': [
+                [name, list(labels), value]
+                for (name, labels), value in collect_gauges().items()
+            ],
+        }
+        temp_path = path + '.tmp'
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(temp_path, path)
+        except OSError:
+            logger.exception('Writing metrics to %s failed', path)
+
+    def collect_all(self):
+        """Return values of all processes and gauges of live processes.
+
+        Gauges are labeled with pid when metrics of many processes are
+        collected.
+        """
+        values = self.collect()
+        gauges = collect_gauges()
+        if not settings.METRICS_DIR:
+            return values, gauges
+        own_path = self.get_path()
+        gauges = {
+            (name, labels + (('pid', str(self.pid)),)): value
+            for (name, labels), value in gauges.items()
+        }
+        for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.json')):
+            if path == own_path:
+                continue
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in data['values']:
+                values[(name, tuple(map(tuple, labels)))] += value
+            if not is_alive(data['pid']):
+                continue
+            for name, labels, value in data['gauges']:
+                labels = tuple(map(tuple, labels)) + (
+                    ('pid', str(data['pid'])),
+                )
+                gauges[(name, labels)] = value
+        return values, gauges
+
+
+def clear_dir():
+    """Create METRICS_DIR or remove files of processes which wrote to it
+    before. It's called by server on start and exit, counters of workers
+    which died while it runs are still summed.
+    """
+    if not settings.METRICS_DIR:
+        return
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    for pattern in ('*.json', '*.json.tmp'):
+        for path in glob.glob(os.path.join(settings.METRICS_DIR, pattern)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+registry = Registry()
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        registry.register(self)
+
+    def get_labels(self, labels):
+        return tuple((name, str(labels[name])) for name in self.labelnames)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, value=1, **labels):
+        registry.inc((self.name, self.get_labels(labels)), value)
+
+
+class Histogram(Metric):
+    """Histogram of observed values.
+
+    Only the bucket of the value is incremented, buckets are made
+    cumulative when metrics are collected.
+    """
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        labels = self.get_labels(labels)
+        bucket = self.buckets[bisect.bisect_left(self.buckets, value)]
+        shard = registry.get_shard()
+        shard[(self.name + '_bucket', labels + (('le', bucket),))] += 1
+        shard[(self.name + '_sum', labels)] += value
+        shard[(self.name + '_count', labels)] += 1
+
+
+class Gauge(Metric):
+    """Gauge of the process read from `function` returning values by
+    labels tuples.
+    """
+    type = 'gauge'
+
+    def __init__(self, name, documentation, function):
+        super().__init__(name, documentation)
+        self.function = function
+
+
+class DerivedGauge(Gauge):
+    """Gauge computed from values of all processes by `function`."""
+
+
+def collect_gauges():
+    gauges = {}
+    for metric in registry.metrics.values():
+        if type(metric) is Gauge:
+            for labels, value in metric.function().items():
+                gauges[(metric.name, labels)] = value
+    return gauges
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace(
+            '"', '\\"'
+        ).replace('\n', '\\n'))
+        for name, value in labels
+    ) + '}'
+
+
+def get_samples(metric, values):
+    """Return sorted (name, labels, value) samples of metric."""
+    if isinstance(metric, DerivedGauge):
+        return sorted(
+            (metric.name, labels, value)
+            for labels, value in metric.function(values).items()
+        )
+    if metric.type != 'histogram':
+        return sorted(
+            (name, labels, value) for (name, labels), value in values.items()
+            if name == metric.name
+        )
+    samples = []
+    series = sorted({
+        labels for (name, labels) in values
+        if name == metric.name + '_count'
+    })
+    for labels in series:
+        total = 0
+        for bucket in metric.buckets:
+            total += values.get(
+                (metric.name + '_bucket', labels + (('le', bucket),)), 0
+            )
+            samples.append((
+                metric.name + '_bucket',
+                labels + (('le', format_value(bucket)),),
+                total,
+            ))
+        for suffix in ('_sum', '_count'):
+            samples.append((
+                metric.name + suffix, labels,
+                values[(metric.name + suffix, labels)],
+            ))
+    return samples
+
+
+def render():
+    """Return metrics of all processes in Prometheus text format."""
+    values, gauges = registry.collect_all()
+    values.update(gauges)
+    lines = []
+    for metric in registry.metrics.values():
+        lines.append('# HELP {} {}'.format(metric.name, metric.documentation))
+        lines.append('# TYPE {} {}'.format(metric.name, metric.type))
+        for name, labels, value in get_samples(metric, values):
+            lines.append('{}{} {}'.format(
+                name, format_labels(labels), format_value(value)
+            ))
+    return '\n'.join(lines) + '\n'
+
+
+http_requests = Counter(
+    'http_requests_total', 'Number of HTTP requests.',
+    ('method', 'route', 'status'),
+)
+http_request_duration = Histogram(
+    'http_request_duration_seconds', 'Duration of HTTP requests.',
+    ('method', 'route'),
+)
+db_queries = Counter(
+    'db_queries_total', 'Number of database queries.', ('route',),
+)
+db_query_duration = Counter(
+    'db_query_duration_seconds_total', 'Time spent on database queries.',
+    ('route',),
+)
+omdb_requests = Counter(
+    'omdb_requests_total', 'Number of OMDB API calls by outcome.',
+    ('outcome',),
+)
+omdb_request_duration = Histogram(
+    'omdb_request_duration_seconds',
+    'Duration of OMDB API calls, including retries.',
+)
+omdb_cache_lookups = Counter(
+    'omdb_cache_lookups_total', 'Number of OMDB API lookups cache reads.',
+    ('result',),
+)
+
+
+def get_cache_hit_ratio(values):
+    hits = values.get((omdb_cache_lookups.name, (('result', 'hit'),)), 0)
+    misses = values.get((omdb_cache_lookups.name, (('result', 'miss'),)), 0)
+    if not hits + misses:
+        return {}
+    return {(): hits / (hits + misses)}
+
+
+def get_circuit_breaker_state():
+    from api.services import CircuitBreaker, circuit_breaker
+
+    return {
+        (('state', state),): int(circuit_breaker.state == state)
+        for state in (
+            CircuitBreaker.CLOSED, CircuitBreaker.OPEN,
+            CircuitBreaker.HALF_OPEN,
+        )
+    }
+
+
+omdb_cache_hit_ratio = DerivedGauge(
+    'omdb_cache_hit_ratio', 'Ratio of OMDB API lookups found in cache.',
+    get_cache_hit_ratio,
+)
+omdb_circuit_breaker = Gauge(
+    'omdb_circuit_breaker_state', 'Current state of OMDB API circuit.',
+    get_circuit_breaker_state,
+)
+
+
+def get_outcome(error):
+    """Return outcome label of failed OMDB API call."""
+    if isinstance(error, HTTPError) and error.errno == 404:
+        return 'not_found'
+    return type(error).__name__
+
+
+@contextmanager
+def omdb_call():
+    """Record duration and outcome of OMDB API call made in the block."""
+    started = time.perf_counter()
+    outcome = 'ok'
+    try:
+        yield
+    except Exception as e:
+        outcome = get_outcome(e)
+        raise
+    finally:
+        omdb_requests.inc(outcome=outcome)
+        omdb_request_duration.observe(time.perf_counter() - started)
+
+
+def record_cache_lookups(hits, misses):
+    if hits:
+        omdb_cache_lookups.inc(hits, result='hit')
+    if misses:
+        omdb_cache_lookups.inc(misses, result='miss')
@@ -0,0 +1,182 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from api import db, metrics, timing
+from core import settings
+
+
+logger = logging.getLogger(__name__)
+
+# timed operations reported in Server-Timing header
+TIMED_OPERATIONS = ('db', 'omdb', 'serialize', 'render')
+
+
+class RequestTimingMiddleware:
+    """Report time spent on database queries, OMDB API calls,
+    serialization and rendering of each request.
+
+    Timings are sent in `Server-Timing` response header and logged. The
+    middleware is enabled by REQUEST_TIMING setting, when it's disabled
+    Django removes it from middleware chain.
+    """
+    def __init__(self, get_response):
+        if not settings.REQUEST_TIMING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = timing.start()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(self.time_query)
+                    )
+                response = self.get_response(request)
+        finally:
+            timing.stop()
+        total = timings.total
+        response['Server-Timing'] = self.get_server_timing(timings, total)
+        self.log(request, response, timings, total)
+        return response
+
+    @staticmethod
+    def time_query(execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            timings = timing.current()
+            if timings is not None:
+                timings.add('db', time.perf_counter() - started)
+
+    def get_server_timing(self, timings, total):
+        metrics = []
+        for name in TIMED_OPERATIONS:
+            metric = '{};dur={:.2f}'.format(
+                name, timings.durations.get(name, 0) * 1000
+            )
+            if name in ('db', 'omdb'):
+                metric += ';desc="{} {}"'.format(
+                    timings.counts.get(name, 0),
+                    'queries' if name == 'db' else 'calls',
+                )
+            metrics.append(metric)
+        metrics.append('total;dur={:.2f}'.format(total * 1000))
+        return ', '.join(metrics)
+
+    def log(self, request, response, timings, total):
+        values = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'db_queries': timings.counts.get('db', 0),
+            'omdb_calls': timings.counts.get('omdb', 0),
+        }
+        for name in TIMED_OPERATIONS:
+            values[name + '_ms'] = round(
+                timings.durations.get(name, 0) * 1000, 2
+            )
+        logger.info(
+            ' '.join('{}=%s'.format(key) for key in values),
+            *values.values(),
+            extra={'timings': values}
+        )
+
+
+class QueryCounter:
+    """Database execute wrapper counting queries and their duration."""
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """Record latency, status and database queries of each request in
+    `api.metrics`, exposed by /metrics.
+
+    The middleware is enabled by METRICS setting.
+    """
+    # other methods are recorded as "other" to limit number of series
+    METHODS = ('GET', 'HEAD', 'OPTIONS', 'POST', 'PUT', 'PATCH', 'DELETE')
+
+    def __init__(self, get_response):
+        if not settings.METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryCounter()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+        method = request.method if request.method in self.METHODS else (
+            'other'
+        )
+        route = getattr(request.resolver_match, 'url_name', None) or (
+            'unmatched'
+        )
+        metrics.http_requests.inc(
+            method=method, route=route, status=response.status_code
+        )
+        metrics.http_request_duration.observe(
+            duration, method=method, route=route
+        )
+        metrics.db_queries.inc(queries.count, route=route)
+        metrics.db_query_duration.inc(queries.duration, route=route)
+        metrics.registry.flush()
+        return response
+
+
+class ReplicaMiddleware:
+    """Read data of GET requests of DATABASE_REPLICA_ROUTES from one of
+    DATABASE_REPLICAS.
+
+    Response to other methods sets cookie which makes the following
+    requests of the client read from the primary for
+    DATABASE_REPLICA_STICKY_TIMEOUT seconds. The middleware is enabled
+    when any replica is configured.
+    """
+    SAFE_METHODS = ('GET', 'HEAD')
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            db.set_replica(None)
+        if request.method not in self.SAFE_METHODS:
+            response.set_cookie(
+                settings.DATABASE_REPLICA_STICKY_COOKIE, '1',
+                max_age=settings.DATABASE_REPLICA_STICKY_TIMEOUT,
+                httponly=True,
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        route = request.resolver_match.url_name
+        if (request.method in self.SAFE_METHODS and
+                route in settings.DATABASE_REPLICA_ROUTES and
+                settings.DATABASE_REPLICA_STICKY_COOKIE not in
+                request.COOKIES):
+            db.set_replica(db.pick_replica())
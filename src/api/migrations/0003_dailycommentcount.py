@@ -0,0 +1,50 @@
+# Generated by Django 2.1.2 on 2026-10-17 23:15
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+
+
+def fill_daily_comment_counts(apps, schema_editor):
+    Comment = apps.get_model('api', 'Comment')
+    DailyCommentCount = apps.get_model('api', 'DailyCommentCount')
+    daily_counts = Comment.objects.annotate(
+        day=TruncDate('created'),
+    ).values('movie_id', 'day').annotate(count=Count('id')).order_by()
+    DailyCommentCount.objects.bulk_create(
+        (
+            DailyCommentCount(
+                movie_id=daily_count['movie_id'],
+                day=daily_count['day'],
+                count=daily_count['count'],
+            ) for daily_count in daily_counts.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_comment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCommentCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_comment_counts', to='api.Movie')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailycommentcount',
+            unique_together={('movie', 'day')},
+        ),
+        migrations.RunPython(
+            fill_daily_comment_counts, migrations.RunPython.noop
+        ),
+    ]
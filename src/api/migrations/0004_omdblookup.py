@@ -0,0 +1,23 @@
+# Generated by Django 2.1.2 on 2026-10-17 23:17
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_dailycommentcount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OMDBLookup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True)),
+                ('details', django.contrib.postgres.fields.jsonb.JSONField(null=True)),
+                ('fetched', models.DateTimeField()),
+            ],
+        ),
+    ]
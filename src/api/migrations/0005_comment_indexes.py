@@ -0,0 +1,17 @@
+# Generated by Django 2.1.2 on 2026-10-17 23:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_omdblookup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailycommentcount',
+            index=models.Index(fields=['day', 'movie', 'count'], name='api_daily_day_movie_count_idx'),
+        ),
+    ]
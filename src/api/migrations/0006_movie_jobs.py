@@ -0,0 +1,43 @@
+# Generated by Django 2.1.2 on 2026-10-17 23:35
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_comment_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovieJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('result', django.contrib.postgres.fields.jsonb.JSONField(null=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='pending',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='moviejob',
+            name='movie',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='jobs', to='api.Movie'),
+        ),
+        migrations.AddIndex(
+            model_name='moviejob',
+            index=models.Index(fields=['status', 'run_after'], name='api_moviejob_status_run_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 2.1.2 on 2026-10-17 23:44
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_movie_refresh'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Version',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('number', models.BigIntegerField(default=0)),
+                ('modified', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='dailycommentcount',
+            name='api_daily_day_movie_count_idx',
+        ),
+        migrations.AddField(
+            model_name='dailycommentcount',
+            name='updated',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='dailycommentcount',
+            index=models.Index(fields=['day', 'movie', 'count', 'updated'], name='api_daily_day_movie_count_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 2.1.2 on 2026-10-17 23:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_conditional_get'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollingCommentCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0)),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rolling_comment_counts', to='api.Movie')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollingWindow',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('days', models.PositiveIntegerField(unique=True)),
+                ('end', models.DateField(null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='rollingcommentcount',
+            name='window',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counts', to='api.RollingWindow'),
+        ),
+        migrations.AddIndex(
+            model_name='rollingcommentcount',
+            index=models.Index(fields=['window', '-count', 'movie'], name='api_rolling_window_count_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='rollingcommentcount',
+            unique_together={('window', 'movie')},
+        ),
+    ]
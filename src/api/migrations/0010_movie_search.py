@@ -0,0 +1,83 @@
+# Generated by Django 2.1.2 on 2026-10-17 23:54
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# title is weighted most, then people, genre and plot
+SEARCH_VECTOR_SQL = '''
+CREATE FUNCTION api_movie_search_vector(title text, details jsonb)
+RETURNS tsvector AS $$
+    SELECT
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english',
+            coalesce(details->>'Director', '') || ' ' ||
+            coalesce(details->>'Actors', '')
+        ), 'B') ||
+        setweight(to_tsvector('english', coalesce(details->>'Genre', '')), 'C') ||
+        setweight(to_tsvector('english', coalesce(details->>'Plot', '')), 'D')
+$$ LANGUAGE SQL IMMUTABLE;
+
+CREATE FUNCTION api_movie_search_vector_trigger() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := api_movie_search_vector(NEW.title, NEW.details);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER api_movie_search_vector_update
+BEFORE INSERT OR UPDATE OF title, details ON api_movie
+FOR EACH ROW EXECUTE PROCEDURE api_movie_search_vector_trigger();
+
+UPDATE api_movie SET search_vector = api_movie_search_vector(title, details);
+'''
+
+DROP_SEARCH_VECTOR_SQL = '''
+DROP TRIGGER api_movie_search_vector_update ON api_movie;
+DROP FUNCTION api_movie_search_vector_trigger();
+DROP FUNCTION api_movie_search_vector(text, jsonb);
+'''
+
+
+def create_trigram_index(apps, schema_editor):
+    """Index titles for fuzzy search if pg_trgm extension is available.
+
+    Without the extension /movies/search supports only full text search.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+        )
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX api_movie_title_trgm_idx ON api_movie '
+        'USING gin (title gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    schema_editor.execute('DROP INDEX IF EXISTS api_movie_title_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_rolling_windows'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(SEARCH_VECTOR_SQL, DROP_SEARCH_VECTOR_SQL),
+        migrations.AddIndex(
+            model_name='movie',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='api_movie_search_idx'),
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
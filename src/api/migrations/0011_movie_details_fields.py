@@ -0,0 +1,133 @@
+# Generated by Django 2.1.2 on 2026-10-17 23:55
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+from django.db.models import Max
+
+
+BATCH_SIZE = 1000
+
+# values of details are extracted like OMDB API formats them (eg. Year
+# "2005–2010", Runtime "142 min"), unknown and "N/A" values become null
+DETAILS_FIELDS_SQL = '''
+CREATE FUNCTION api_movie_year(details jsonb) RETURNS smallint AS $$
+    SELECT substring(details->>'Year' from '^\\d{4}')::smallint
+$$ LANGUAGE SQL IMMUTABLE;
+
+CREATE FUNCTION api_movie_genres(details jsonb) RETURNS varchar(50)[] AS $$
+    SELECT array(
+        SELECT left(lower(trim(genre)), 50)
+        FROM unnest(string_to_array(details->>'Genre', ',')) AS genre
+        WHERE lower(trim(genre)) NOT IN ('', 'n/a')
+    )::varchar(50)[]
+$$ LANGUAGE SQL IMMUTABLE;
+
+CREATE FUNCTION api_movie_imdb_rating(details jsonb) RETURNS numeric AS $$
+    SELECT CASE WHEN details->>'imdbRating' ~ '^\\d(\\.\\d)?$|^10(\\.0)?$'
+        THEN (details->>'imdbRating')::numeric(3, 1)
+    END
+$$ LANGUAGE SQL IMMUTABLE;
+
+CREATE FUNCTION api_movie_runtime(details jsonb) RETURNS integer AS $$
+    SELECT substring(details->>'Runtime' from '^(\\d{1,6}) min')::integer
+$$ LANGUAGE SQL IMMUTABLE;
+
+CREATE FUNCTION api_movie_details_fields_trigger() RETURNS trigger AS $$
+BEGIN
+    NEW.year := api_movie_year(NEW.details);
+    NEW.genres := api_movie_genres(NEW.details);
+    NEW.imdb_rating := api_movie_imdb_rating(NEW.details);
+    NEW.runtime := api_movie_runtime(NEW.details);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER api_movie_details_fields_update
+BEFORE INSERT OR UPDATE OF details ON api_movie
+FOR EACH ROW EXECUTE PROCEDURE api_movie_details_fields_trigger();
+'''
+
+DROP_DETAILS_FIELDS_SQL = '''
+DROP TRIGGER api_movie_details_fields_update ON api_movie;
+DROP FUNCTION api_movie_details_fields_trigger();
+DROP FUNCTION api_movie_runtime(jsonb);
+DROP FUNCTION api_movie_imdb_rating(jsonb);
+DROP FUNCTION api_movie_genres(jsonb);
+DROP FUNCTION api_movie_year(jsonb);
+'''
+
+# trigger isn't fired, so search vectors aren't recomputed
+BACKFILL_SQL = '''
+UPDATE api_movie SET
+    year = api_movie_year(details),
+    genres = api_movie_genres(details),
+    imdb_rating = api_movie_imdb_rating(details),
+    runtime = api_movie_runtime(details)
+WHERE id > %s AND id <= %s
+'''
+
+
+def backfill_details_fields(apps, schema_editor):
+    """Fill columns of existing movies in batches of ids.
+
+    Migration isn't atomic, so every batch is committed separately and
+    rows of big table aren't locked until the whole table is updated.
+    """
+    Movie = apps.get_model('api', 'Movie')
+    last_id = Movie.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+    with schema_editor.connection.cursor() as cursor:
+        for start in range(0, last_id, BATCH_SIZE):
+            cursor.execute(BACKFILL_SQL, [start, start + BATCH_SIZE])
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('api', '0010_movie_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='genres',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=50), default=list, editable=False, size=None),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='imdb_rating',
+            field=models.DecimalField(decimal_places=1, editable=False, max_digits=3, null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='runtime',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='year',
+            field=models.PositiveSmallIntegerField(editable=False, null=True),
+        ),
+        migrations.RunSQL(DETAILS_FIELDS_SQL, DROP_DETAILS_FIELDS_SQL),
+        migrations.RunPython(
+            backfill_details_fields, migrations.RunPython.noop
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['year'], name='api_movie_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['genres'], name='api_movie_genres_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['imdb_rating'], name='api_movie_imdb_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['runtime'], name='api_movie_runtime_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 2.1.2 on 2026-10-17 23:58
+
+from django.db import migrations, models
+from django.utils.text import slugify
+import django.db.models.deletion
+
+
+BATCH_SIZE = 1000
+
+ADD_ALIASES_SQL = '''
+INSERT INTO api_moviealias (slug, movie_id)
+SELECT aliases.slug, movie.id
+FROM unnest(%s::text[], %s::text[]) AS aliases (slug, canonical_slug)
+JOIN api_movie movie ON movie.slug = aliases.canonical_slug
+WHERE NOT movie.pending
+ON CONFLICT (slug) DO NOTHING
+'''
+
+
+def add_aliases(cursor, aliases):
+    aliases = {
+        slug: canonical_slug for slug, canonical_slug in aliases.items()
+        if slug and slug != canonical_slug
+    }
+    if aliases:
+        cursor.execute(
+            ADD_ALIASES_SQL, [list(aliases), list(aliases.values())]
+        )
+
+
+def add_cached_lookups_aliases(apps, schema_editor):
+    """Make titles of cached OMDB API lookups known aliases of movies."""
+    OMDBLookup = apps.get_model('api', 'OMDBLookup')
+    lookups = OMDBLookup.objects.filter(details__Title__isnull=False)
+    aliases = {}
+    with schema_editor.connection.cursor() as cursor:
+        for key, title in lookups.values_list(
+                'key', 'details__Title').iterator(chunk_size=BATCH_SIZE):
+            aliases[slugify(key)] = slugify(title)
+            if len(aliases) >= BATCH_SIZE:
+                add_aliases(cursor, aliases)
+                aliases = {}
+        add_aliases(cursor, aliases)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_movie_details_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovieAlias',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slug', models.SlugField(allow_unicode=True, max_length=255, unique=True)),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='api.Movie')),
+            ],
+        ),
+        migrations.RunPython(
+            add_cached_lookups_aliases, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 2.1.2 on 2026-10-18 00:00
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+BATCH_SIZE = 1000
+
+BACKFILL_SQL = '''
+UPDATE api_movie SET
+    comment_count = comments.count,
+    last_comment_at = comments.last_comment_at
+FROM (
+    SELECT movie_id_id, count(*) AS count, max(created) AS last_comment_at
+    FROM api_comment
+    WHERE movie_id_id > %s AND movie_id_id <= %s
+    GROUP BY movie_id_id
+) AS comments
+WHERE api_movie.id = comments.movie_id_id
+'''
+
+
+def backfill_comment_counters(apps, schema_editor):
+    """Count comments of existing movies in batches of movie ids."""
+    Movie = apps.get_model('api', 'Movie')
+    last_id = Movie.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+    with schema_editor.connection.cursor() as cursor:
+        for start in range(0, last_id, BATCH_SIZE):
+            cursor.execute(BACKFILL_SQL, [start, start + BATCH_SIZE])
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('api', '0012_movie_alias'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='comment_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='last_comment_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(
+            backfill_comment_counters, migrations.RunPython.noop
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['-comment_count', 'id'], name='api_movie_comment_count_idx'),
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX api_movie_last_comment_idx ON api_movie '
+            '(last_comment_at DESC NULLS LAST, id)',
+            'DROP INDEX api_movie_last_comment_idx',
+        ),
+    ]
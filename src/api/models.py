@@ -1,7 +1,59 @@
-from django.db import models
-from django.contrib.postgres.fields import JSONField
+import datetime
+
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import DateTimeField, F, OuterRef, Subquery, Value
+from django.db.models.functions import Greatest
+from django.contrib.postgres.fields import ArrayField, JSONField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.utils import timezone
 from django.utils.text import Truncator
 
+from api.utils import get_details_hash
+
+
+class MovieManager(models.Manager):
+    def get_queryset(self):
+        # search vector is read only by database
+        return super().get_queryset().defer('search_vector')
+
+    def count_comments(self, movie_id, delta, created=None):
+        """Atomically change comment counter of `movie_id`.
+
+        :param delta: number of added (or removed if negative) comments
+        :param created: creation time of the newest added comment, time
+            of the last comment is read again from comments after removal
+        """
+        if delta > 0:
+            # null is ignored by PostgreSQL GREATEST
+            last_comment_at = Greatest(
+                'last_comment_at', Value(created, DateTimeField())
+            )
+        else:
+            last_comment_at = Subquery(Comment.objects.filter(
+                movie_id=OuterRef('pk')
+            ).order_by('-created').values('created')[:1])
+        self.filter(id=movie_id).update(
+            comment_count=F('comment_count') + delta,
+            last_comment_at=last_comment_at,
+        )
+
+    def get_known_slugs(self, slugs, include_pending=False):
+        """Return slugs of movies or their aliases among `slugs`.
+
+        Pending movies, hidden from API until their job publishes them,
+        are included only with `include_pending`. Both unique indexes are
+        read by one query.
+        """
+        movies = self.filter(slug__in=slugs)
+        aliases = MovieAlias.objects.filter(slug__in=slugs)
+        if not include_pending:
+            movies = movies.filter(pending=False)
+            aliases = aliases.filter(movie__pending=False)
+        return set(movies.values_list('slug', flat=True).union(
+            aliases.values_list('slug', flat=True)
+        ))
+
 
 class Movie(models.Model):
     # the longest movie title I found was almost 200 chars long
@@ -11,10 +63,111 @@ class Movie(models.Model):
     details = JSONField()
     # slugified title to quickly check movie existence
     slug = models.SlugField(max_length=255, unique=True, allow_unicode=True)
+    # created by asynchronous POST /movies and waiting for OMDB API details,
+    # pending movies are hidden from API
+    pending = models.BooleanField(default=False)
+    # last time details were fetched (set by `set_details` on creation and
+    # by `refresh_movies` command) and hash of their JSON used to skip
+    # writing unchanged details
+    refreshed = models.DateTimeField(null=True)
+    details_hash = models.CharField(max_length=40, blank=True)
+    # weighted title and details keys searched by /movies/search, it's
+    # computed by database trigger on every write of title or details
+    search_vector = SearchVectorField(null=True, editable=False)
+    # details used by /movies filters and ordering, they're extracted by
+    # database trigger on every write of details, null if unknown
+    year = models.PositiveSmallIntegerField(null=True, editable=False)
+    # lowercased
+    genres = ArrayField(
+        models.CharField(max_length=50), default=list, editable=False
+    )
+    imdb_rating = models.DecimalField(
+        max_digits=3, decimal_places=1, null=True, editable=False
+    )
+    # in minutes
+    runtime = models.PositiveIntegerField(null=True, editable=False)
+    # kept by `api.signals.update_comment_counts` on every comment write
+    comment_count = models.IntegerField(default=0, editable=False)
+    # indexed by migration with nulls last, like it's ordered in /movies
+    last_comment_at = models.DateTimeField(null=True, editable=False)
+
+    objects = MovieManager()
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='api_movie_search_idx'),
+            models.Index(fields=['year'], name='api_movie_year_idx'),
+            GinIndex(fields=['genres'], name='api_movie_genres_idx'),
+            models.Index(
+                fields=['imdb_rating'], name='api_movie_imdb_rating_idx'
+            ),
+            models.Index(fields=['runtime'], name='api_movie_runtime_idx'),
+            models.Index(
+                fields=['-comment_count', 'id'],
+                name='api_movie_comment_count_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.title
 
+    def set_details(self, details):
+        """Set details fetched from omdbapi just now, so `refresh_movies`
+        doesn't fetch them again until they're stale.
+        """
+        self.details = details
+        self.details_hash = get_details_hash(details)
+        self.refreshed = timezone.now()
+
+
+ADD_ALIASES_SQL = '''
+INSERT INTO {alias_table} (slug, movie_id)
+SELECT aliases.slug, movie.id
+FROM unnest(%s::text[], %s::text[]) AS aliases (slug, canonical_slug)
+JOIN {movie_table} movie ON movie.slug = aliases.canonical_slug
+WHERE NOT movie.pending
+ON CONFLICT (slug) DO NOTHING
+'''
+
+
+class MovieAliasManager(models.Manager):
+    def add(self, aliases):
+        """Map slugs of requested titles to movies, with one query.
+
+        Slugs equal to canonical ones, already mapped slugs and aliases of
+        missing movies are skipped.
+
+        :param aliases: dict mapping slug of requested title to slug of
+            canonical title returned by OMDB API
+        """
+        aliases = {
+            slug: canonical_slug for slug, canonical_slug in aliases.items()
+            if slug and slug != canonical_slug
+        }
+        if not aliases:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(ADD_ALIASES_SQL.format(
+                alias_table=self.model._meta.db_table,
+                movie_table=Movie._meta.db_table,
+            ), [list(aliases), list(aliases.values())])
+
+
+class MovieAlias(models.Model):
+    """Slug of title variant (eg. "the matrix") resolved to movie.
+
+    Known variants are rejected without calling OMDB API.
+    """
+    slug = models.SlugField(max_length=255, unique=True, allow_unicode=True)
+    movie = models.ForeignKey(
+        Movie, on_delete=models.CASCADE, related_name='aliases'
+    )
+
+    objects = MovieAliasManager()
+
+    def __str__(self):
+        return self.slug
+
 
 class Comment(models.Model):
     movie_id = models.ForeignKey(Movie, on_delete=models.CASCADE)
@@ -24,3 +177,246 @@ class Comment(models.Model):
 
     def __str__(self):
         return Truncator(self.comment).chars(60)
+
+
+class DailyCommentCountManager(models.Manager):
+    def add(self, movie_id, day, delta=1):
+        """Atomically change number of `movie_id` comments created on `day`.
+
+        Row is created on first comment of the day. Decrementing counter
+        of unexisting row is a no-op (eg. during movie cascade delete).
+        """
+        counters = self.filter(movie_id=movie_id, day=day)
+        now = timezone.now()
+        if counters.update(count=F('count') + delta, updated=now) or (
+                delta < 0):
+            return
+        try:
+            with transaction.atomic():
+                self.create(
+                    movie_id=movie_id, day=day, count=delta, updated=now
+                )
+        except IntegrityError:
+            # concurrent request created the row in the meantime
+            counters.update(count=F('count') + delta, updated=now)
+
+
+class DailyCommentCount(models.Model):
+    """Number of comments per movie per day used to rank movies in /top.
+
+    It's maintained by `api.signals` on every comment write and can be
+    rebuilt from scratch with `rebuild_comment_counts` command.
+    """
+    movie = models.ForeignKey(
+        Movie, on_delete=models.CASCADE, related_name='daily_comment_counts'
+    )
+    day = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+    # last change of the counter, used as /top validator
+    updated = models.DateTimeField(default=timezone.now)
+
+    objects = DailyCommentCountManager()
+
+    class Meta:
+        unique_together = ('movie', 'day')
+        indexes = [
+            # covers /top aggregate and its validator of date range with
+            # index only scan
+            models.Index(
+                fields=['day', 'movie', 'count', 'updated'],
+                name='api_daily_day_movie_count_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return '{}: {} ({})'.format(self.day, self.count, self.movie_id)
+
+
+class RollingWindow(models.Model):
+    """Leaderboard of comments from the last `days` days ending on `end`.
+
+    It's maintained by `api.leaderboards`, which counts comments as they
+    arrive and advances the window when the day changes.
+    """
+    days = models.PositiveIntegerField(unique=True)
+    # last day counted in the window, null if window has to be rebuilt
+    end = models.DateField(null=True)
+
+    def contains(self, day):
+        return self.end is not None and (
+            self.end - datetime.timedelta(days=self.days) < day <= self.end
+        )
+
+    def __str__(self):
+        return '{} days to {}'.format(self.days, self.end)
+
+
+class RollingCommentCountManager(models.Manager):
+    def add(self, window_id, movie_id, delta=1):
+        """Atomically change number of `movie_id` comments in window.
+
+        Row is created on first comment. Decrementing counter of
+        unexisting row is a no-op (eg. during movie cascade delete).
+        """
+        counters = self.filter(window_id=window_id, movie_id=movie_id)
+        if counters.update(count=F('count') + delta) or delta < 0:
+            return
+        try:
+            with transaction.atomic():
+                self.create(window_id=window_id, movie_id=movie_id,
+                            count=delta)
+        except IntegrityError:
+            # concurrent request created the row in the meantime
+            counters.update(count=F('count') + delta)
+
+
+class RollingCommentCount(models.Model):
+    """Number of movie comments in rolling window."""
+    window = models.ForeignKey(
+        RollingWindow, on_delete=models.CASCADE, related_name='counts'
+    )
+    movie = models.ForeignKey(
+        Movie, on_delete=models.CASCADE,
+        related_name='rolling_comment_counts',
+    )
+    count = models.IntegerField(default=0)
+
+    objects = RollingCommentCountManager()
+
+    class Meta:
+        unique_together = ('window', 'movie')
+        indexes = [
+            # leaderboard of window read in rank order
+            models.Index(
+                fields=['window', '-count', 'movie'],
+                name='api_rolling_window_count_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return '{}: {} ({})'.format(self.window_id, self.count, self.movie_id)
+
+
+class OMDBLookup(models.Model):
+    """Cached result of OMDB API lookup by normalized title.
+
+    `details` is null when OMDB API responded that movie doesn't exist.
+    """
+    key = models.CharField(max_length=255, unique=True)
+    details = JSONField(null=True)
+    fetched = models.DateTimeField()
+
+    @property
+    def found(self):
+        return self.details is not None
+
+    def __str__(self):
+        return self.key
+
+
+class MovieJob(models.Model):
+    """Movie creation waiting for OMDB API details.
+
+    Jobs are processed by `process_movie_jobs` command. Claimed job is
+    postponed by lease time, so job of crashed worker is retried later.
+    `result` is stored like results of `api.importer.import_movies`.
+    """
+    PENDING = 'pending'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'Pending'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    title = models.CharField(max_length=255)
+    # pending movie, it's deleted when job fails
+    movie = models.ForeignKey(
+        Movie, null=True, on_delete=models.SET_NULL, related_name='jobs'
+    )
+    status = models.CharField(max_length=10, choices=STATUSES,
+                              default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    result = JSONField(null=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # jobs ready to be claimed by worker
+            models.Index(
+                fields=['status', 'run_after'],
+                name='api_moviejob_status_run_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return '{} ({})'.format(self.title, self.status)
+
+
+class Checkpoint(models.Model):
+    """Progress of long running command which can be resumed."""
+    name = models.CharField(max_length=100, unique=True)
+    # id of the last processed row
+    position = models.BigIntegerField(default=0)
+    started = models.DateTimeField()
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return '{}: {}'.format(self.name, self.position)
+
+
+class VersionManager(models.Manager):
+    def bump(self, name):
+        """Atomically increment version of `name`, create it if needed."""
+        versions = self.filter(name=name)
+        now = timezone.now()
+        if versions.update(number=F('number') + 1, modified=now):
+            return
+        try:
+            with transaction.atomic():
+                self.create(name=name, number=1, modified=now)
+        except IntegrityError:
+            # concurrent request created the row in the meantime
+            versions.update(number=F('number') + 1, modified=now)
+
+    def current(self, name):
+        """Return version of `name`, unsaved zero version if not bumped."""
+        version = self.filter(name=name).first()
+        if version is None:
+            version = self.model(name=name, number=0, modified=None)
+        return version
+
+    def current_all(self, names):
+        """Return versions of `names` in the same order, with one query."""
+        versions = self.in_bulk(names, field_name='name')
+        return [
+            versions.get(name) or self.model(
+                name=name, number=0, modified=None
+            )
+            for name in names
+        ]
+
+
+class Version(models.Model):
+    """Counter of writes to resource, used as HTTP validator of its lists.
+
+    Movies version is bumped by `api.signals` on every movie write and
+    has to be bumped explicitly after bulk writes. Comment counters of
+    movies don't bump it, they're validated by time of the last comment
+    and comment deletes version.
+    """
+    MOVIES = 'movies'
+    # bumped on comment deletes, which don't move time of the last comment
+    COMMENT_DELETES = 'comment_deletes'
+
+    name = models.CharField(max_length=100, unique=True)
+    number = models.BigIntegerField(default=0)
+    modified = models.DateTimeField(null=True)
+
+    objects = VersionManager()
+
+    def __str__(self):
+        return '{}: {}'.format(self.name, self.number)
@@ -0,0 +1,91 @@
+from collections import OrderedDict
+
+from django.contrib.postgres.fields import JSONField
+from django.contrib.postgres.fields.jsonb import KeyTransform
+from django.db.models import Func, Value
+from rest_framework import exceptions
+
+
+class JSONBBuildObject(Func):
+    function = 'jsonb_build_object'
+    output_field = JSONField()
+
+
+def split_param(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+class MovieProjection:
+    """Movie fields and keys of details requested in `fields` and
+    `details_keys` query params.
+
+    Movies are fetched with `.values()` and keys of details are extracted
+    by PostgreSQL, so only requested data is sent by database.
+    """
+    FIELDS = (
+        'id', 'title', 'details', 'comment_count', 'last_comment_at',
+    )
+    # annotation with details subset, it can't be named as model field
+    DETAILS_SUBSET = 'details_subset'
+    # every key is two arguments of jsonb_build_object, PostgreSQL
+    # functions take at most 100 arguments
+    MAX_DETAILS_KEYS = 50
+
+    def __init__(self, fields, details_keys=None):
+        self.fields = fields
+        self.details_keys = details_keys or []
+
+    @classmethod
+    def from_query_params(cls, params):
+        """Return projection or None if no projection params were sent.
+
+        :raise rest_framework.exceptions.ValidationError: unknown fields
+            or too many keys of details
+        """
+        if 'fields' not in params and 'details_keys' not in params:
+            return None
+        fields = split_param(params.get('fields', '')) or list(cls.FIELDS)
+        unknown_fields = [field for field in fields if field not in cls.FIELDS]
+        if unknown_fields:
+            raise exceptions.ValidationError({
+                'fields': ['Unknown fields: {}. Expected: {}.'.format(
+                    ', '.join(unknown_fields), ', '.join(cls.FIELDS)
+                )],
+            })
+        # repeated keys are sent once
+        details_keys = list(OrderedDict.fromkeys(
+            split_param(params.get('details_keys', ''))
+        ))
+        if len(details_keys) > cls.MAX_DETAILS_KEYS:
+            raise exceptions.ValidationError({
+                'details_keys': ['Expected at most {} keys.'.format(
+                    cls.MAX_DETAILS_KEYS
+                )],
+            })
+        return cls(fields, details_keys)
+
+    def get_source(self, field):
+        if field == 'details' and self.details_keys:
+            return self.DETAILS_SUBSET
+        return field
+
+    def apply(self, queryset):
+        """Return queryset of dicts with requested data.
+
+        `id` is always fetched as it's used by pagination.
+        """
+        if 'details' in self.fields and self.details_keys:
+            arguments = []
+            for key in self.details_keys:
+                arguments.extend([Value(key), KeyTransform(key, 'details')])
+            queryset = queryset.annotate(**{
+                self.DETAILS_SUBSET: JSONBBuildObject(*arguments)
+            })
+        sources = {'id'}
+        sources.update(self.get_source(field) for field in self.fields)
+        return queryset.values(*sources)
+
+    def to_representation(self, row):
+        return OrderedDict(
+            (field, row[self.get_source(field)]) for field in self.fields
+        )
@@ -0,0 +1,123 @@
+import datetime
+from collections import Counter
+
+from django.contrib.postgres.fields import JSONField
+from django.db import transaction
+from django.db.models import Case, CharField, F, Q, Value, When
+from django.utils import timezone
+
+from api.models import Checkpoint, Movie, Version
+from api.services import get_omdb_movies
+from api.utils import get_details_hash
+
+
+CHECKPOINT_NAME = 'refresh_movies'
+
+UPDATED = 'updated'
+UNCHANGED = 'unchanged'
+FAILED = 'failed'
+
+
+def get_stale_movies(cutoff, after_id, batch_size):
+    """Return next batch of movies not refreshed since `cutoff`."""
+    return list(Movie.objects.filter(
+        Q(refreshed__isnull=True) | Q(refreshed__lt=cutoff),
+        pending=False, id__gt=after_id,
+    ).only('id', 'title', 'details_hash').order_by('id')[:batch_size])
+
+
+def update_movies(movies, refreshed):
+    """Save changed details of many movies with one query.
+
+    Django 2.1 has no `bulk_update`, so details are set by CASE on id.
+    Signals aren't sent, so movies version is bumped explicitly.
+    """
+    Movie.objects.filter(id__in=[movie.id for movie in movies]).update(
+        details=Case(
+            *[
+                When(id=movie.id, then=Value(
+                    movie.details, output_field=JSONField()
+                ))
+                for movie in movies
+            ],
+            default=F('details')
+        ),
+        details_hash=Case(
+            *[
+                When(id=movie.id, then=Value(movie.details_hash))
+                for movie in movies
+            ],
+            default=F('details_hash'),
+            output_field=CharField(),
+        ),
+        refreshed=refreshed,
+    )
+    Version.objects.bump(Version.MOVIES)
+
+
+def refresh_batch(movies, max_workers=None, rate_limiter=None):
+    """Fetch details of movies again and save the changed ones.
+
+    Movies with unchanged details get only new `refreshed` timestamp.
+    Movies which couldn't be fetched are left untouched.
+
+    :return: Counter of updated, unchanged and failed movies
+    """
+    details = get_omdb_movies(
+        [movie.title for movie in movies], use_cache=False,
+        max_workers=max_workers, rate_limiter=rate_limiter,
+    )
+    changed = []
+    unchanged = []
+    failed = 0
+    for movie in movies:
+        movie_details = details[movie.title]
+        if isinstance(movie_details, Exception):
+            failed += 1
+            continue
+        details_hash = get_details_hash(movie_details)
+        if details_hash == movie.details_hash:
+            unchanged.append(movie.id)
+            continue
+        movie.details = movie_details
+        movie.details_hash = details_hash
+        changed.append(movie)
+    now = timezone.now()
+    with transaction.atomic():
+        if changed:
+            update_movies(changed, now)
+        if unchanged:
+            Movie.objects.filter(id__in=unchanged).update(refreshed=now)
+    return Counter({
+        UPDATED: len(changed), UNCHANGED: len(unchanged), FAILED: failed,
+    })
+
+
+def refresh_movies(age, batch_size, max_workers=None, rate_limiter=None,
+                   restart=False):
+    """Refresh details of movies not refreshed for `age` seconds.
+
+    Movies are processed in batches ordered by id. Position of the last
+    batch is saved in a checkpoint, so interrupted refresh continues
+    where it stopped - with the same cutoff time - unless `restart` is
+    set. Checkpoint is removed when all movies are refreshed.
+
+    :return: generator of Counters of processed batches
+    """
+    checkpoint = Checkpoint.objects.filter(name=CHECKPOINT_NAME).first()
+    if checkpoint is None:
+        checkpoint = Checkpoint(name=CHECKPOINT_NAME)
+    if checkpoint.pk is None or restart:
+        checkpoint.position = 0
+        checkpoint.started = timezone.now()
+        checkpoint.save()
+    cutoff = checkpoint.started - datetime.timedelta(seconds=age)
+    while True:
+        movies = get_stale_movies(cutoff, checkpoint.position, batch_size)
+        if not movies:
+            break
+        summary = refresh_batch(movies, max_workers, rate_limiter)
+        checkpoint.position = movies[-1].id
+        checkpoint.save()
+        yield summary
+    checkpoint.delete()
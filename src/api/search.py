@@ -0,0 +1,49 @@
+"""Movies search by /movies/search.
+
+Full text search uses `Movie.search_vector` kept up to date by database
+trigger (see migration 0010_movie_search). Fuzzy search compares title
+trigrams and needs pg_trgm extension.
+"""
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connections
+from django.db.models import F
+
+
+# text search configuration used by search vector trigger
+SEARCH_CONFIG = 'english'
+
+# pg_trgm availability by database alias
+_trigram_available = {}
+
+
+def trigram_available(using='default'):
+    """Check if pg_trgm extension is installed, result is cached."""
+    if using not in _trigram_available:
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"
+            )
+            _trigram_available[using] = cursor.fetchone() is not None
+    return _trigram_available[using]
+
+
+def search(queryset, text):
+    """Return movies matching all words of `text`, most relevant first.
+
+    Words are stemmed, so eg. "wars" matches "War".
+    """
+    query = SearchQuery(text, config=SEARCH_CONFIG)
+    return queryset.filter(search_vector=query).annotate(
+        rank=SearchRank(F('search_vector'), query),
+    ).order_by('-rank', 'id')
+
+
+def fuzzy_search(queryset, text):
+    """Return movies with title similar to `text`, most similar first.
+
+    Similarity threshold is `pg_trgm.similarity_threshold` (0.3 default).
+    """
+    return queryset.filter(title__trigram_similar=text).annotate(
+        rank=TrigramSimilarity('title', text),
+    ).order_by('-rank', 'id')
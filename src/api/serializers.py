@@ -1,13 +1,51 @@
 from rest_framework import serializers
 
-from api.models import Comment, Movie
+from api import timing
+from api.models import Comment, Movie, MovieJob
+from core import settings
 
 
-class MovieSerializer(serializers.ModelSerializer):
+class TimedListSerializer(serializers.ListSerializer):
+    """ListSerializer adding serialization time to request timings."""
+    @property
+    def data(self):
+        with timing.timed('serialize'):
+            return super().data
+
+
+class TimedSerializerMixin:
+    """Add serialization time to request timings."""
+    @property
+    def data(self):
+        with timing.timed('serialize'):
+            return super().data
+
+
+class MovieSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for retrieving movies list."""
     class Meta:
         model = Movie
-        fields = ('id', 'title', 'details')
+        fields = (
+            'id', 'title', 'details', 'comment_count', 'last_comment_at',
+        )
+        list_serializer_class = TimedListSerializer
+
+
+class MovieSearchSerializer(MovieSerializer):
+    """Serializer for movies found by search with their relevance."""
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta(MovieSerializer.Meta):
+        fields = MovieSerializer.Meta.fields + ('rank',)
+
+
+class MovieValuesSerializer(TimedSerializerMixin, serializers.BaseSerializer):
+    """Serialize movie rows fetched by `MovieProjection` from context."""
+    class Meta:
+        list_serializer_class = TimedListSerializer
+
+    def to_representation(self, instance):
+        return self.context['projection'].to_representation(instance)
 
 
 class MovieRequestSerializer(serializers.Serializer):
@@ -23,12 +61,41 @@ class MovieRequestSerializer(serializers.Serializer):
         }
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class MovieJobSerializer(serializers.ModelSerializer):
+    """Serialize status of asynchronous movie creation."""
+    class Meta:
+        model = MovieJob
+        fields = (
+            'id', 'title', 'status', 'attempts', 'created', 'updated',
+            'result',
+        )
+
+
+class MovieBulkRequestSerializer(serializers.Serializer):
+    """Serialize /movies/bulk POST request with list of titles."""
+    titles = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        allow_empty=False,
+        max_length=settings.MOVIES_BULK_MAX_TITLES,
+    )
+
+
+class CommentSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serialize Comment objects. Allows creating and retrieving comments."""
     movie_id = serializers.PrimaryKeyRelatedField(
-        queryset=Movie.objects.all()
+        queryset=Movie.objects.filter(pending=False)
     )
 
     class Meta:
         model = Comment
         fields = ('id', 'movie_id', 'comment')
+        list_serializer_class = TimedListSerializer
+
+
+class CommentBulkItemSerializer(serializers.Serializer):
+    """Validate single comment of /comments bulk POST request.
+
+    Existence of movies is validated for all comments at once.
+    """
+    movie_id = serializers.IntegerField()
+    comment = serializers.CharField()
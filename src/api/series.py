@@ -0,0 +1,87 @@
+import datetime
+from collections import OrderedDict
+
+from django.db.models import DateField, F, Sum
+from django.db.models.expressions import Window
+from django.db.models.functions import DenseRank, Trunc
+
+from api.models import DailyCommentCount
+
+
+DAY = 'day'
+WEEK = 'week'
+MONTH = 'month'
+PERIODS = (DAY, WEEK, MONTH)
+
+
+def get_bucket_start(day, period):
+    """Return first day of bucket containing `day`, like SQL date_trunc."""
+    if period == WEEK:
+        return day - datetime.timedelta(days=day.weekday())
+    if period == MONTH:
+        return day.replace(day=1)
+    return day
+
+
+def shift_bucket(start, period, count):
+    """Return start of bucket `count` buckets after bucket at `start`."""
+    if period == WEEK:
+        return start + datetime.timedelta(weeks=count)
+    if period == MONTH:
+        months = start.year * 12 + start.month - 1 + count
+        return start.replace(year=months // 12, month=months % 12 + 1)
+    return start + datetime.timedelta(days=count)
+
+
+def get_buckets(end, period, count):
+    """Return (start, end) days of the last `count` buckets up to `end`."""
+    last = get_bucket_start(end, period)
+    starts = [shift_bucket(last, period, -index) for index in range(count)]
+    return [
+        (start, shift_bucket(start, period, 1) - datetime.timedelta(days=1))
+        for start in reversed(starts)
+    ]
+
+
+def get_series_queryset(start, end, period):
+    """Return movies ranked in every bucket by comments from the rollup.
+
+    Rollup rows of the whole range are grouped by truncated day and
+    movie and ranked per bucket with one query.
+    """
+    return DailyCommentCount.objects.filter(
+        day__gte=start, day__lte=end,
+    ).annotate(
+        bucket=Trunc('day', period, output_field=DateField()),
+    ).values('bucket', 'movie_id').annotate(
+        total_comments=Sum('count'),
+    ).annotate(
+        rank=Window(
+            expression=DenseRank(),
+            partition_by=[F('bucket')],
+            order_by=F('total_comments').desc(),
+        ),
+    ).filter(total_comments__gt=0).order_by(
+        'bucket', '-total_comments', 'movie_id'
+    )
+
+
+def get_series(end, period, count):
+    """Return top lists of the last `count` buckets ending with `end` day.
+
+    Bucket without comments has empty list and the last bucket ends on
+    `end`, even if its period ends later.
+    """
+    buckets = get_buckets(end, period, count)
+    series = OrderedDict(
+        (start, {'start': start, 'end': min(bucket_end, end), 'movies': []})
+        for start, bucket_end in buckets
+    )
+    rows = get_series_queryset(buckets[0][0], end, period)
+    for row in rows:
+        series[row['bucket']]['movies'].append({
+            'movie_id': row['movie_id'],
+            'total_comments': row['total_comments'],
+            'rank': row['rank'],
+        })
+    return list(series.values())
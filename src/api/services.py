@@ -1,20 +1,159 @@
+import datetime
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+from api import metrics, timing
+from api.models import OMDBLookup
 from core import settings
 
 
 logger = logging.getLogger(__name__)
 
+# statuses of failed omdbapi calls which are retried
+RETRY_STATUSES = (500, 502, 503, 504)
+
 
 class InvalidStatusError(requests.exceptions.RequestException):
     """Server didn't send response with status code 200"""
 
 
-def get_omdb_movie(movie_title):
+class CircuitOpenError(requests.exceptions.RequestException):
+    """OMDB API failed too many times and isn't called for a while"""
+
+
+class CircuitBreaker:
+    """Fail fast after `threshold` consecutive failures.
+
+    When circuit is open calls are rejected for `timeout` seconds. Then
+    single trial call is let through (half-open state) - it closes the
+    circuit on success or opens it again on failure.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, threshold, timeout):
+        self.threshold = threshold
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.failures = 0
+            self.opened = None
+            self.trial = False
+
+    @property
+    def state(self):
+        if self.opened is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened < self.timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def before_call(self):
+        """Raise CircuitOpenError if call shouldn't be made."""
+        with self.lock:
+            state = self.state
+            if state == self.HALF_OPEN and not self.trial:
+                self.trial = True
+                return
+            if state != self.CLOSED:
+                raise CircuitOpenError('OMDB API circuit is open')
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened = None
+            self.trial = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.threshold:
+                if self.opened is None:
+                    logger.warning('omdbapi circuit opened')
+                self.opened = time.monotonic()
+            self.trial = False
+
+
+class RateLimiter:
+    """Token bucket limiting calls to `rate` per second.
+
+    Up to `burst` calls can be made at once after a period of inactivity.
+    """
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Wait until call can be made."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+def create_session(pool_size=None, retries=None, backoff_factor=None):
+    """Create session keeping connections alive and retrying failures."""
+    retry = Retry(
+        total=settings.OMDB_API_RETRIES if retries is None else retries,
+        backoff_factor=(
+            settings.OMDB_API_BACKOFF_FACTOR
+            if backoff_factor is None else backoff_factor
+        ),
+        status_forcelist=RETRY_STATUSES,
+        raise_on_status=False,
+    )
+    pool_size = pool_size or settings.OMDB_API_POOL_SIZE
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=pool_size,
+        max_retries=retry,
+    )
+    new_session = requests.Session()
+    new_session.mount('http://', adapter)
+    new_session.mount('https://', adapter)
+    return new_session
+
+
+# shared by all threads of the process
+session = create_session()
+circuit_breaker = CircuitBreaker(
+    settings.OMDB_API_BREAKER_THRESHOLD, settings.OMDB_API_BREAKER_TIMEOUT
+)
+
+
+def normalize_title(movie_title):
+    """Return title used as OMDB lookups cache key."""
+    return ' '.join(movie_title.split()).lower()
+
+
+def fetch_omdb_movie(movie_title):
     """Get movie details from external omdbapi.
 
+    Failed requests are retried and after too many consecutive failures
+    `CircuitOpenError` is raised without calling omdbapi.
+
     :raise requests.exceptions.RequestException: OMDB API call failed
 
     :param movie_title: unescaped movie title
@@ -24,20 +163,171 @@ def get_omdb_movie(movie_title):
         'apikey': settings.OMDB_API_KEY,
         't': movie_title,
     }
-    response = requests.get(
-        settings.OMDB_API_URL,
-        params=params,
-        timeout=settings.OMDB_API_TIMEOUT,
-    )
-    response.raise_for_status()
-    if response.ok:
-        payload = response.json()
-        # should be 404 IMO not 200 with 'Response': 'False'
-        if payload['Response'] == 'False':
-            raise requests.exceptions.HTTPError(404, 'Movie not found')
-        else:
-            logger.info("omdbapi request completed: %s", movie_title)
-            return payload
-    raise requests.exceptions.HTTPError(
-        response.status_code, 'OMDB API exception'
+    with metrics.omdb_call():
+        circuit_breaker.before_call()
+        try:
+            with timing.timed('omdb'):
+                response = session.get(
+                    settings.OMDB_API_URL,
+                    params=params,
+                    timeout=settings.OMDB_API_TIMEOUT,
+                )
+            response.raise_for_status()
+        except requests.exceptions.RequestException:
+            circuit_breaker.record_failure()
+            raise
+        circuit_breaker.record_success()
+        if response.ok:
+            return parse_omdb_payload(movie_title, response.json())
+        raise requests.exceptions.HTTPError(
+            response.status_code, 'OMDB API exception'
+        )
+
+
+def parse_omdb_payload(movie_title, payload):
+    """Return movie details from omdbapi payload.
+
+    :raise requests.exceptions.HTTPError: movie not found
+    """
+    # should be 404 IMO not 200 with 'Response': 'False'
+    if payload['Response'] == 'False':
+        raise requests.exceptions.HTTPError(404, 'Movie not found')
+    logger.info("omdbapi request completed: %s", movie_title)
+    return payload
+
+
+def is_lookup_expired(lookup):
+    if lookup.found:
+        timeout = settings.OMDB_CACHE_FOUND_TIMEOUT
+    else:
+        timeout = settings.OMDB_CACHE_NOT_FOUND_TIMEOUT
+    if timeout is None:
+        return False
+    expires = lookup.fetched + datetime.timedelta(seconds=timeout)
+    return expires <= timezone.now()
+
+
+def cache_omdb_lookup(movie_title, details):
+    """Store OMDB API lookup result, `details` is None if movie not found."""
+    if details is None:
+        timeout = settings.OMDB_CACHE_NOT_FOUND_TIMEOUT
+    else:
+        timeout = settings.OMDB_CACHE_FOUND_TIMEOUT
+    if timeout == 0:
+        return
+    OMDBLookup.objects.update_or_create(
+        key=normalize_title(movie_title),
+        defaults={'details': details, 'fetched': timezone.now()},
     )
+
+
+def get_cached_omdb_movie(movie_title):
+    """Get movie details from OMDB lookups cache.
+
+    :raise requests.exceptions.HTTPError: movie not found in omdbapi
+
+    :param movie_title: unescaped movie title
+    :return: JSON with movie details or None if lookup isn't cached
+    """
+    lookup = OMDBLookup.objects.filter(
+        key=normalize_title(movie_title)
+    ).first()
+    if lookup is None or is_lookup_expired(lookup):
+        metrics.record_cache_lookups(hits=0, misses=1)
+        return None
+    metrics.record_cache_lookups(hits=1, misses=0)
+    logger.debug("omdbapi lookup cache hit: %s", movie_title)
+    if not lookup.found:
+        raise requests.exceptions.HTTPError(404, 'Movie not found')
+    return lookup.details
+
+
+def get_omdb_movie(movie_title, use_cache=True):
+    """Get movie details from OMDB lookups cache or external omdbapi.
+
+    Both found and not found movies are cached in database. Failed calls
+    are not cached.
+
+    :raise requests.exceptions.RequestException: OMDB API call failed
+
+    :param movie_title: unescaped movie title
+    :param use_cache: set to False to skip cache and always call omdbapi
+    :return: JSON with movie details
+    """
+    if not use_cache:
+        return fetch_omdb_movie(movie_title)
+
+    details = get_cached_omdb_movie(movie_title)
+    if details is not None:
+        return details
+
+    try:
+        details = fetch_omdb_movie(movie_title)
+    except requests.exceptions.HTTPError as e:
+        if e.errno == 404:
+            cache_omdb_lookup(movie_title, None)
+        raise
+    cache_omdb_lookup(movie_title, details)
+    return details
+
+
+def get_omdb_movies(movie_titles, use_cache=True, max_workers=None,
+                    rate_limiter=None):
+    """Get details of many movies calling omdbapi concurrently.
+
+    Cached lookups are read with a single query, the rest of titles is
+    requested by a bounded pool of threads. Threads don't use database,
+    lookups are cached by the calling thread.
+
+    :param movie_titles: list of unescaped movie titles
+    :param use_cache: set to False to skip cache and always call omdbapi
+    :param max_workers: number of concurrent omdbapi requests
+    :param rate_limiter: `RateLimiter` of omdbapi requests
+    :return: dict mapping title to JSON with movie details or
+        `requests.exceptions.RequestException` raised for this title
+    """
+    results = {}
+    titles = list(dict.fromkeys(movie_titles))
+    if use_cache:
+        lookups = OMDBLookup.objects.in_bulk(
+            [normalize_title(title) for title in titles], field_name='key'
+        )
+        for title in titles:
+            lookup = lookups.get(normalize_title(title))
+            if lookup is None or is_lookup_expired(lookup):
+                continue
+            if lookup.found:
+                results[title] = lookup.details
+            else:
+                results[title] = requests.exceptions.HTTPError(
+                    404, 'Movie not found'
+                )
+        metrics.record_cache_lookups(
+            hits=len(results), misses=len(titles) - len(results)
+        )
+
+    def fetch(movie_title):
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        try:
+            return fetch_omdb_movie(movie_title)
+        except requests.exceptions.RequestException as e:
+            return e
+
+    missing_titles = [title for title in titles if title not in results]
+    if not missing_titles:
+        return results
+    max_workers = max_workers or settings.OMDB_API_WORKERS
+    # threads don't see timings of the request, so time all calls at once
+    with timing.timed('omdb'), ThreadPoolExecutor(
+            max_workers=max_workers) as executor:
+        fetched = list(executor.map(fetch, missing_titles))
+    for title, result in zip(missing_titles, fetched):
+        results[title] = result
+        if not use_cache:
+            continue
+        if not isinstance(result, Exception):
+            cache_omdb_lookup(title, result)
+        elif getattr(result, 'errno', None) == 404:
+            cache_omdb_lookup(title, None)
+    return results
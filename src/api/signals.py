@@ -0,0 +1,75 @@
+from collections import Counter
+
+from django.core.signals import request_started
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api import db, leaderboards
+from api.cache import invalidate_top
+from api.models import Comment, DailyCommentCount, Movie, Version
+
+
+def update_comment_counts(comments, delta):
+    """Update comment counters of movies, comments rollup, rolling windows
+    and cached top lists after comments write.
+
+    It's called for single comments by signal receivers and has to be
+    called explicitly after bulk writes which don't send signals.
+    """
+    daily_counts = Counter(
+        (comment.movie_id_id, comment.created.date()) for comment in comments
+    )
+    movie_counts = Counter(comment.movie_id_id for comment in comments)
+    last_created = {}
+    for comment in comments:
+        last_created[comment.movie_id_id] = max(
+            comment.created,
+            last_created.get(comment.movie_id_id, comment.created),
+        )
+    with leaderboards.counting() as windows:
+        for movie_id, count in movie_counts.items():
+            Movie.objects.count_comments(
+                movie_id, count * delta, last_created[movie_id]
+            )
+        for (movie_id, day), count in daily_counts.items():
+            DailyCommentCount.objects.add(movie_id, day, count * delta)
+            windows.add(movie_id, day, count * delta)
+    if delta < 0:
+        Version.objects.bump(Version.COMMENT_DELETES)
+    for day in {day for movie_id, day in daily_counts}:
+        invalidate_top(day)
+
+
+@receiver(post_save, sender=Comment)
+def count_created_comment(sender, instance, created, raw=False, **kwargs):
+    """Add new comment to the daily comments rollup."""
+    if created and not raw:
+        update_comment_counts([instance], 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    """Remove deleted comment from the daily comments rollup."""
+    update_comment_counts([instance], -1)
+
+
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+def invalidate_top_lists(sender, instance, created=True, **kwargs):
+    """Every top list contains all movies, so it has to be recomputed."""
+    if created:
+        invalidate_top()
+
+
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+def bump_movies_version(sender, instance, raw=False, **kwargs):
+    """Change validator of movies responses on every movie write."""
+    if not raw:
+        Version.objects.bump(Version.MOVIES)
+
+
+@receiver(request_started)
+def check_database_connections(sender, **kwargs):
+    """Don't let request fail on broken persistent database connection."""
+    db.check_connections_on_first_use()
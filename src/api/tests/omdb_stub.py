@@ -0,0 +1,76 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class OMDBStubHandler(BaseHTTPRequestHandler):
+    # keep connections alive like real omdbapi
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        stub = self.server.stub
+        title = parse_qs(urlparse(self.path).query).get('t', [''])[0]
+        status, payload = stub.get_response(title)
+        with stub.lock:
+            stub.requests.append(title)
+            stub.connections.add(self.client_address)
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class OMDBStubServer:
+    """Local HTTP server imitating omdbapi, use it as a context manager.
+
+    Movies are found by exact title from `movies` dict, other titles get
+    `Response: False` unless `find_all` is set. Statuses in `failures`
+    list are sent (and removed) before any regular response. Requested
+    titles are kept in `requests` and client addresses of used connections
+    in `connections`.
+    """
+    def __init__(self, movies=None, failures=None, delay=0, find_all=False,
+                 port=0):
+        self.movies = movies or {}
+        self.find_all = find_all
+        self.failures = list(failures or [])
+        self.delay = delay
+        self.requests = []
+        self.connections = set()
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(
+            ('127.0.0.1', port), OMDBStubHandler
+        )
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self.url = 'http://127.0.0.1:{}/'.format(self.server.server_port)
+
+    def get_response(self, title):
+        if self.delay:
+            threading.Event().wait(self.delay)
+        with self.lock:
+            if self.failures:
+                return self.failures.pop(0), {'Error': 'Stub failure'}
+        if title in self.movies:
+            return 200, dict(self.movies[title], Response='True')
+        if self.find_all:
+            return 200, {'Title': title, 'Response': 'True'}
+        return 200, {'Response': 'False', 'Error': 'Movie not found!'}
+
+    def __enter__(self):
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, kwargs={'poll_interval': 0.05}
+        )
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
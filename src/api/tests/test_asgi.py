@@ -0,0 +1,274 @@
+import asyncio
+import json
+from unittest.mock import patch
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.test import TransactionTestCase
+from requests.exceptions import ConnectionError, HTTPError
+from rest_framework import status
+
+from api.aio import get_omdb_movie_async
+from api.asgi import ASGIHandler
+from api.locks import AdvisoryLock
+from api.models import Movie, MovieAlias, OMDBLookup
+from api.services import CircuitBreaker, CircuitOpenError, create_session
+from api.tests.omdb_stub import OMDBStubServer
+from core import settings
+
+
+class AsyncTestMixin:
+    def setUp(self):
+        self.movie = {'Title': 'Take on Me'}
+        self.breaker = CircuitBreaker(threshold=2, timeout=60)
+        patchers = [
+            patch('api.services.circuit_breaker', self.breaker),
+            patch('api.services.session', create_session(backoff_factor=0)),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def stub(self, **kwargs):
+        stub = OMDBStubServer(movies={'Take on Me': self.movie}, **kwargs)
+        url_patcher = patch.object(settings, 'OMDB_API_URL', stub.url)
+        url_patcher.start()
+        self.addCleanup(url_patcher.stop)
+        return stub
+
+
+class AsyncOMDBClientTestCase(AsyncTestMixin, TransactionTestCase):
+    """Test asyncio omdbapi lookups with stub omdbapi"""
+    def get(self, *titles, use_cache=False):
+        async def get_all():
+            return await asyncio.gather(*(
+                get_omdb_movie_async(title, use_cache=use_cache)
+                for title in titles
+            ), return_exceptions=True)
+        return asyncio.run(get_all())
+
+    def test_get_movie(self):
+        with self.stub() as stub:
+            details, = self.get('Take on Me')
+        self.assertEqual(details['Title'], 'Take on Me')
+        self.assertListEqual(stub.requests, ['Take on Me'])
+
+    def test_movie_not_found(self):
+        """Test if missing movie raises the same error as sync client"""
+        with self.stub():
+            error, = self.get('Unknown')
+        self.assertIsInstance(error, HTTPError)
+        self.assertEqual(error.errno, 404)
+
+    def test_retry_failed_request(self):
+        with self.stub(failures=[503, 502]) as stub:
+            details, = self.get('Take on Me')
+        self.assertEqual(details['Title'], 'Take on Me')
+        self.assertEqual(len(stub.requests), 3)
+
+    def test_raise_after_retries(self):
+        with self.stub(failures=[500, 500, 500]) as stub:
+            error, = self.get('Take on Me')
+        self.assertIsInstance(error, HTTPError)
+        self.assertEqual(len(stub.requests), 3)
+
+    def test_open_circuit(self):
+        """Test if async client shares circuit breaker"""
+        self.breaker.threshold = 0
+        self.breaker.record_failure()
+        with self.stub() as stub:
+            error, = self.get('Take on Me')
+        self.assertIsInstance(error, CircuitOpenError)
+        self.assertListEqual(stub.requests, [])
+
+    def test_timeout(self):
+        """Test if timed out requests are retried like by sync client"""
+        with patch.object(settings, 'OMDB_API_TIMEOUT', 0.05):
+            with self.stub(delay=0.2):
+                error, = self.get('Take on Me')
+        # requests reports read timeout after retries as connection error
+        self.assertIsInstance(error, ConnectionError)
+        self.assertIn('Read timed out', str(error))
+
+    def test_connection_error(self):
+        with self.stub() as stub:
+            pass
+        with patch.object(settings, 'OMDB_API_URL', stub.url):
+            error, = self.get('Take on Me')
+        self.assertIsInstance(error, ConnectionError)
+
+    def test_merge_concurrent_lookups(self):
+        """Test if lookups of the same normalized title call omdbapi once"""
+        with self.stub(delay=0.1) as stub:
+            results = self.get('Take on Me', 'take  on me', 'TAKE ON ME')
+        self.assertListEqual(
+            [details['Title'] for details in results], ['Take on Me'] * 3
+        )
+        self.assertEqual(len(stub.requests), 1)
+
+    def test_skip_locked_lookup(self):
+        """Test if movie created by another request isn't looked up"""
+        with self.stub() as stub, \
+                AdvisoryLock('movie:take-on-me', 0) as lock:
+            self.assertTrue(lock.acquired)
+            details, = self.get('Take on Me')
+        self.assertIsNone(details)
+        self.assertListEqual(stub.requests, [])
+
+    def test_cache_lookup(self):
+        with self.stub() as stub:
+            self.get('Take on Me', use_cache=True)
+            details, = self.get('Take on Me', use_cache=True)
+        self.assertEqual(details['Title'], 'Take on Me')
+        self.assertEqual(len(stub.requests), 1)
+        self.assertTrue(OMDBLookup.objects.get(key='take on me').found)
+
+
+class ASGIHandlerTestCase(AsyncTestMixin, TransactionTestCase):
+    """Test ASGI application passing requests to Django"""
+    def setUp(self):
+        super().setUp()
+        self.application = ASGIHandler(WSGIHandler(), max_workers=2)
+
+    async def call(self, method, path, data=None, query_string=b'',
+                   root_path=''):
+        body = b'' if data is None else json.dumps(data).encode()
+        messages = [{'type': 'http.request', 'body': body}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        await self.application({
+            'type': 'http',
+            'http_version': '1.1',
+            'method': method,
+            'path': path,
+            'root_path': root_path,
+            'query_string': query_string,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+            ],
+        }, receive, send)
+        self.assertEqual(sent[0]['type'], 'http.response.start')
+        return sent[0]['status'], json.loads(
+            b''.join(message.get('body', b'') for message in sent[1:])
+        )
+
+    def test_create_movie(self):
+        with self.stub() as stub:
+            response_status, data = asyncio.run(
+                self.call('POST', '/movies/', {'title': 'Take on Me'})
+            )
+        self.assertEqual(response_status, status.HTTP_201_CREATED)
+        self.assertEqual(data['title'], 'Take on Me')
+        self.assertListEqual(stub.requests, ['Take on Me'])
+
+    def test_create_movie_below_root_path(self):
+        """Test if movie is prefetched when application isn't at root"""
+        with self.stub() as stub, \
+                patch('api.views.get_omdb_movie') as get_omdb_movie:
+            response_status, _ = asyncio.run(self.call(
+                'POST', '/api/movies/', {'title': 'Take on Me'},
+                root_path='/api',
+            ))
+        self.assertEqual(response_status, status.HTTP_201_CREATED)
+        self.assertListEqual(stub.requests, ['Take on Me'])
+        get_omdb_movie.assert_not_called()
+
+    def test_create_existing_movie(self):
+        """Test if omdbapi isn't called for existing movie"""
+        Movie.objects.create(
+            title='Take on Me', details=self.movie, slug='take-on-me'
+        )
+        with self.stub() as stub:
+            response_status, _ = asyncio.run(
+                self.call('POST', '/movies/', {'title': 'Take on Me'})
+            )
+        self.assertEqual(response_status, status.HTTP_409_CONFLICT)
+        self.assertListEqual(stub.requests, [])
+
+    def test_create_movie_by_alias(self):
+        """Test if omdbapi isn't called for known title variant"""
+        Movie.objects.create(
+            title='Take on Me', details=self.movie, slug='take-on-me'
+        )
+        MovieAlias.objects.add({'a-ha-take-on-me': 'take-on-me'})
+        with self.stub() as stub:
+            response_status, _ = asyncio.run(
+                self.call('POST', '/movies/', {'title': 'A-ha Take on Me'})
+            )
+        self.assertEqual(response_status, status.HTTP_409_CONFLICT)
+        self.assertListEqual(stub.requests, [])
+
+    def test_create_movie_async(self):
+        """Test if omdbapi isn't called for movie created by worker"""
+        with self.stub() as stub:
+            response_status, data = asyncio.run(self.call(
+                'POST', '/movies/', {'title': 'Take on Me'},
+                query_string=b'async=true',
+            ))
+        self.assertEqual(response_status, status.HTTP_202_ACCEPTED)
+        self.assertEqual(data['title'], 'Take on Me')
+        self.assertListEqual(stub.requests, [])
+
+    def test_create_not_found_movie(self):
+        with self.stub():
+            response_status, data = asyncio.run(
+                self.call('POST', '/movies/', {'title': 'Unknown'})
+            )
+        self.assertEqual(
+            response_status, status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+        self.assertDictEqual(data, {'OMDB API': ['Movie not found']})
+
+    def test_create_invalid_request(self):
+        with self.stub() as stub:
+            response_status, _ = asyncio.run(self.call('POST', '/movies/', {}))
+        self.assertEqual(response_status, status.HTTP_400_BAD_REQUEST)
+        self.assertListEqual(stub.requests, [])
+
+    def test_create_movie_concurrently(self):
+        """Test if concurrent requests for one title call omdbapi once"""
+        async def create_all():
+            return await asyncio.gather(*(
+                self.call('POST', '/movies/', {'title': title})
+                for title in ('Take on Me', 'Take  on me')
+            ))
+        with self.stub(delay=0.1, find_all=True) as stub:
+            results = asyncio.run(create_all())
+        self.assertListEqual(sorted(result[0] for result in results), [
+            status.HTTP_201_CREATED, status.HTTP_409_CONFLICT,
+        ])
+        self.assertEqual(len(stub.requests), 1)
+        self.assertEqual(Movie.objects.count(), 1)
+
+    def test_get_movies(self):
+        Movie.objects.create(
+            title='Take on Me', details=self.movie, slug='take-on-me'
+        )
+        response_status, data = asyncio.run(
+            self.call('GET', '/movies/', query_string=b'stream=1')
+        )
+        self.assertEqual(response_status, status.HTTP_200_OK)
+        self.assertEqual(len(data), 1)
+
+    def test_lifespan(self):
+        messages = [
+            {'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'},
+        ]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        asyncio.run(self.application({'type': 'lifespan'}, receive, send))
+        self.assertListEqual(sent, [
+            'lifespan.startup.complete', 'lifespan.shutdown.complete',
+        ])
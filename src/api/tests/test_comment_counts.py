@@ -0,0 +1,126 @@
+import datetime
+from io import StringIO
+from unittest.mock import Mock, patch
+
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api.models import Comment, Movie
+
+
+def create_movie(title):
+    return Movie.objects.create(
+        title=title, details={'Title': title}, slug=title.lower(),
+    )
+
+
+def create_comment(movie, created):
+    with patch('django.utils.timezone.now', Mock(return_value=created)):
+        return Comment.objects.create(movie_id=movie, comment='comment')
+
+
+class MovieCommentCountsTestCase(APITestCase):
+    """Test comment counters of movies kept on comments write"""
+    def setUp(self):
+        self.first = create_movie('First')
+        self.second = create_movie('Second')
+        self.created = datetime.datetime(2018, 4, 4, 12, 0, 0)
+
+    def assertCounters(self, movie, count, last_comment_at):
+        movie.refresh_from_db()
+        self.assertEqual(movie.comment_count, count)
+        self.assertEqual(movie.last_comment_at, last_comment_at)
+
+    def test_create_and_delete(self):
+        later = self.created + datetime.timedelta(hours=1)
+        first_comment = create_comment(self.first, self.created)
+        last_comment = create_comment(self.first, later)
+        # comment created earlier doesn't move last comment time back
+        create_comment(self.first, self.created)
+        self.assertCounters(self.first, 3, later)
+        self.assertCounters(self.second, 0, None)
+
+        last_comment.delete()
+        self.assertCounters(self.first, 2, self.created)
+        first_comment.delete()
+        self.assertCounters(self.first, 1, self.created)
+
+    def test_bulk_create(self):
+        response = self.client.post(reverse('comment-list'), [
+            {'movie_id': self.first.id, 'comment': 'first'},
+            {'movie_id': self.second.id, 'comment': 'second'},
+            {'movie_id': self.second.id, 'comment': 'third'},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual(self.first.comment_count, 1)
+        self.assertEqual(self.second.comment_count, 2)
+        self.assertEqual(
+            self.second.last_comment_at,
+            Comment.objects.get(comment='third').created,
+        )
+
+    def test_movies_list(self):
+        create_comment(self.second, self.created)
+        response = self.client.get(
+            reverse('movie-list'),
+            {'ordering': '-comment_count', 'fields': 'title,comment_count'},
+        )
+        self.assertListEqual(response.json(), [
+            {'title': 'Second', 'comment_count': 1},
+            {'title': 'First', 'comment_count': 0},
+        ])
+
+    def test_movies_list_modified_by_comment(self):
+        url = reverse('movie-list')
+        response = self.client.get(url)
+        create_comment(self.first, self.created)
+        modified = self.client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(modified.status_code, status.HTTP_200_OK)
+
+    def test_movies_list_modified_by_comment_delete(self):
+        url = reverse('movie-list')
+        comment = create_comment(self.first, self.created)
+        create_comment(self.first, self.created)
+        response = self.client.get(url)
+        # time of the last comment stays the same
+        comment.delete()
+        modified = self.client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(modified.status_code, status.HTTP_200_OK)
+        counts = {
+            movie['title']: movie['comment_count'] for movie in modified.json()
+        }
+        self.assertEqual(counts['First'], 1)
+
+    def test_check_command(self):
+        create_comment(self.first, self.created)
+        create_comment(self.second, self.created)
+        Movie.objects.filter(id=self.first.id).update(
+            comment_count=5, last_comment_at=None
+        )
+        out = StringIO()
+        call_command('check_comment_counts', stdout=out)
+        self.assertIn(
+            'Found wrong comment counters of 1 movies', out.getvalue()
+        )
+        self.assertCounters(self.first, 5, None)
+
+        out = StringIO()
+        call_command(
+            'check_comment_counts', '--repair', '--batch-size', '1',
+            stdout=out,
+        )
+        self.assertIn('Repaired comment counters of 1 movies', out.getvalue())
+        self.assertCounters(self.first, 1, self.created)
+        self.assertCounters(self.second, 1, self.created)
+
+        out = StringIO()
+        call_command('check_comment_counts', stdout=out)
+        self.assertIn('are correct', out.getvalue())
@@ -0,0 +1,153 @@
+import datetime
+from unittest.mock import Mock, patch
+
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api.models import Comment, Movie
+from api.refresh import update_movies
+
+
+def create_movie(title):
+    return Movie.objects.create(
+        title=title, details={'Title': title}, slug=title.lower(),
+    )
+
+
+class ConditionalGetTestCase(APITestCase):
+    """Test answering repeated GET with 304 Not Modified"""
+    def setUp(self):
+        self.movie = create_movie('First')
+        mocked = datetime.datetime(2018, 4, 4, 12, 0, 0)
+        with patch('django.utils.timezone.now', Mock(return_value=mocked)):
+            self.comment = Comment.objects.create(
+                movie_id=self.movie, comment='comment 1'
+            )
+
+    def assertNotModified(self, url, params=None, queries=1):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(queries):
+            not_modified = self.client.get(
+                url, params, HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(
+            not_modified.status_code, status.HTTP_304_NOT_MODIFIED
+        )
+        self.assertEqual(not_modified.content, b'')
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+        return response
+
+    def assertModified(self, url, response, params=None):
+        modified = self.client.get(
+            url, params, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(modified.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(modified['ETag'], response['ETag'])
+
+    def test_headers(self):
+        response = self.client.get(reverse('movie-list'))
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(
+            response['Cache-Control'], 'public, must-revalidate, max-age=0'
+        )
+        self.assertEqual(response['Vary'], 'Accept')
+
+    def test_movies(self):
+        url = reverse('movie-list')
+        # versions and time of the last comment
+        response = self.assertNotModified(url, queries=2)
+        create_movie('Second')
+        self.assertModified(url, response)
+
+    def test_movies_refreshed(self):
+        url = reverse('movie-detail', args=[self.movie.id])
+        response = self.assertNotModified(url, queries=2)
+        self.movie.details = {'Title': 'First', 'Year': '2018'}
+        update_movies([self.movie], None)
+        self.assertModified(url, response)
+
+    def test_query_changes_etag(self):
+        url = reverse('movie-list')
+        response = self.client.get(url)
+        self.assertModified(url, response, {'fields': 'id'})
+
+    def test_if_modified_since(self):
+        url = reverse('movie-list')
+        response = self.client.get(url)
+        not_modified = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(
+            not_modified.status_code, status.HTTP_304_NOT_MODIFIED
+        )
+
+    def test_comments(self):
+        url = reverse('comment-list')
+        params = {'movie_id': self.movie.id}
+        # movie existence check reads comment counters, then deletes
+        # version
+        response = self.assertNotModified(url, params, queries=2)
+        Comment.objects.create(movie_id=self.movie, comment='comment 2')
+        self.assertModified(url, response, params)
+
+        response = self.client.get(url, params)
+        self.comment.delete()
+        self.assertModified(url, response, params)
+
+    def test_comments_modified_since_delete(self):
+        """Test if deleting older comment moves Last-Modified"""
+        later = datetime.datetime(2018, 4, 5, 12, 0, 0)
+        with patch('django.utils.timezone.now', Mock(return_value=later)):
+            Comment.objects.create(movie_id=self.movie, comment='comment 2')
+        url = reverse('comment-list')
+        lists = [{}, {'movie_id': self.movie.id}]
+        last_modified = [
+            self.client.get(url, params)['Last-Modified'] for params in lists
+        ]
+        self.comment.delete()
+        for params, since in zip(lists, last_modified):
+            modified = self.client.get(
+                url, params, HTTP_IF_MODIFIED_SINCE=since
+            )
+            self.assertEqual(modified.status_code, status.HTTP_200_OK)
+
+    def test_comments_of_other_movie(self):
+        url = reverse('comment-list')
+        params = {'movie_id': self.movie.id}
+        response = self.client.get(url, params)
+        Comment.objects.create(
+            movie_id=create_movie('Second'), comment='comment 2'
+        )
+        self.assertNotModified(url, params, queries=2)
+        self.assertEqual(
+            self.client.get(url, params)['ETag'], response['ETag']
+        )
+
+    def test_invalid_comments_params(self):
+        response = self.client.get(
+            reverse('comment-list'), {'movie_id': 'first'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertNotIn('ETag', response)
+
+    def test_top(self):
+        url = reverse('top')
+        params = {'start': '2018-04-01', 'end': '2018-04-30'}
+        # rollup aggregate and movies version
+        response = self.assertNotModified(url, params, queries=2)
+
+        # comment out of range
+        Comment.objects.create(movie_id=self.movie, comment='comment 2')
+        self.assertNotModified(url, params, queries=2)
+
+        mocked = datetime.datetime(2018, 4, 5, 12, 0, 0)
+        with patch('django.utils.timezone.now', Mock(return_value=mocked)):
+            Comment.objects.create(movie_id=self.movie, comment='comment 3')
+        self.assertModified(url, response, params)
+
+        response = self.client.get(url, params)
+        create_movie('Second')
+        self.assertModified(url, response, params)
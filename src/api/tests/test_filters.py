@@ -0,0 +1,142 @@
+from decimal import Decimal
+
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api.models import Movie
+from api.refresh import update_movies
+
+
+class MovieFiltersTestCase(APITestCase):
+    """Test filtering and ordering movies by values of details"""
+    url = reverse('movie-list')
+
+    def setUp(self):
+        self.movies = {}
+        for title, details in [
+            ('Heat', {
+                'Year': '1995', 'Genre': 'Action, Crime, Drama',
+                'imdbRating': '8.3', 'Runtime': '170 min',
+            }),
+            ('Amelie', {
+                'Year': '2001', 'Genre': 'Comedy, Romance',
+                'imdbRating': '8.3', 'Runtime': '122 min',
+            }),
+            ('Lost', {
+                'Year': '2004-2010', 'Genre': 'Adventure, Drama, Fantasy',
+                'imdbRating': '8.3', 'Runtime': '44 min',
+            }),
+            ('Unknown', {
+                'Year': 'N/A', 'Genre': 'N/A',
+                'imdbRating': 'N/A', 'Runtime': 'N/A',
+            }),
+        ]:
+            self.movies[title] = Movie.objects.create(
+                title=title, details=dict(details, Title=title),
+                slug=title.lower(),
+            )
+
+    def get_titles(self, params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [movie['title'] for movie in response.data]
+
+    def assertFound(self, params, titles):
+        self.assertEqual(
+            sorted(self.get_titles(params)), sorted(titles)
+        )
+
+    def test_extracted_values(self):
+        movie = Movie.objects.get(title='Lost')
+        self.assertEqual(movie.year, 2004)
+        self.assertEqual(movie.genres, ['adventure', 'drama', 'fantasy'])
+        self.assertEqual(movie.imdb_rating, Decimal('8.3'))
+        self.assertEqual(movie.runtime, 44)
+        movie = Movie.objects.get(title='Unknown')
+        self.assertIsNone(movie.year)
+        self.assertEqual(movie.genres, [])
+        self.assertIsNone(movie.imdb_rating)
+        self.assertIsNone(movie.runtime)
+
+    def test_values_updated_with_details(self):
+        movie = self.movies['Unknown']
+        movie.details = {'Year': '2018', 'Genre': 'Drama'}
+        update_movies([movie], None)
+        movie = Movie.objects.get(title='Unknown')
+        self.assertEqual(movie.year, 2018)
+        self.assertEqual(movie.genres, ['drama'])
+
+    def test_year(self):
+        self.assertFound({'year': 1995}, ['Heat'])
+        self.assertFound({'year_gte': 2001}, ['Amelie', 'Lost'])
+        self.assertFound({'year_gte': 1990, 'year_lte': 2001},
+                         ['Heat', 'Amelie'])
+
+    def test_genre(self):
+        self.assertFound({'genre': 'drama'}, ['Heat', 'Lost'])
+        self.assertFound({'genre': 'Drama, Crime'}, ['Heat'])
+        self.assertFound({'genre': 'western'}, [])
+
+    def test_rating_and_runtime(self):
+        self.assertFound(
+            {'imdb_rating_gte': '8.3'}, ['Heat', 'Amelie', 'Lost']
+        )
+        self.assertFound({'imdb_rating_lte': '8'}, [])
+        self.assertFound({'runtime_gte': 100, 'runtime_lte': 150},
+                         ['Amelie'])
+
+    def test_ordering(self):
+        self.assertEqual(
+            self.get_titles({'ordering': '-runtime'}),
+            ['Heat', 'Amelie', 'Lost', 'Unknown'],
+        )
+        self.assertEqual(
+            self.get_titles({'ordering': '-imdb_rating,title'}),
+            ['Amelie', 'Heat', 'Lost', 'Unknown'],
+        )
+        self.assertEqual(
+            self.get_titles({'ordering': 'year', 'fields': 'title'}),
+            ['Heat', 'Amelie', 'Lost', 'Unknown'],
+        )
+
+    def test_stream_ordering(self):
+        response = self.client.get(
+            self.url, {'ordering': '-year', 'stream': 1, 'fields': 'title'}
+        )
+        self.assertEqual(
+            b''.join(response.streaming_content),
+            b'[{"title":"Lost"},{"title":"Amelie"},{"title":"Heat"},'
+            b'{"title":"Unknown"}]',
+        )
+
+    def test_paginated_list_filtered(self):
+        response = self.client.get(
+            self.url, {'genre': 'drama', 'page_size': 1}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [movie['title'] for movie in response.data['results']], ['Heat']
+        )
+        response = self.client.get(
+            self.url, {'ordering': 'year', 'page_size': 1}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('ordering', response.data)
+
+    def test_invalid_params(self):
+        response = self.client.get(
+            self.url, {'year_gte': 'new', 'imdb_rating_lte': 'nan',
+                       'ordering': 'rating'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            sorted(response.data), ['imdb_rating_lte', 'ordering', 'year_gte']
+        )
+
+    def test_search_filtered(self):
+        response = self.client.get(
+            reverse('movie-search'), {'q': 'lost', 'year_lte': 2000}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [])
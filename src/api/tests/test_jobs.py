@@ -0,0 +1,208 @@
+import datetime
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from requests.exceptions import ConnectionError, HTTPError
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api.jobs import claim_jobs, enqueue_movie, process_jobs
+from api.models import Movie, MovieJob
+from api.services import create_session
+from api.tests.omdb_stub import OMDBStubServer
+from api.utils import get_details_hash
+from core import settings
+
+
+class MovieAsyncCreateTestCase(APITestCase):
+    """Test creating movies with POST /movies?async=1"""
+    def post(self, title):
+        return self.client.post(
+            reverse('movie-list') + '?async=1', {'title': title},
+            format='json',
+        )
+
+    def test_create_pending_movie(self):
+        response = self.post('Take on Me')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], MovieJob.PENDING)
+        self.assertEqual(response['Location'], response.data['url'])
+        self.assertTrue(Movie.objects.get(slug='take-on-me').pending)
+
+        # pending movie is hidden until worker fetches details
+        response = self.client.get(reverse('movie-list'))
+        self.assertListEqual(response.data, [])
+
+    def test_get_job_status(self):
+        url = self.post('Take on Me').data['url']
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['title'], 'Take on Me')
+        self.assertEqual(response.data['status'], MovieJob.PENDING)
+        self.assertIsNone(response.data['result'])
+
+    def test_create_pending_movie_twice(self):
+        """Test if the same title waiting for details shares job"""
+        first = self.post('Take on Me')
+        second = self.post('take on me')
+        self.assertEqual(second.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(first.data['id'], second.data['id'])
+        self.assertEqual(MovieJob.objects.count(), 1)
+
+    def test_create_existing_movie(self):
+        Movie.objects.create(
+            title='Take on Me', details={}, slug='take-on-me'
+        )
+        response = self.post('Take on Me')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(MovieJob.objects.exists())
+
+    def test_comment_pending_movie(self):
+        self.post('Take on Me')
+        movie = Movie.objects.get(slug='take-on-me')
+        response = self.client.post(
+            reverse('comment-list'),
+            {'movie_id': movie.id, 'comment': 'Nice'}, format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_comments_of_pending_movie(self):
+        self.post('Take on Me')
+        movie = Movie.objects.get(slug='take-on-me')
+        response = self.client.get(
+            reverse('comment-list'), {'movie_id': movie.id}
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @patch('api.views.get_omdb_movie')
+    def test_create_pending_movie_synchronously(self, get_omdb_movie):
+        """Test if title waiting for details gets its job, it may still
+        fail, instead of conflict"""
+        job = self.post('Take on Me').data
+        response = self.client.post(
+            reverse('movie-list'), {'title': 'take on me'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['id'], job['id'])
+        self.assertEqual(response['Location'], job['url'])
+        get_omdb_movie.assert_not_called()
+
+
+@patch('api.jobs.get_omdb_movies')
+class ProcessJobsTestCase(APITestCase):
+    """Test processing jobs of asynchronously created movies"""
+    def setUp(self):
+        self.job, _ = enqueue_movie('take on me')
+
+    def process(self):
+        return process_jobs(claim_jobs(10))
+
+    def test_publish_movie(self, get_omdb_movies):
+        get_omdb_movies.return_value = {
+            'take on me': {'Title': 'Take on Me', 'Response': 'True'},
+        }
+        result, = self.process()
+        self.assertEqual(result['result'], 'created')
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, MovieJob.DONE)
+        self.assertEqual(self.job.result['status'], status.HTTP_201_CREATED)
+        movie = Movie.objects.get()
+        self.assertFalse(movie.pending)
+        self.assertEqual(movie.title, 'Take on Me')
+        self.assertEqual(movie.details_hash, get_details_hash(movie.details))
+        self.assertIsNotNone(movie.refreshed)
+
+        response = self.client.get(reverse('movie-list'))
+        self.assertEqual(response.data[0]['title'], 'Take on Me')
+
+    def test_movie_not_found(self, get_omdb_movies):
+        get_omdb_movies.return_value = {
+            'take on me': HTTPError(404, 'Movie not found'),
+        }
+        result, = self.process()
+        self.assertEqual(result['result'], 'not found')
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, MovieJob.FAILED)
+        self.assertEqual(
+            self.job.result['data'], {'OMDB API': ['Movie not found']}
+        )
+        self.assertFalse(Movie.objects.exists())
+
+    def test_retry_failed_call(self, get_omdb_movies):
+        get_omdb_movies.return_value = {'take on me': ConnectionError()}
+        self.process()
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, MovieJob.PENDING)
+        self.assertEqual(self.job.attempts, 1)
+        self.assertGreater(self.job.run_after, timezone.now())
+        self.assertEqual(self.job.result['result'], 'upstream error')
+        # retried job isn't ready yet
+        self.assertListEqual(claim_jobs(10), [])
+
+    def test_fail_after_attempts(self, get_omdb_movies):
+        get_omdb_movies.return_value = {'take on me': ConnectionError()}
+        with patch.object(settings, 'MOVIE_JOBS_MAX_ATTEMPTS', 2):
+            for _ in range(2):
+                MovieJob.objects.update(run_after=timezone.now())
+                self.process()
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, MovieJob.FAILED)
+        self.assertEqual(self.job.attempts, 2)
+        self.assertFalse(Movie.objects.exists())
+
+    def test_movie_exists_under_full_title(self, get_omdb_movies):
+        Movie.objects.create(
+            title='Take on Me (1985)', details={}, slug='take-on-me-1985'
+        )
+        get_omdb_movies.return_value = {
+            'take on me': {'Title': 'Take on Me (1985)', 'Response': 'True'},
+        }
+        result, = self.process()
+        self.assertEqual(result['result'], 'exists')
+        self.assertEqual(result['status'], status.HTTP_409_CONFLICT)
+        self.assertEqual(Movie.objects.count(), 1)
+        # the same title is rejected without creating job
+        self.assertEqual(enqueue_movie('Take on me'), (None, False))
+
+    def test_claim_postpones_job(self, get_omdb_movies):
+        job, = claim_jobs(10)
+        self.assertEqual(job.attempts, 1)
+        self.assertListEqual(claim_jobs(10), [])
+        lease = datetime.timedelta(seconds=settings.MOVIE_JOBS_LEASE)
+        MovieJob.objects.update(run_after=timezone.now() - lease)
+        job, = claim_jobs(10)
+        self.assertEqual(job.attempts, 2)
+
+
+class ProcessMovieJobsCommandTestCase(TransactionTestCase):
+    """Test worker command with stub omdbapi"""
+    def setUp(self):
+        patcher = patch(
+            'api.services.session', create_session(backoff_factor=0)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_process_jobs_once(self):
+        for title in ('Take on Me', 'Unknown', 'The Sun Always Shines'):
+            enqueue_movie(title)
+        stub = OMDBStubServer(movies={
+            'Take on Me': {'Title': 'Take on Me'},
+            'The Sun Always Shines': {'Title': 'The Sun Always Shines'},
+        })
+        out = StringIO()
+        with stub, patch.object(settings, 'OMDB_API_URL', stub.url):
+            call_command(
+                'process_movie_jobs', '--once', '--batch-size', '2',
+                stdout=out,
+            )
+        self.assertIn('created: 2, not found: 1', out.getvalue())
+        self.assertListEqual(
+            list(Movie.objects.order_by('id').values_list('title', 'pending')),
+            [('Take on Me', False), ('The Sun Always Shines', False)],
+        )
+        self.assertEqual(len(stub.requests), 3)
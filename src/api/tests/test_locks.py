@@ -0,0 +1,105 @@
+import threading
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import Client, TransactionTestCase
+from django.urls import reverse
+from rest_framework import status
+
+from api.locks import AdvisoryLock
+from api.models import Movie
+from api.services import create_session
+from api.tests.omdb_stub import OMDBStubServer
+from core import settings
+
+
+def run_in_threads(func, count):
+    """Call func in `count` threads, return their results."""
+    results = [None] * count
+
+    def run(index):
+        try:
+            results[index] = func()
+        finally:
+            connection.close()
+
+    threads = [
+        threading.Thread(target=run, args=(index,)) for index in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class AdvisoryLockTestCase(TransactionTestCase):
+    """Test advisory locks shared by database sessions"""
+    def test_wait_for_lock(self):
+        """Test if lock held by another session times out"""
+        with AdvisoryLock('movie:take-on-me', timeout=1) as lock:
+            self.assertTrue(lock.acquired)
+            self.assertFalse(lock.waited)
+
+            def try_lock():
+                with AdvisoryLock('movie:take-on-me', timeout=0.1) as lock:
+                    return lock.acquired, lock.waited
+            self.assertListEqual(run_in_threads(try_lock, 1), [(False, True)])
+
+    def test_release_lock(self):
+        with AdvisoryLock('movie:take-on-me', timeout=1):
+            pass
+
+        def try_lock():
+            with AdvisoryLock('movie:take-on-me', timeout=0) as lock:
+                return lock.acquired
+        self.assertListEqual(run_in_threads(try_lock, 1), [True])
+
+    def test_different_names(self):
+        with AdvisoryLock('movie:take-on-me', timeout=1):
+            def try_lock():
+                with AdvisoryLock('movie:a-ha', timeout=0) as lock:
+                    return lock.acquired
+            self.assertListEqual(run_in_threads(try_lock, 1), [True])
+
+
+class MovieConcurrentCreateTestCase(TransactionTestCase):
+    """Test single-flight creation of the same movie by many requests"""
+    def setUp(self):
+        patcher = patch(
+            'api.services.session', create_session(backoff_factor=0)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create(self):
+        return Client().post(
+            reverse('movie-list'), {'title': 'Take on Me'},
+            content_type='application/json',
+        ).status_code
+
+    def test_create_movie_once(self):
+        """Test if only the first request calls omdbapi"""
+        stub = OMDBStubServer(
+            movies={'Take on Me': {'Title': 'Take on Me'}}, delay=0.2
+        )
+        with stub, patch.object(settings, 'OMDB_API_URL', stub.url):
+            statuses = run_in_threads(self.create, 4)
+        self.assertListEqual(sorted(statuses), [
+            status.HTTP_201_CREATED,
+            status.HTTP_409_CONFLICT,
+            status.HTTP_409_CONFLICT,
+            status.HTTP_409_CONFLICT,
+        ])
+        self.assertListEqual(stub.requests, ['Take on Me'])
+        self.assertEqual(Movie.objects.count(), 1)
+
+    def test_not_found_movie_once(self):
+        """Test if waiting requests get not found lookup from cache"""
+        stub = OMDBStubServer(delay=0.2)
+        with stub, patch.object(settings, 'OMDB_API_URL', stub.url):
+            statuses = run_in_threads(self.create, 3)
+        self.assertListEqual(
+            statuses, [status.HTTP_503_SERVICE_UNAVAILABLE] * 3
+        )
+        self.assertListEqual(stub.requests, ['Take on Me'])
@@ -0,0 +1,194 @@
+import json
+import os
+import tempfile
+from unittest.mock import patch
+
+import requests
+from django.test import SimpleTestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api import metrics
+from api.models import OMDBLookup
+from api.services import circuit_breaker, fetch_omdb_movie
+from api.services import get_cached_omdb_movie
+from core import settings
+
+
+def get_samples(text):
+    """Return sample values by name with labels."""
+    return {
+        line.rsplit(' ', 1)[0]: float(line.rsplit(' ', 1)[1])
+        for line in text.splitlines() if not line.startswith('#')
+    }
+
+
+class MetricsEndpointTestCase(APITestCase):
+    """Test exposing request and OMDB API metrics"""
+    def setUp(self):
+        metrics.registry.reset()
+        circuit_breaker.reset()
+        patcher = patch.object(settings, 'METRICS_TOKEN', 'secret')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_metrics(self):
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        return get_samples(response.content.decode())
+
+    def test_require_token(self):
+        for authorization in ['', 'Bearer wrong', 'secret']:
+            response = self.client.get(
+                reverse('metrics'), HTTP_AUTHORIZATION=authorization
+            )
+            self.assertEqual(
+                response.status_code, status.HTTP_401_UNAUTHORIZED
+            )
+            self.assertEqual(response['WWW-Authenticate'], 'Bearer')
+
+    def test_disabled_without_token(self):
+        with patch.object(settings, 'METRICS_TOKEN', None):
+            response = self.client.get(
+                reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret'
+            )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_requests(self):
+        self.client.get(reverse('movie-list'))
+        self.client.get(reverse('movie-list'))
+        self.client.get('/unknown')
+        samples = self.get_metrics()
+        self.assertEqual(samples[
+            'http_requests_total{method="GET",route="movie-list",'
+            'status="200"}'
+        ], 2)
+        self.assertEqual(samples[
+            'http_requests_total{method="GET",route="unmatched",'
+            'status="404"}'
+        ], 1)
+        self.assertEqual(samples[
+            'http_request_duration_seconds_count{method="GET",'
+            'route="movie-list"}'
+        ], 2)
+        self.assertEqual(samples[
+            'http_request_duration_seconds_bucket{method="GET",'
+            'route="movie-list",le="+Inf"}'
+        ], 2)
+        # validators and movies list queries of both requests
+        self.assertEqual(
+            samples['db_queries_total{route="movie-list"}'], 6
+        )
+
+    def test_omdb_calls(self):
+        with patch('api.services.session.get',
+                   side_effect=requests.exceptions.Timeout):
+            with self.assertRaises(requests.exceptions.Timeout):
+                fetch_omdb_movie('Movie')
+        OMDBLookup.objects.create(
+            key='found', details={}, fetched='2100-01-01'
+        )
+        get_cached_omdb_movie('Found')
+        get_cached_omdb_movie('Missing')
+        get_cached_omdb_movie('Missing again')
+        samples = self.get_metrics()
+        self.assertEqual(
+            samples['omdb_requests_total{outcome="Timeout"}'], 1
+        )
+        self.assertEqual(samples['omdb_request_duration_seconds_count'], 1)
+        self.assertEqual(
+            samples['omdb_cache_lookups_total{result="hit"}'], 1
+        )
+        self.assertAlmostEqual(samples['omdb_cache_hit_ratio'], 1 / 3)
+        self.assertEqual(
+            samples['omdb_circuit_breaker_state{state="closed"}'], 1
+        )
+
+    def test_omdb_not_found(self):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'{"Response": "False"}'
+        with patch('api.services.session.get', return_value=response):
+            with self.assertRaises(requests.exceptions.HTTPError):
+                fetch_omdb_movie('Movie')
+        samples = self.get_metrics()
+        self.assertEqual(
+            samples['omdb_requests_total{outcome="not_found"}'], 1
+        )
+
+
+class MultiprocessMetricsTestCase(SimpleTestCase):
+    """Test summing metrics written by many processes"""
+    def setUp(self):
+        metrics.registry.reset()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        patcher = patch.object(settings, 'METRICS_DIR', self.directory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # file of the process is in directory of the previous test
+        patcher = patch.object(metrics.registry, 'pid', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write_process(self, name, pid, requests_count):
+        with open(os.path.join(self.directory, name), 'w') as f:
+            json.dump({
+                'pid': pid,
+                'values': [[
+                    'http_requests_total',
+                    [['method', 'GET'], ['route', 'top'], ['status', '200']],
+                    requests_count,
+                ]],
+                'gauges': [[
+                    'omdb_circuit_breaker_state', [['state', 'open']], 1,
+                ]],
+            }, f)
+
+    def test_sum_processes(self):
+        metrics.http_requests.inc(method='GET', route='top', status=200)
+        # parent of test process is alive, pids are lower than 2 ** 22
+        self.write_process('live.json', os.getppid(), 2)
+        self.write_process('dead.json', 2 ** 22 + 1, 3)
+        samples = get_samples(metrics.render())
+        self.assertEqual(samples[
+            'http_requests_total{method="GET",route="top",status="200"}'
+        ], 6)
+        self.assertEqual(samples[
+            'omdb_circuit_breaker_state{state="open",pid="%d"}' % os.getppid()
+        ], 1)
+        gauges = [name for name in samples if 'state="open"' in name]
+        self.assertEqual(len(gauges), 2)
+
+    def test_flush(self):
+        metrics.http_requests.inc(method='GET', route='top', status=200)
+        metrics.registry.flush(force=True)
+        path, = [
+            path for path in os.listdir(self.directory)
+            if path.endswith('.json')
+        ]
+        with open(os.path.join(self.directory, path)) as f:
+            data = json.load(f)
+        self.assertEqual(data['pid'], os.getpid())
+        self.assertIn(
+            ['http_requests_total',
+             [['method', 'GET'], ['route', 'top'], ['status', '200']], 1],
+            data['values'],
+        )
+
+    def test_clear_dir(self):
+        """Test if files of previous server are removed on start"""
+        self.write_process('dead.json', 2 ** 22 + 1, 3)
+        self.write_process('other.txt', 2 ** 22 + 1, 3)
+        metrics.clear_dir()
+        self.assertListEqual(os.listdir(self.directory), ['other.txt'])
+        samples = get_samples(metrics.render())
+        self.assertNotIn(
+            'http_requests_total{method="GET",route="top",status="200"}',
+            samples,
+        )
@@ -0,0 +1,72 @@
+from unittest.mock import Mock, patch
+
+from django.urls import reverse
+from django.utils.text import slugify
+from rest_framework.test import APITestCase
+
+from api.models import Movie
+from core import settings
+
+
+class RequestTimingMiddlewareTestCase(APITestCase):
+    """Test reporting request timings in Server-Timing header"""
+    def setUp(self):
+        Movie.objects.create(
+            title='First Movie',
+            details={'Title': 'First Movie'},
+            slug=slugify('First Movie')
+        )
+        patcher = patch.object(settings, 'REQUEST_TIMING', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_timings(self, response):
+        """Parse Server-Timing header to dict of durations and descs"""
+        timings = {}
+        for metric in response['Server-Timing'].split(', '):
+            name, *params = metric.split(';')
+            timings[name] = dict(param.split('=') for param in params)
+        return timings
+
+    def test_timings_header(self):
+        """Test reporting timings of movies list"""
+        response = self.client.get(reverse('movie-list'))
+        timings = self.get_timings(response)
+        self.assertListEqual(
+            list(timings), ['db', 'omdb', 'serialize', 'render', 'total']
+        )
+        # versions and last comment validators and movies list
+        self.assertEqual(timings['db']['desc'], '"3 queries"')
+        self.assertEqual(timings['omdb']['desc'], '"0 calls"')
+        for name in ('db', 'serialize', 'render', 'total'):
+            self.assertGreater(float(timings[name]['dur']), 0)
+
+    @patch('api.services.session.get')
+    def test_omdb_timings(self, mock_omdb):
+        """Test reporting time of omdbapi calls"""
+        mock_omdb.return_value = Mock(ok=True)
+        mock_omdb.return_value.json.return_value = {
+            'Title': 'Second Movie',
+            'Response': 'True',
+        }
+        response = self.client.post(
+            reverse('movie-list'), {'title': 'Second Movie'}
+        )
+        timings = self.get_timings(response)
+        self.assertEqual(timings['omdb']['desc'], '"1 calls"')
+
+    def test_timings_log(self):
+        """Test logging timings as key=value pairs"""
+        with self.assertLogs('api.middleware', 'INFO') as logs:
+            self.client.get(reverse('movie-list'))
+        self.assertRegex(
+            logs.output[0],
+            r'method=GET path=/movies/ status=200 total_ms=[\d.]+ '
+            r'db_queries=3 omdb_calls=0 db_ms=[\d.]+'
+        )
+
+    def test_disabled(self):
+        """Test if middleware isn't used when it's disabled"""
+        with patch.object(settings, 'REQUEST_TIMING', False):
+            response = self.client.get(reverse('movie-list'))
+        self.assertFalse(response.has_header('Server-Timing'))
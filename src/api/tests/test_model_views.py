@@ -1,11 +1,22 @@
+import json
+import tempfile
+from io import StringIO
 from unittest.mock import Mock, patch
 
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils.text import slugify
+from requests.exceptions import RequestException
 from rest_framework.test import APITestCase
 from rest_framework import status
 
-from api.models import Movie, Comment
+from api.models import Comment, DailyCommentCount, Movie
+from api.services import CircuitBreaker
+from api.tests.omdb_stub import OMDBStubServer
+from api.utils import get_details_hash
+from core import settings
 
 
 class CommentsViewSetListTestCase(APITestCase):
@@ -159,6 +170,73 @@ class CommentsViewSetCreateTestCase(APITestCase):
         )
 
 
+class CommentsViewSetBulkCreateTestCase(APITestCase):
+    """Test creating many comments with one request"""
+    def setUp(self):
+        self.movie = Movie.objects.create(
+            title='First Movie',
+            details={'Title': 'First Movie'},
+            slug=slugify('First Movie')
+        )
+        self.url = reverse('comment-list')
+
+    def test_create_comments(self):
+        """Test creating list of valid and invalid comments"""
+        data = [
+            {'movie_id': self.movie.id, 'comment': 'comment 1'},
+            {'movie_id': self.movie.id + 1, 'comment': 'comment 2'},
+            {'movie_id': self.movie.id, 'comment': ''},
+            {'movie_id': self.movie.id, 'comment': 'comment 4'},
+        ]
+        response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        payload = response.json()
+        self.assertListEqual(
+            [result['status'] for result in payload], [201, 400, 400, 201]
+        )
+        self.assertIn('movie_id', payload[1]['data'])
+        self.assertIn('comment', payload[2]['data'])
+        comments = Comment.objects.order_by('id')
+        self.assertListEqual(
+            [payload[0]['data'], payload[3]['data']],
+            [
+                {'id': c.id, 'movie_id': self.movie.id, 'comment': c.comment}
+                for c in comments
+            ]
+        )
+        # created timestamp is set like for single comment
+        self.assertTrue(all(comment.created for comment in comments))
+        self.assertEqual(
+            DailyCommentCount.objects.get(movie=self.movie).count, 2
+        )
+
+    def test_create_comments_in_batches(self):
+        """Test if movies are validated with one query for all comments"""
+        data = [
+            {'movie_id': self.movie.id, 'comment': str(i)} for i in range(10)
+        ]
+        with patch.object(settings, 'COMMENTS_BULK_BATCH_SIZE', 4):
+            # movies select, 3 comments inserts, rolling windows lock and
+            # select, movie counters update, rollup update and insert and
+            # 6 savepoint queries
+            with self.assertNumQueries(15):
+                self.client.post(self.url, data)
+        self.assertEqual(Comment.objects.count(), 10)
+
+    def test_create_empty_list(self):
+        """Test creating empty list of comments"""
+        response = self.client.post(self.url, [])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_create_too_many_comments(self):
+        """Test limit of comments in one request"""
+        data = [{'movie_id': self.movie.id, 'comment': 'c'}] * 3
+        with patch.object(settings, 'COMMENTS_BULK_MAX_ITEMS', 2):
+            response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Comment.objects.exists())
+
+
 class MovieViewSetCreateTestCase(APITestCase):
     """Test set focused on creating new movie's entries"""
     def setUp(self):
@@ -178,7 +256,7 @@ class MovieViewSetCreateTestCase(APITestCase):
         response = self.client.post(url, data)
         self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
 
-    @patch('api.services.requests.get')
+    @patch('api.services.session.get')
     def test_create_existing_movie_with_incomplete_title(self, mock):
         """Try to create movie which exists in database with full title"""
         movie = {
@@ -193,7 +271,28 @@ class MovieViewSetCreateTestCase(APITestCase):
         response = self.client.post(url, data)
         self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
 
-    @patch('api.services.requests.get')
+    @patch('api.services.session.get')
+    def test_create_known_title_variant(self, mock):
+        """Title resolved once is rejected without calling omdbapi"""
+        mock.return_value = Mock(ok=True)
+        mock.return_value.json.return_value = {
+            'Title': 'Third Movie',
+            'Response': 'True',
+        }
+        url = reverse('movie-list')
+        response = self.client.post(url, {'title': 'third'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        movie = Movie.objects.get(slug='third-movie')
+        self.assertEqual(
+            list(movie.aliases.values_list('slug', flat=True)), ['third']
+        )
+        mock.reset_mock()
+        with self.assertNumQueries(1):
+            response = self.client.post(url, {'title': 'Third'})
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        mock.assert_not_called()
+
+    @patch('api.services.session.get')
     def test_create_new_movie(self, mock):
         """Test creating completely new movie"""
         movies_before_request = Movie.objects.count()
@@ -210,6 +309,10 @@ class MovieViewSetCreateTestCase(APITestCase):
         response = self.client.post(url, data)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Movie.objects.count(), movies_before_request + 1)
+        # details are fresh, refresh_movies skips them
+        movie = Movie.objects.get(slug='third-movie')
+        self.assertEqual(movie.details_hash, get_details_hash(movie.details))
+        self.assertIsNotNone(movie.refreshed)
 
     def test_create_without_title(self):
         """Check title presence validation"""
@@ -252,7 +355,7 @@ class MovieViewSetListCreateTestCase(APITestCase):
         create_dummy_movie('First Movie')
         create_dummy_movie('Second Movie')
 
-    @patch('api.services.requests.get')
+    @patch('api.services.session.get')
     def test_create_movie_and_get_movies_list(self, mock):
         """Create new movie and check if it's on list"""
         movie = {
@@ -304,3 +407,265 @@ class MovieViewSetListTestCase(APITestCase):
         self.assertEqual(len(payload), 2)
         # check if all details are not empty
         self.assertTrue(all(movie['details'] for movie in payload))
+
+
+class MovieFieldsProjectionTestCase(APITestCase):
+    """Test selecting movie fields and keys of details"""
+    def setUp(self):
+        self.movie = Movie.objects.create(
+            title='First Movie',
+            details={'Title': 'First Movie', 'Year': '1985', 'Plot': 'Long'},
+            slug='first-movie',
+        )
+
+    def test_select_fields(self):
+        url = reverse('movie-list')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'fields': 'id,title'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertListEqual(
+            response.json(), [{'id': self.movie.id, 'title': 'First Movie'}]
+        )
+        # details aren't fetched from database
+        self.assertNotIn('details', queries[0]['sql'])
+
+    def test_select_details_keys(self):
+        url = reverse('movie-list')
+        response = self.client.get(url, {
+            'fields': 'title,details', 'details_keys': 'Year,Rated',
+        })
+        self.assertListEqual(response.json(), [{
+            'title': 'First Movie',
+            'details': {'Year': '1985', 'Rated': None},
+        }])
+
+    def test_select_details_keys_of_all_fields(self):
+        url = reverse('movie-list')
+        response = self.client.get(url, {'details_keys': 'Year'})
+        self.assertListEqual(response.json(), [{
+            'id': self.movie.id,
+            'title': 'First Movie',
+            'details': {'Year': '1985'},
+            'comment_count': 0,
+            'last_comment_at': None,
+        }])
+
+    def test_select_repeated_details_keys(self):
+        url = reverse('movie-list')
+        response = self.client.get(url, {
+            'fields': 'details', 'details_keys': 'Year,Year, Year',
+        })
+        self.assertListEqual(response.json(), [{'details': {'Year': '1985'}}])
+
+    def test_select_too_many_details_keys(self):
+        url = reverse('movie-list')
+        keys = ['Key{}'.format(i) for i in range(51)]
+        response = self.client.get(url, {'details_keys': ','.join(keys)})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('details_keys', response.json())
+        response = self.client.get(url, {'details_keys': ','.join(keys[:50])})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_select_unknown_field(self):
+        url = reverse('movie-list')
+        response = self.client.get(url, {'fields': 'id,plot'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', response.json())
+
+    def test_select_fields_of_page(self):
+        url = reverse('movie-list')
+        response = self.client.get(url, {'fields': 'title', 'page_size': 1})
+        self.assertListEqual(
+            response.json()['results'], [{'title': 'First Movie'}]
+        )
+
+    def test_select_fields_of_stream(self):
+        url = reverse('movie-list')
+        response = self.client.get(url, {'fields': 'title', 'stream': '1'})
+        payload = json.loads(b''.join(response.streaming_content))
+        self.assertListEqual(payload, [{'title': 'First Movie'}])
+
+    def test_select_fields_of_movie(self):
+        url = reverse('movie-detail', args=[self.movie.id])
+        response = self.client.get(
+            url, {'fields': 'id,title,details', 'details_keys': 'Plot'}
+        )
+        self.assertDictEqual(response.json(), {
+            'id': self.movie.id,
+            'title': 'First Movie',
+            'details': {'Plot': 'Long'},
+        })
+
+
+class ListPaginationTestCase(APITestCase):
+    """Test cursor pagination and streaming of movies and comments lists"""
+    def setUp(self):
+        def create_dummy_movie(title):
+            return Movie.objects.create(
+                title=title,
+                details={'Title': title},
+                slug=slugify(title)
+            )
+
+        self.movies = [
+            create_dummy_movie('Movie {}'.format(i)) for i in range(5)
+        ]
+        for i, movie in enumerate(self.movies):
+            Comment.objects.create(movie_id=movie, comment=str(i))
+
+    def fetch_all_pages(self, url, data):
+        """Follow `next` links and return ids from all pages"""
+        ids = []
+        while url:
+            response = self.client.get(url, data)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            payload = response.json()
+            ids.extend(obj['id'] for obj in payload['results'])
+            url, data = payload['next'], None
+        return ids
+
+    def test_paginate_movies(self):
+        """Test fetching movies list page by page"""
+        url = reverse('movie-list')
+        ids = self.fetch_all_pages(url, {'page_size': 2})
+        self.assertListEqual(ids, [movie.id for movie in self.movies])
+
+    def test_paginate_comments(self):
+        """Test fetching comments list page by page"""
+        url = reverse('comment-list')
+        ids = self.fetch_all_pages(url, {'page_size': 3})
+        comments = Comment.objects.order_by('id')
+        self.assertListEqual(ids, [comment.id for comment in comments])
+
+    def test_not_paginated_by_default(self):
+        """Test if list is not paginated without pagination params"""
+        url = reverse('movie-list')
+        payload = self.client.get(url).json()
+        self.assertEqual(len(payload), len(self.movies))
+
+    def test_stream_movies(self):
+        """Test streaming whole movies list"""
+        url = reverse('movie-list')
+        response = self.client.get(url, {'stream': '1'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        payload = json.loads(b''.join(response.streaming_content))
+        self.assertListEqual(
+            payload,
+            [
+                {
+                    'id': m.id, 'title': m.title, 'details': m.details,
+                    'comment_count': 1,
+                    'last_comment_at': m.last_comment_at.isoformat(),
+                }
+                for m in Movie.objects.order_by('id')
+            ]
+        )
+
+    def test_stream_comments_for_specified_movie(self):
+        """Test streaming comments filtered by movie"""
+        url = reverse('comment-list')
+        response = self.client.get(
+            url, {'stream': 'true', 'movie_id': self.movies[0].id}
+        )
+        payload = json.loads(b''.join(response.streaming_content))
+        self.assertListEqual(
+            [comment['comment'] for comment in payload], ['0']
+        )
+
+    def test_stream_comments_for_unexisting_movie(self):
+        """Test if unexisting movie is reported before streaming"""
+        url = reverse('comment-list')
+        response = self.client.get(url, {'stream': '1', 'movie_id': 0})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class MovieViewSetBulkCreateTestCase(APITestCase):
+    """Test importing many movies at once with stubbed omdbapi"""
+    def setUp(self):
+        Movie.objects.create(
+            title='First Movie',
+            details={'Title': 'First Movie'},
+            slug=slugify('First Movie')
+        )
+        self.stub = OMDBStubServer(movies={
+            'First': {'Title': 'First Movie'},
+            'Second Movie': {'Title': 'Second Movie'},
+            'Third Movie': {'Title': 'Third Movie'},
+        })
+        self.stub.__enter__()
+        self.addCleanup(self.stub.__exit__)
+        patchers = [
+            patch.object(settings, 'OMDB_API_URL', self.stub.url),
+            patch('api.services.circuit_breaker', CircuitBreaker(5, 30)),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_bulk_create(self):
+        """Test results of importing new, existing and unknown titles"""
+        url = reverse('movie-bulk')
+        response = self.client.post(url, {'titles': [
+            'Second Movie',
+            'first movie',
+            'First',
+            'Unknown Movie',
+            'Third Movie',
+            'second movie',
+        ]})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        payload = response.json()
+        self.assertListEqual(
+            [(r['title'], r['result'], r['status']) for r in payload],
+            [
+                ('Second Movie', 'created', 201),
+                ('first movie', 'exists', 409),
+                ('First', 'exists', 409),
+                ('Unknown Movie', 'not found', 503),
+                ('Third Movie', 'created', 201),
+                ('second movie', 'exists', 409),
+            ]
+        )
+        self.assertDictEqual(
+            payload[3]['data'], {'OMDB API': ['Movie not found']}
+        )
+        self.assertEqual(payload[0]['data']['title'], 'Second Movie')
+        # existing movie is not requested from omdbapi
+        self.assertCountEqual(
+            self.stub.requests,
+            ['Second Movie', 'First', 'Unknown Movie', 'Third Movie']
+        )
+        self.assertEqual(Movie.objects.count(), 3)
+        # found title variant is known since then
+        self.stub.requests.clear()
+        response = self.client.post(url, {'titles': ['first']})
+        self.assertEqual(response.json()[0]['result'], 'exists')
+        self.assertListEqual(self.stub.requests, [])
+
+    def test_bulk_create_upstream_error(self):
+        """Test reporting omdbapi failures per title"""
+        with patch('api.services.session.get', side_effect=RequestException):
+            response = self.client.post(
+                reverse('movie-bulk'), {'titles': ['Second Movie']}
+            )
+        result = response.json()[0]
+        self.assertEqual(result['result'], 'upstream error')
+        self.assertEqual(result['status'], 503)
+
+    def test_bulk_create_without_titles(self):
+        """Test validating empty titles list"""
+        response = self.client.post(reverse('movie-bulk'), {'titles': []})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_import_movies_command(self):
+        """Test importing titles from file"""
+        with tempfile.NamedTemporaryFile('w') as titles:
+            titles.write('Second Movie\n\nFirst Movie\nUnknown\n')
+            titles.flush()
+            out = StringIO()
+            call_command('import_movies', titles.name, stdout=out)
+        self.assertIn('created: 1, exists: 1, not found: 1', out.getvalue())
+        movie = Movie.objects.get(slug='second-movie')
+        self.assertEqual(movie.details_hash, get_details_hash(movie.details))
+        self.assertIsNotNone(movie.refreshed)
@@ -0,0 +1,115 @@
+import datetime
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from requests.exceptions import ConnectionError
+
+from api.models import Checkpoint, Movie
+from api.refresh import refresh_movies
+from api.utils import get_details_hash
+
+
+def get_omdb_movies(titles, **kwargs):
+    return {
+        title: ConnectionError() if title == 'Broken' else {
+            'Title': title, 'imdbRating': '8.0',
+        }
+        for title in titles
+    }
+
+
+@patch('api.refresh.get_omdb_movies', side_effect=get_omdb_movies)
+class RefreshMoviesTestCase(TestCase):
+    """Test refreshing details of movies from OMDB API"""
+    def setUp(self):
+        self.week_ago = timezone.now() - datetime.timedelta(days=7)
+        for title in ('Broken', 'Changed', 'Unchanged'):
+            Movie.objects.create(
+                title=title, details={'Title': title}, slug=title.lower(),
+                refreshed=self.week_ago,
+            )
+        unchanged = get_omdb_movies(['Unchanged'])['Unchanged']
+        Movie.objects.filter(title='Unchanged').update(
+            details=unchanged, details_hash=get_details_hash(unchanged)
+        )
+
+    def refresh(self, **kwargs):
+        kwargs.setdefault('age', 60 * 60)
+        kwargs.setdefault('batch_size', 10)
+        return list(refresh_movies(**kwargs))
+
+    def test_refresh_movies(self, mock):
+        summary, = self.refresh()
+        self.assertDictEqual(
+            dict(summary), {'updated': 1, 'unchanged': 1, 'failed': 1}
+        )
+        movies = {movie.title: movie for movie in Movie.objects.all()}
+        self.assertEqual(movies['Changed'].details['imdbRating'], '8.0')
+        self.assertEqual(
+            movies['Changed'].details_hash,
+            get_details_hash(movies['Changed'].details),
+        )
+        self.assertGreater(movies['Changed'].refreshed, self.week_ago)
+        self.assertGreater(movies['Unchanged'].refreshed, self.week_ago)
+        self.assertEqual(movies['Broken'].details, {'Title': 'Broken'})
+        self.assertEqual(movies['Broken'].refreshed, self.week_ago)
+        self.assertFalse(Checkpoint.objects.exists())
+
+    def test_update_in_bulk(self, mock):
+        """Test if batch is read and written with constant queries"""
+        for index in range(10):
+            Movie.objects.create(
+                title='Movie {}'.format(index), details={},
+                slug='movie-{}'.format(index),
+            )
+        # checkpoint select and insert, batch select, changed and unchanged
+        # movies update with movies version bump in savepoint, checkpoint
+        # update, next batch select and checkpoint delete
+        with self.assertNumQueries(11):
+            summary, = self.refresh(batch_size=20)
+        self.assertEqual(summary['updated'], 11)
+
+    def test_skip_new_movies(self, mock):
+        """Test if movie created with fetched details isn't refreshed"""
+        Movie.objects.update(refreshed=timezone.now())
+        movie = Movie(title='New', slug='new')
+        movie.set_details({'Title': 'New'})
+        movie.save()
+        self.assertListEqual(self.refresh(), [])
+        mock.assert_not_called()
+
+    def test_skip_recently_refreshed(self, mock):
+        self.assertListEqual(self.refresh(age=60 * 60 * 24 * 8), [])
+        mock.assert_not_called()
+
+    def test_resume_interrupted_refresh(self, mock):
+        batches = refresh_movies(age=60 * 60, batch_size=1)
+        next(batches)
+        # interrupted after the first batch with failed movie
+        batches.close()
+        checkpoint = Checkpoint.objects.get()
+        self.assertEqual(
+            checkpoint.position, Movie.objects.get(title='Broken').id
+        )
+
+        mock.reset_mock()
+        summaries = self.refresh(batch_size=1)
+        self.assertEqual(len(summaries), 2)
+        titles = [call[0][0] for call in mock.call_args_list]
+        self.assertListEqual(titles, [['Changed'], ['Unchanged']])
+        self.assertFalse(Checkpoint.objects.exists())
+
+    def test_restart_interrupted_refresh(self, mock):
+        batches = refresh_movies(age=60 * 60, batch_size=1)
+        next(batches)
+        batches.close()
+        summaries = self.refresh(batch_size=1, restart=True)
+        self.assertEqual(len(summaries), 3)
+
+    def test_command(self, mock):
+        out = StringIO()
+        call_command('refresh_movies', '--rate', '0', stdout=out)
+        self.assertIn('failed: 1, unchanged: 1, updated: 1', out.getvalue())
@@ -0,0 +1,88 @@
+import datetime
+import json
+from unittest import skipIf
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api import utils
+from api.models import Movie
+
+
+class RenderJSONTestCase(APITestCase):
+    """Test negotiating compact or indented JSON"""
+    def setUp(self):
+        Movie.objects.create(
+            title='First Movie', details={'Title': 'First Movie'},
+            slug='first-movie',
+        )
+
+    def test_compact_by_default(self):
+        response = self.client.get(reverse('movie-list'))
+        self.assertNotIn(b'\n', response.content)
+        self.assertNotIn(b', ', response.content)
+
+    def test_pretty_query_param(self):
+        response = self.client.get(reverse('movie-list'), {'pretty': '1'})
+        self.assertIn(b'\n  {\n    "id"', response.content)
+
+    def test_browser(self):
+        response = self.client.get(
+            reverse('movie-list'),
+            HTTP_ACCEPT='text/html,application/xhtml+xml,*/*;q=0.8',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(b'\n  {', response.content)
+
+    def test_indent_media_type_param(self):
+        response = self.client.get(
+            reverse('movie-list'), HTTP_ACCEPT='application/json; indent=4'
+        )
+        self.assertIn(b'\n    {', response.content)
+
+    @skipIf(utils.msgpack is None, 'msgpack is not installed')
+    def test_msgpack(self):
+        response = self.client.get(
+            reverse('movie-list'), HTTP_ACCEPT='application/msgpack'
+        )
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertListEqual(
+            utils.msgpack.unpackb(response.content),
+            self.client.get(reverse('movie-list')).json(),
+        )
+
+
+class DumpsTestCase(SimpleTestCase):
+    """Test compact JSON encoding with and without orjson"""
+    data = {
+        'title': 'Zażółć\u2028',
+        'year': 1985,
+        'ratings': [{'Value': '8.5/10'}],
+        'created': datetime.datetime(2018, 10, 1, 12, 30, 15, 123456),
+        'big': 2 ** 70,
+    }
+
+    def test_stdlib(self):
+        with patch.object(utils, 'orjson', None):
+            output = utils.dumps(self.data)
+        self.assertIn(b'\\u2028', output)
+        self.assertEqual(
+            json.loads(output.decode())['created'],
+            '2018-10-01T12:30:15.123456',
+        )
+
+    @skipIf(utils.orjson is None, 'orjson is not installed')
+    def test_orjson_output_as_stdlib(self):
+        data = dict(self.data)
+        del data['big']
+        with patch.object(utils, 'orjson', None):
+            expected = utils.dumps(data)
+        self.assertEqual(utils.dumps(data), expected)
+
+    def test_fallback_to_stdlib(self):
+        """Test if data which orjson can't encode is encoded by stdlib"""
+        output = json.loads(utils.dumps(self.data).decode())
+        self.assertEqual(output['big'], 2 ** 70)
@@ -0,0 +1,184 @@
+import unittest
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from api import cache as top_cache
+from api import db
+from api.db import ReplicaRouter
+from api.middleware import ReplicaMiddleware
+from api.models import Comment, Movie
+from core import settings
+
+
+class ReplicaRoutingTestCase(SimpleTestCase):
+    """Test routing reads of GET requests to replicas"""
+    def setUp(self):
+        patcher = patch.object(settings, 'DATABASE_REPLICAS', ['replica'])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(db.set_replica, None)
+        self.router = ReplicaRouter()
+
+    def handle(self, request):
+        """Run middleware like Django handler, return replica of view."""
+        used = []
+
+        def get_response(request):
+            request.resolver_match = resolve(request.path)
+            middleware.process_view(request, None, (), {})
+            used.append(db.current_replica())
+            return HttpResponse()
+
+        middleware = ReplicaMiddleware(get_response)
+        response = middleware(request)
+        self.assertIsNone(db.current_replica())
+        return used[0], response
+
+    def test_router(self):
+        self.assertEqual(self.router.db_for_read(Movie), DEFAULT_DB_ALIAS)
+        db.set_replica('replica')
+        self.assertEqual(self.router.db_for_read(Movie), 'replica')
+        self.assertEqual(self.router.db_for_write(Movie), DEFAULT_DB_ALIAS)
+        self.assertFalse(self.router.allow_migrate('replica', 'api'))
+
+    def test_read_in_transaction_from_primary(self):
+        db.set_replica('replica')
+        with patch.object(connections[DEFAULT_DB_ALIAS], 'in_atomic_block',
+                          True):
+            self.assertEqual(
+                self.router.db_for_read(Movie), DEFAULT_DB_ALIAS
+            )
+
+    def test_reading_primary(self):
+        db.set_replica('replica')
+        with db.reading_primary():
+            self.assertEqual(
+                self.router.db_for_read(Movie), DEFAULT_DB_ALIAS
+            )
+        self.assertEqual(self.router.db_for_read(Movie), 'replica')
+
+    def test_get_from_replica(self):
+        factory = RequestFactory()
+        replica, _ = self.handle(factory.get(reverse('movie-list')))
+        self.assertEqual(replica, 'replica')
+        replica, _ = self.handle(factory.get(reverse('top-series')))
+        self.assertEqual(replica, 'replica')
+        # not listed routes
+        replica, _ = self.handle(factory.get(reverse('metrics')))
+        self.assertIsNone(replica)
+        replica, _ = self.handle(factory.get(reverse('top-rolling')))
+        self.assertIsNone(replica)
+
+    def test_sticky_after_write(self):
+        factory = RequestFactory()
+        replica, response = self.handle(factory.post(reverse('movie-list')))
+        self.assertIsNone(replica)
+        cookie = response.cookies[settings.DATABASE_REPLICA_STICKY_COOKIE]
+        self.assertEqual(
+            cookie['max-age'], settings.DATABASE_REPLICA_STICKY_TIMEOUT
+        )
+
+        request = factory.get(reverse('movie-list'))
+        request.COOKIES[cookie.key] = cookie.value
+        replica, response = self.handle(request)
+        self.assertIsNone(replica)
+        self.assertNotIn(cookie.key, response.cookies)
+
+    def test_close_unusable_connections(self):
+        def make_connection(usable, health_checks=True):
+            return SimpleNamespace(
+                connection=Mock(), in_atomic_block=False,
+                settings_dict={'CONN_HEALTH_CHECKS': health_checks},
+                is_usable=Mock(return_value=usable), close=Mock(),
+                ensure_connection=Mock(),
+            )
+        broken = make_connection(False)
+        working = make_connection(True)
+        unchecked = make_connection(False, health_checks=False)
+        unused = make_connection(False)
+        connections_all = [broken, working, unchecked, unused]
+        ensure_connection = broken.ensure_connection
+        with patch.object(connections, 'all', return_value=connections_all):
+            db.check_connections_on_first_use()
+        # nothing is queried before request uses connection
+        broken.is_usable.assert_not_called()
+        for connection in (broken, working, unchecked):
+            connection.ensure_connection()
+            connection.ensure_connection()
+        broken.is_usable.assert_called_once_with()
+        broken.close.assert_called_once_with()
+        ensure_connection.assert_called_with()
+        working.is_usable.assert_called_once_with()
+        working.close.assert_not_called()
+        unchecked.is_usable.assert_not_called()
+        unused.is_usable.assert_not_called()
+
+        # connection is checked again by the next request
+        with patch.object(connections, 'all', return_value=connections_all):
+            db.check_connections_on_first_use()
+        working.ensure_connection()
+        self.assertEqual(working.is_usable.call_count, 2)
+
+
+@unittest.skipUnless(
+    settings.DATABASE_REPLICAS, 'DATABASE_REPLICA_URLS are not set'
+)
+class ReplicaDatabaseTestCase(TransactionTestCase):
+    """Test reading from replica database alias.
+
+    Run with DATABASE_REPLICA_URLS pointing at the test database, eg.
+    another local PostgreSQL alias, to exercise it.
+    """
+    multi_db = True
+
+    def setUp(self):
+        self.movie = Movie.objects.create(
+            title='First', details={'Title': 'First'}, slug='first',
+        )
+        patcher = patch.object(
+            settings, 'DATABASE_REPLICAS', settings.DATABASE_REPLICAS[:1]
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.replica = connections[settings.DATABASE_REPLICAS[0]]
+
+    def test_read_from_replica(self):
+        with CaptureQueriesContext(self.replica) as queries:
+            response = self.client.get(reverse('movie-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['title'], 'First')
+        self.assertTrue(queries.captured_queries)
+
+    def test_top_cached_from_primary(self):
+        """Test if shared top cache isn't filled with replica reads"""
+        top_cache.get_cache().clear()
+        url = reverse('top')
+        params = {'start': '2018-04-01', 'end': '2018-04-30'}
+        with CaptureQueriesContext(self.replica) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any(
+            'api_dailycommentcount' in query['sql'] and
+            'DENSE_RANK' in query['sql']
+            for query in queries.captured_queries
+        ))
+
+    def test_write_to_primary(self):
+        url = reverse('comment-list')
+        with CaptureQueriesContext(self.replica) as queries:
+            response = self.client.post(
+                url, {'movie_id': self.movie.id, 'comment': 'comment'},
+                content_type='application/json',
+            )
+            self.assertEqual(response.status_code, 201)
+            # client reads its comment from primary
+            response = self.client.get(url)
+        self.assertEqual(len(response.json()), 1)
+        self.assertListEqual(queries.captured_queries, [])
+        self.assertEqual(Comment.objects.count(), 1)
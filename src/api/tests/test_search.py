@@ -0,0 +1,107 @@
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api import search
+from api.models import Movie
+from api.refresh import update_movies
+
+
+class MovieSearchTestCase(APITestCase):
+    """Test searching movies by title and details"""
+    url = reverse('movie-search')
+
+    def setUp(self):
+        self.movies = {}
+        for title, details in [
+            ('Star Wars', {
+                'Genre': 'Action, Adventure, Fantasy',
+                'Director': 'George Lucas',
+                'Plot': 'Luke Skywalker joins forces with a Jedi Knight.',
+            }),
+            ('The Empire Strikes Back', {
+                'Genre': 'Action, Adventure, Fantasy',
+                'Director': 'Irvin Kershner',
+                'Plot': 'The Rebels are pursued across the galaxy in '
+                        'the war with the Empire.',
+            }),
+            ('Amelie', {
+                'Genre': 'Comedy, Romance',
+                'Director': 'Jean-Pierre Jeunet',
+                'Plot': 'Amelie is an innocent and naive girl in Paris.',
+            }),
+        ]:
+            self.movies[title] = Movie.objects.create(
+                title=title, details=dict(details, Title=title),
+                slug=title.lower().replace(' ', '-'),
+            )
+
+    def get_titles(self, params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [movie['title'] for movie in response.json()['results']]
+
+    def test_search_title_first(self):
+        """Test if title matches are ranked before plot matches"""
+        self.assertListEqual(
+            self.get_titles({'q': 'wars'}),
+            ['Star Wars', 'The Empire Strikes Back'],
+        )
+
+    def test_search_details(self):
+        self.assertListEqual(self.get_titles({'q': 'lucas'}), ['Star Wars'])
+        self.assertListEqual(
+            self.get_titles({'q': 'comedy paris'}), ['Amelie']
+        )
+
+    def test_results(self):
+        response = self.client.get(self.url, {'q': 'adventure'})
+        payload = response.json()
+        self.assertEqual(payload['count'], 2)
+        self.assertSetEqual(
+            set(payload['results'][0]), {
+                'id', 'title', 'details', 'comment_count', 'last_comment_at',
+                'rank',
+            }
+        )
+
+    def test_pagination(self):
+        response = self.client.get(
+            self.url, {'q': 'adventure', 'page_size': 1}
+        )
+        payload = response.json()
+        self.assertEqual(len(payload['results']), 1)
+        self.assertIsNotNone(payload['next'])
+
+    def test_vector_updated_on_write(self):
+        movie = self.movies['Amelie']
+        movie.title = 'Amelie from Montmartre'
+        movie.save()
+        self.assertListEqual(
+            self.get_titles({'q': 'montmartre'}), ['Amelie from Montmartre']
+        )
+        movie.details = {'Plot': 'A shy waitress decides to change lives.'}
+        update_movies([movie], None)
+        self.assertListEqual(self.get_titles({'q': 'waitress'}), [movie.title])
+
+    def test_pending_movies_hidden(self):
+        Movie.objects.filter(title='Amelie').update(pending=True)
+        self.assertListEqual(self.get_titles({'q': 'amelie'}), [])
+
+    def test_missing_query(self):
+        response = self.client.get(self.url, {'q': ' '})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_fuzzy(self):
+        if not search.trigram_available():
+            self.skipTest('pg_trgm extension is not installed')
+        self.assertListEqual(
+            self.get_titles({'q': 'Emprie Strike', 'fuzzy': '1'}),
+            ['The Empire Strikes Back'],
+        )
+
+    def test_fuzzy_not_available(self):
+        search._trigram_available['default'] = False
+        self.addCleanup(search._trigram_available.clear)
+        response = self.client.get(self.url, {'q': 'star', 'fuzzy': '1'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
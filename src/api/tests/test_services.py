@@ -1,14 +1,23 @@
+import datetime
+import time
 from unittest.mock import Mock, patch
 
-from requests.exceptions import RequestException
+from requests.exceptions import HTTPError, RequestException
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
 
-from api.services import get_omdb_movie
+from api.models import OMDBLookup
+from api.services import CircuitBreaker, CircuitOpenError, RateLimiter
+from api.services import create_session, fetch_omdb_movie, get_omdb_movie
+from api.tests.omdb_stub import OMDBStubServer
+from core import settings
 
 
 class OMDBAPITestCase(TestCase):
     """Test calling omdb api with movies database"""
-    @patch('api.services.requests.get')
+    @patch('api.services.session.get')
     def test_omdb_api_getting_movie_succesfully(self, mock_omdb):
         """Test getting sample movie with mocked request"""
         # set mock response
@@ -46,7 +55,7 @@ class OMDBAPITestCase(TestCase):
         # compare get_omdb_move response with mocked movie
         self.assertDictEqual(response, movie)
 
-    @patch('api.services.requests.get')
+    @patch('api.services.session.get')
     def test_omdb_api_raising_exception(self, mock_omdb):
         """Test if exception is properly rethrowed or unhandled"""
         mock_omdb.side_effect = RequestException()
@@ -57,3 +66,172 @@ class OMDBAPITestCase(TestCase):
         """Unmocked test with real api call"""
         response = get_omdb_movie('A-Ha: Take on Me')
         self.assertEqual(response['Title'], 'A-Ha: Take on Me')
+
+
+class OMDBLookupCacheTestCase(TestCase):
+    """Test caching omdb api lookups in database"""
+    def setUp(self):
+        self.movie = {'Title': 'Take on Me', 'Response': 'True'}
+
+    def mock_response(self, mock_omdb, payload):
+        mock_omdb.return_value = Mock(ok=True)
+        mock_omdb.return_value.json.return_value = payload
+
+    @patch('api.services.session.get')
+    def test_cache_found_movie(self, mock_omdb):
+        """Test if found movie is requested only once"""
+        self.mock_response(mock_omdb, self.movie)
+        self.assertDictEqual(get_omdb_movie('Take on Me'), self.movie)
+        self.assertDictEqual(get_omdb_movie(' take  ON me'), self.movie)
+        self.assertEqual(mock_omdb.call_count, 1)
+
+    @patch('api.services.session.get')
+    def test_cache_not_found_movie(self, mock_omdb):
+        """Test if not found movie is requested only once"""
+        self.mock_response(mock_omdb, {'Response': 'False'})
+        for _ in range(2):
+            with self.assertRaises(HTTPError) as cm:
+                get_omdb_movie('Take on Me')
+            self.assertEqual(cm.exception.errno, 404)
+        self.assertEqual(mock_omdb.call_count, 1)
+
+    @patch('api.services.session.get')
+    def test_failed_request_is_not_cached(self, mock_omdb):
+        """Test if failed request is retried on next call"""
+        mock_omdb.side_effect = RequestException()
+        with self.assertRaises(RequestException):
+            get_omdb_movie('Take on Me')
+        mock_omdb.side_effect = None
+        self.mock_response(mock_omdb, self.movie)
+        self.assertDictEqual(get_omdb_movie('Take on Me'), self.movie)
+        self.assertFalse(OMDBLookup.objects.filter(details=None).exists())
+
+    @patch('api.services.session.get')
+    def test_bypass_cache(self, mock_omdb):
+        """Test calling omdb api without cache"""
+        self.mock_response(mock_omdb, self.movie)
+        get_omdb_movie('Take on Me')
+        get_omdb_movie('Take on Me', use_cache=False)
+        self.assertEqual(mock_omdb.call_count, 2)
+
+    @patch('api.services.session.get')
+    def test_expired_lookup(self, mock_omdb):
+        """Test if expired lookup is requested again"""
+        self.mock_response(mock_omdb, self.movie)
+        get_omdb_movie('Take on Me')
+        OMDBLookup.objects.update(
+            fetched=timezone.now() - datetime.timedelta(
+                seconds=settings.OMDB_CACHE_FOUND_TIMEOUT + 1
+            )
+        )
+        get_omdb_movie('Take on Me')
+        self.assertEqual(mock_omdb.call_count, 2)
+
+    @patch('api.services.session.get')
+    def test_disabled_cache(self, mock_omdb):
+        """Test if lookups are not stored when timeout is 0"""
+        self.mock_response(mock_omdb, self.movie)
+        with patch.object(settings, 'OMDB_CACHE_FOUND_TIMEOUT', 0):
+            get_omdb_movie('Take on Me')
+        self.assertFalse(OMDBLookup.objects.exists())
+
+
+class OMDBSessionTestCase(TestCase):
+    """Test pooled session, retries and circuit breaker with stub omdbapi"""
+    def setUp(self):
+        self.movie = {'Title': 'Take on Me'}
+        self.breaker = CircuitBreaker(threshold=2, timeout=60)
+        patchers = [
+            patch('api.services.session', create_session(backoff_factor=0)),
+            patch('api.services.circuit_breaker', self.breaker),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def stub(self, **kwargs):
+        stub = OMDBStubServer(movies={'Take on Me': self.movie}, **kwargs)
+        url_patcher = patch.object(settings, 'OMDB_API_URL', stub.url)
+        url_patcher.start()
+        self.addCleanup(url_patcher.stop)
+        return stub
+
+    def test_keep_alive_connection(self):
+        """Test if following requests reuse the same connection"""
+        with self.stub() as stub:
+            for _ in range(3):
+                fetch_omdb_movie('Take on Me')
+        self.assertEqual(len(stub.requests), 3)
+        self.assertEqual(len(stub.connections), 1)
+
+    def test_retry_failed_request(self):
+        """Test if request failed with 5xx status is retried"""
+        with self.stub(failures=[503, 502]) as stub:
+            details = fetch_omdb_movie('Take on Me')
+        self.assertEqual(details['Title'], 'Take on Me')
+        self.assertEqual(len(stub.requests), 3)
+
+    def test_raise_after_retries(self):
+        """Test if error is raised when all retries failed"""
+        with self.stub(failures=[500, 500, 500]) as stub:
+            with self.assertRaises(HTTPError):
+                fetch_omdb_movie('Take on Me')
+        self.assertEqual(len(stub.requests), 3)
+
+    def test_open_circuit(self):
+        """Test failing fast after consecutive failures"""
+        with self.stub(failures=[500] * 6) as stub:
+            for _ in range(2):
+                with self.assertRaises(HTTPError):
+                    fetch_omdb_movie('Take on Me')
+            with self.assertRaises(CircuitOpenError):
+                fetch_omdb_movie('Take on Me')
+        self.assertEqual(len(stub.requests), 6)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_close_circuit_after_successful_trial(self):
+        """Test if successful call after timeout closes circuit"""
+        with self.stub(failures=[500] * 6):
+            for _ in range(2):
+                with self.assertRaises(HTTPError):
+                    fetch_omdb_movie('Take on Me')
+            self.breaker.opened -= self.breaker.timeout
+            self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+            fetch_omdb_movie('Take on Me')
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_reopen_circuit_after_failed_trial(self):
+        """Test if failed call after timeout opens circuit again"""
+        with self.stub(failures=[500] * 9):
+            for _ in range(2):
+                with self.assertRaises(HTTPError):
+                    fetch_omdb_movie('Take on Me')
+            self.breaker.opened -= self.breaker.timeout
+            with self.assertRaises(HTTPError):
+                fetch_omdb_movie('Take on Me')
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_open_circuit_movie_creation(self):
+        """Test if movie creation fails fast with 503 on open circuit"""
+        self.breaker.threshold = 0
+        self.breaker.record_failure()
+        with self.stub() as stub:
+            response = self.client.post(
+                reverse('movie-list'), {'title': 'Take on Me'},
+                content_type='application/json',
+            )
+        self.assertEqual(
+            response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+        self.assertListEqual(stub.requests, [])
+
+
+class RateLimiterTestCase(TestCase):
+    """Test token bucket limiting OMDB API calls"""
+    def test_limit_rate(self):
+        limiter = RateLimiter(rate=50, burst=2)
+        started = time.monotonic()
+        for _ in range(5):
+            limiter.acquire()
+        # two calls are made at once, the rest every 20ms
+        self.assertGreaterEqual(time.monotonic() - started, 0.06)
@@ -1,13 +1,22 @@
 import datetime
+import os
 import pytz
+import tempfile
+from io import StringIO
 from unittest.mock import Mock, patch
 
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
 from django.urls import reverse
 from django.utils.text import slugify
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APITransactionTestCase
 from rest_framework import status
 
-from api.models import Movie, Comment
+from api import cache as top_cache
+from api.leaderboards import advance_windows, rebuild_windows
+from api.models import Movie, Comment, DailyCommentCount, RollingWindow
+from core import settings
 
 
 class TopListTestCase(APITestCase):
@@ -160,3 +169,482 @@ class TopListTestCase(APITestCase):
             'start': '2018-01-02',
         })
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TopLimitTestCase(APITestCase):
+    """Test limiting top list to ranks and commented movies"""
+    def setUp(self):
+        top_cache.get_cache().clear()
+        self.movies = []
+        # movies with 3, 2, 2 and 0 comments
+        for index, comments in enumerate([3, 2, 2, 0]):
+            movie = Movie.objects.create(
+                title=str(index), details={}, slug=str(index)
+            )
+            self.movies.append(movie.id)
+            for _ in range(comments):
+                Comment.objects.create(movie_id=movie, comment='c')
+        self.url = reverse('top')
+        today = datetime.date.today()
+        self.range = {
+            'start': today.strftime('%Y-%m-%d'),
+            'end': today.strftime('%Y-%m-%d'),
+        }
+
+    def get_top(self, **params):
+        response = self.client.get(self.url, dict(self.range, **params))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [
+            (movie['movie_id'], movie['total_comments'], movie['rank'])
+            for movie in response.json()
+        ]
+
+    def test_limit(self):
+        self.assertListEqual(
+            self.get_top(limit=1), [(self.movies[0], 3, 1)]
+        )
+
+    def test_limit_with_ties(self):
+        self.assertListEqual(self.get_top(limit=2), [
+            (self.movies[0], 3, 1),
+            (self.movies[1], 2, 2),
+            (self.movies[2], 2, 2),
+        ])
+
+    def test_limit_with_movies_without_comments(self):
+        self.assertListEqual(
+            self.get_top(limit=3), self.get_top()
+        )
+        self.assertEqual(len(self.get_top(limit=3)), 4)
+
+    def test_min_comments(self):
+        self.assertListEqual(self.get_top(min_comments=3, limit=5), [
+            (self.movies[0], 3, 1),
+        ])
+        self.assertEqual(len(self.get_top(min_comments=1)), 3)
+
+    def test_limit_queries(self):
+        # validators, threshold and ranked rollup of commented movies
+        with self.assertNumQueries(4):
+            self.get_top(limit=2)
+
+    def test_cached_separately(self):
+        self.assertEqual(len(self.get_top()), 4)
+        self.assertEqual(len(self.get_top(limit=1)), 1)
+        self.assertEqual(len(self.get_top()), 4)
+
+    def test_invalid_params(self):
+        response = self.client.get(
+            self.url, dict(self.range, limit=0, min_comments='many')
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertSetEqual(set(response.json()), {'limit', 'min_comments'})
+
+
+class DailyCommentCountTestCase(APITestCase):
+    """Test maintaining daily comments rollup used by top list"""
+    def setUp(self):
+        self.movie = Movie.objects.create(
+            title='First Movie',
+            details={'Title': 'First Movie'},
+            slug=slugify('First Movie')
+        )
+        self.day = datetime.datetime(2018, 4, 4, 1, 2, 3)
+        with patch('django.utils.timezone.now', Mock(return_value=self.day)):
+            self.comment1 = Comment.objects.create(
+                movie_id=self.movie, comment="comment 1"
+            )
+            self.comment2 = Comment.objects.create(
+                movie_id=self.movie, comment="comment 2"
+            )
+
+    def get_counts(self):
+        return list(DailyCommentCount.objects.values_list(
+            'movie_id', 'day', 'count'
+        ))
+
+    def test_count_created_comments(self):
+        """Test if creating comments increments daily counter"""
+        self.assertListEqual(
+            self.get_counts(), [(self.movie.id, self.day.date(), 2)]
+        )
+
+    def test_count_deleted_comments(self):
+        """Test if deleting comment decrements daily counter"""
+        self.comment1.delete()
+        self.assertListEqual(
+            self.get_counts(), [(self.movie.id, self.day.date(), 1)]
+        )
+
+    def test_rebuild_comment_counts(self):
+        """Test rebuilding rollup from comments table"""
+        DailyCommentCount.objects.update(count=100)
+        call_command('rebuild_comment_counts', stdout=StringIO())
+        self.assertListEqual(
+            self.get_counts(), [(self.movie.id, self.day.date(), 2)]
+        )
+
+
+def get_file_caches(location):
+    """Return file based caches of lists and generations in `location`."""
+    backend = 'django.core.cache.backends.filebased.FileBasedCache'
+    return {
+        'default': {'BACKEND': backend, 'LOCATION': location},
+        'top-generations': {
+            'BACKEND': backend,
+            'LOCATION': os.path.join(location, 'top-generations'),
+        },
+    }
+
+
+class TopCacheTestCase(APITransactionTestCase):
+    """Test caching top lists by date range, generations are bumped on
+    commit of transactions, which aren't committed in APITestCase"""
+    def setUp(self):
+        top_cache.get_cache().clear()
+        self.movie = Movie.objects.create(
+            title='First Movie',
+            details={'Title': 'First Movie'},
+            slug=slugify('First Movie')
+        )
+        self.url = reverse('top')
+        self.april = ('2018-04-01', '2018-04-09')
+        self.may = ('2018-05-01', '2018-05-09')
+
+    def create_comment(self, created):
+        with patch('django.utils.timezone.now', Mock(return_value=created)):
+            return Comment.objects.create(movie_id=self.movie, comment="c")
+
+    def get_total_comments(self, start, end):
+        response = self.client.get(self.url, {'start': start, 'end': end})
+        return response.json()[0]['total_comments']
+
+    def test_cache_hits_and_misses(self):
+        """Test if repeated request is served from cache"""
+        self.get_total_comments(*self.april)
+        self.get_total_comments(*self.april)
+        # the same range in not normalized format
+        self.get_total_comments('2018-4-1', '2018-04-09')
+        self.assertDictEqual(
+            top_cache.top_cache_stats(), {'hits': 2, 'misses': 1}
+        )
+
+    def test_invalidate_ranges_containing_comment(self):
+        """Test if new comment invalidates only ranges with its date"""
+        self.get_total_comments(*self.april)
+        self.get_total_comments(*self.may)
+        self.create_comment(datetime.datetime(2018, 4, 9, 23, 0, 0))
+        self.assertEqual(self.get_total_comments(*self.april), 1)
+        self.assertEqual(self.get_total_comments(*self.may), 0)
+        self.assertDictEqual(
+            top_cache.top_cache_stats(), {'hits': 1, 'misses': 3}
+        )
+
+    def test_invalidate_ranges_containing_deleted_comment(self):
+        """Test if deleted comment invalidates ranges with its date"""
+        comment = self.create_comment(datetime.datetime(2018, 4, 4))
+        self.assertEqual(self.get_total_comments(*self.april), 1)
+        comment.delete()
+        self.assertEqual(self.get_total_comments(*self.april), 0)
+
+    def test_list_counted_during_invalidation(self):
+        """Test if list counted before comment write isn't served later"""
+        key = top_cache.make_key('2018-04-01', '2018-04-10')
+        self.create_comment(datetime.datetime(2018, 4, 4))
+        top_cache.set_top(key, '2018-04-10', [])
+        self.assertEqual(self.get_total_comments(*self.april), 1)
+
+    def test_invalidate_long_ranges(self):
+        """Test if ranges longer than generations of months are
+        invalidated by comments of any day"""
+        years = ('2010-01-01', '2020-01-01')
+        self.assertEqual(len(top_cache.get_generation_keys(*years)), 2)
+        self.assertEqual(self.get_total_comments(*years), 0)
+        self.create_comment(datetime.datetime(2018, 4, 4))
+        self.assertEqual(self.get_total_comments(*years), 1)
+
+    def test_generations_not_culled_with_lists(self):
+        """Test if removing cached lists keeps generations"""
+        self.create_comment(datetime.datetime(2018, 4, 4))
+        key = top_cache.make_key(*self.april)
+        top_cache.get_cache().clear()
+        self.assertEqual(top_cache.make_key(*self.april), key)
+
+    def test_invalidate_on_commit(self):
+        """Test if list counted before comment commits isn't cached under
+        the new generation"""
+        key = top_cache.make_key('2018-04-01', '2018-04-10')
+        with transaction.atomic():
+            self.create_comment(datetime.datetime(2018, 4, 4))
+            self.assertEqual(
+                top_cache.make_key('2018-04-01', '2018-04-10'), key
+            )
+        self.assertNotEqual(
+            top_cache.make_key('2018-04-01', '2018-04-10'), key
+        )
+
+    def test_rolled_back_write(self):
+        """Test if rolled back comment doesn't invalidate lists"""
+        key = top_cache.make_key('2018-04-01', '2018-04-10')
+        with transaction.atomic():
+            self.create_comment(datetime.datetime(2018, 4, 4))
+            transaction.set_rollback(True)
+        self.assertEqual(
+            top_cache.make_key('2018-04-01', '2018-04-10'), key
+        )
+
+    def test_invalidate_all_ranges_on_new_movie(self):
+        """Test if new movie is added to every cached top list"""
+        url = self.url + '?start=2018-04-01&end=2018-04-09'
+        self.assertEqual(len(self.client.get(url).json()), 1)
+        Movie.objects.create(
+            title='Second Movie',
+            details={'Title': 'Second Movie'},
+            slug=slugify('Second Movie')
+        )
+        self.assertEqual(len(self.client.get(url).json()), 2)
+
+    def test_past_range_timeout(self):
+        """Test if ranges which ended before today are cached longer in
+        shared cache"""
+        tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+        with tempfile.TemporaryDirectory() as location:
+            with override_settings(CACHES=get_file_caches(location)):
+                self.assertEqual(
+                    top_cache.get_timeout('2018-04-10'),
+                    settings.TOP_CACHE_PAST_TIMEOUT,
+                )
+                self.assertEqual(
+                    top_cache.get_timeout(tomorrow.strftime('%Y-%m-%d')),
+                    settings.TOP_CACHE_TIMEOUT,
+                )
+
+    def test_local_memory_timeout(self):
+        """Test if local memory cache, not invalidated by other processes,
+        keeps past ranges shortly"""
+        self.assertEqual(
+            top_cache.get_timeout('2018-04-10'), settings.TOP_CACHE_TIMEOUT
+        )
+
+    def test_file_based_cache(self):
+        """Test caching and invalidating top lists in file based cache"""
+        with tempfile.TemporaryDirectory() as location:
+            with override_settings(CACHES=get_file_caches(location)):
+                self.get_total_comments(*self.april)
+                self.create_comment(datetime.datetime(2018, 4, 4))
+                self.assertEqual(self.get_total_comments(*self.april), 1)
+                self.get_total_comments(*self.april)
+                self.assertDictEqual(
+                    top_cache.top_cache_stats(), {'hits': 1, 'misses': 2}
+                )
+
+
+class CommentsTimelineMixin:
+    """Two movies with comments from 2018-04-04 to 2018-04-08"""
+    def setUp(self):
+        self.movie1 = Movie.objects.create(
+            title='First Movie', details={}, slug='first-movie'
+        )
+        self.movie2 = Movie.objects.create(
+            title='Second Movie', details={}, slug='second-movie'
+        )
+        self.comments = [
+            self.create_comment(movie, datetime.datetime(2018, 4, day, 12))
+            for movie, day in [
+                (self.movie2, 4), (self.movie1, 5), (self.movie1, 6),
+                (self.movie2, 7), (self.movie1, 8),
+            ]
+        ]
+
+    def create_comment(self, movie, created):
+        with patch('django.utils.timezone.now', Mock(return_value=created)):
+            return Comment.objects.create(movie_id=movie, comment='c')
+
+    def get_movies(self, movies):
+        return [
+            (movie['movie_id'], movie['total_comments'], movie['rank'])
+            for movie in movies
+        ]
+
+
+class TopSeriesTestCase(CommentsTimelineMixin, APITestCase):
+    """Test retrieving top lists of days, weeks and months"""
+    url = reverse('top-series')
+
+    def test_days(self):
+        response = self.client.get(
+            self.url, {'period': 'day', 'count': 3, 'end': '2018-04-08'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        buckets = response.json()
+        self.assertListEqual(
+            [(bucket['start'], bucket['end']) for bucket in buckets],
+            [
+                ('2018-04-06', '2018-04-06'),
+                ('2018-04-07', '2018-04-07'),
+                ('2018-04-08', '2018-04-08'),
+            ]
+        )
+        self.assertListEqual(
+            [self.get_movies(bucket['movies']) for bucket in buckets],
+            [
+                [(self.movie1.id, 1, 1)],
+                [(self.movie2.id, 1, 1)],
+                [(self.movie1.id, 1, 1)],
+            ]
+        )
+
+    def test_weeks(self):
+        # rollup validator and all buckets ranked by one query
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                self.url, {'period': 'week', 'count': 3, 'end': '2018-04-10'}
+            )
+        buckets = response.json()
+        self.assertListEqual(
+            [(bucket['start'], bucket['end']) for bucket in buckets],
+            [
+                ('2018-03-26', '2018-04-01'),
+                ('2018-04-02', '2018-04-08'),
+                ('2018-04-09', '2018-04-10'),
+            ]
+        )
+        self.assertListEqual(buckets[0]['movies'], [])
+        self.assertListEqual(
+            self.get_movies(buckets[1]['movies']),
+            [(self.movie1.id, 3, 1), (self.movie2.id, 2, 2)]
+        )
+        self.assertListEqual(buckets[2]['movies'], [])
+
+    def test_months(self):
+        response = self.client.get(
+            self.url, {'period': 'month', 'count': 2, 'end': '2018-04-30'}
+        )
+        buckets = response.json()
+        self.assertEqual(buckets[0]['start'], '2018-03-01')
+        self.assertListEqual(
+            self.get_movies(buckets[1]['movies']),
+            [(self.movie1.id, 3, 1), (self.movie2.id, 2, 2)]
+        )
+
+    def test_invalid_params(self):
+        response = self.client.get(
+            self.url, {'period': 'year', 'count': 0, 'end': '04-2018'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertSetEqual(
+            set(response.json()), {'period', 'count', 'end'}
+        )
+
+    def test_out_of_supported_dates(self):
+        """Test if periods beyond the first or the last date are rejected"""
+        for params in [
+                {'period': 'day', 'end': '9999-12-31'},
+                {'period': 'month', 'end': '9999-12-15'},
+                {'period': 'month', 'count': 2, 'end': '0001-01-15'},
+                {'period': 'week', 'count': 3, 'end': '0001-01-08'}]:
+            response = self.client.get(self.url, params)
+            self.assertEqual(
+                response.status_code, status.HTTP_400_BAD_REQUEST, params
+            )
+            self.assertSetEqual(set(response.json()), {'end', 'count'})
+
+
+class RollingLeaderboardTestCase(CommentsTimelineMixin, APITestCase):
+    """Test rolling leaderboards counted as comments arrive"""
+    url = reverse('top-rolling')
+
+    def get_leaderboard(self, today, days=7):
+        now = datetime.datetime.combine(today, datetime.time(12))
+        with patch('django.utils.timezone.now', Mock(return_value=now)):
+            response = self.client.get(self.url, {'days': days})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return self.get_movies(response.json())
+
+    def get_rebuilt_leaderboard(self, today, days=7):
+        rebuild_windows(today)
+        return self.get_leaderboard(today, days)
+
+    def advance(self, today):
+        advance_windows(today)
+
+    def test_leaderboard(self):
+        today = datetime.date(2018, 4, 8)
+        expected = [(self.movie1.id, 3, 1), (self.movie2.id, 2, 2)]
+        self.advance(today)
+        self.assertListEqual(self.get_leaderboard(today), expected)
+        self.assertListEqual(self.get_leaderboard(today, 30), expected)
+
+    def test_leaderboard_of_not_advanced_window(self):
+        """Test if leaderboard is counted from rollup without writes"""
+        today = datetime.date(2018, 4, 8)
+        expected = [(self.movie1.id, 3, 1), (self.movie2.id, 2, 2)]
+        # window lookup and counting the rollup
+        with self.assertNumQueries(2):
+            self.assertListEqual(self.get_leaderboard(today), expected)
+        self.assertFalse(RollingWindow.objects.exists())
+        self.advance(today)
+        self.assertListEqual(
+            self.get_leaderboard(datetime.date(2018, 4, 11)),
+            [(self.movie1.id, 3, 1), (self.movie2.id, 1, 2)],
+        )
+        self.assertEqual(
+            RollingWindow.objects.get(days=7).end, today
+        )
+
+    def test_count_comments_incrementally(self):
+        today = datetime.date(2018, 4, 8)
+        self.advance(today)
+        self.create_comment(self.movie2, datetime.datetime(2018, 4, 8, 13))
+        self.create_comment(self.movie2, datetime.datetime(2018, 4, 8, 14))
+        self.comments[1].delete()
+        expected = [(self.movie2.id, 4, 1), (self.movie1.id, 2, 2)]
+        with self.assertNumQueries(2):
+            self.assertListEqual(self.get_leaderboard(today), expected)
+        self.assertListEqual(self.get_rebuilt_leaderboard(today), expected)
+
+    def test_advance_window(self):
+        self.advance(datetime.date(2018, 4, 8))
+        today = datetime.date(2018, 4, 11)
+        self.advance(today)
+        # comments from 2018-04-04 left the window
+        expected = [(self.movie1.id, 3, 1), (self.movie2.id, 1, 2)]
+        self.assertListEqual(self.get_leaderboard(today), expected)
+        self.assertListEqual(self.get_rebuilt_leaderboard(today), expected)
+        self.assertListEqual(
+            self.get_leaderboard(datetime.date(2018, 4, 20)), []
+        )
+
+    def test_count_comments_after_window_end(self):
+        self.advance(datetime.date(2018, 4, 8))
+        self.create_comment(self.movie2, datetime.datetime(2018, 4, 9, 12))
+        self.create_comment(self.movie2, datetime.datetime(2018, 4, 9, 13))
+        self.advance(datetime.date(2018, 4, 9))
+        self.assertListEqual(
+            self.get_leaderboard(datetime.date(2018, 4, 9)),
+            [(self.movie2.id, 4, 1), (self.movie1.id, 3, 2)]
+        )
+
+    def test_invalid_days(self):
+        response = self.client.get(self.url, {'days': 8})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AdvanceRollingWindowsCommandTestCase(TransactionTestCase):
+    """Test advancing rolling windows by scheduled command"""
+    def advance(self, today):
+        now = datetime.datetime.combine(today, datetime.time(0, 1))
+        out = StringIO()
+        with patch('django.utils.timezone.now', Mock(return_value=now)):
+            call_command('advance_rolling_windows', '--once', stdout=out)
+        return out.getvalue()
+
+    def test_advance(self):
+        today = datetime.date(2018, 4, 8)
+        self.assertIn('Advanced windows to 2018-04-08', self.advance(today))
+        self.assertSetEqual(
+            set(RollingWindow.objects.values_list('days', 'end')),
+            {(days, today) for days in settings.TOP_ROLLING_WINDOWS},
+        )
+        # windows end today, lock isn't taken again
+        self.assertEqual(self.advance(today), '')
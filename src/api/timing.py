@@ -0,0 +1,58 @@
+"""Timings of the current request collected by RequestTimingMiddleware.
+
+Code which takes noticeable time wraps it with `timed(name)`. When the
+middleware is disabled there are no timings to collect and `timed` does
+nothing except one thread local lookup.
+"""
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+_local = threading.local()
+
+
+class RequestTimings:
+    """Total durations (in seconds) and counts of timed operations."""
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = OrderedDict()
+        self.counts = OrderedDict()
+
+    def add(self, name, duration):
+        self.durations[name] = self.durations.get(name, 0) + duration
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    @property
+    def total(self):
+        return time.perf_counter() - self.started
+
+
+def start():
+    """Start collecting timings in the current thread."""
+    _local.timings = RequestTimings()
+    return _local.timings
+
+
+def stop():
+    _local.timings = None
+
+
+def current():
+    """Return timings collected in the current thread or None."""
+    return getattr(_local, 'timings', None)
+
+
+@contextmanager
+def timed(name):
+    """Add duration of the block to timings of the current request."""
+    timings = current()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
@@ -1,17 +1,22 @@
 from django.conf.urls import url
 from rest_framework import routers
 
-from api.views import CommentsViewSet, MovieViewSet, TopMovies
+from api.views import CommentsViewSet, MovieJobViewSet, MovieViewSet
+from api.views import TopMovies, TopRolling, TopSeries, metrics_view
 
 
 # register viewsets
 router = routers.SimpleRouter()
+router.register(r'movies/jobs', MovieJobViewSet)
 router.register(r'movies', MovieViewSet)
 # CommentsViewSet doesn't have default queryset and needs to define base_name
 router.register(r'comments', CommentsViewSet, base_name='comment')
 
 urlpatterns = [
-    url(r'^top$', TopMovies.as_view(), name='top')
+    url(r'^top$', TopMovies.as_view(), name='top'),
+    url(r'^top/series$', TopSeries.as_view(), name='top-series'),
+    url(r'^top/rolling$', TopRolling.as_view(), name='top-rolling'),
+    url(r'^metrics$', metrics_view, name='metrics'),
 ]
 
 urlpatterns += router.urls
@@ -1,10 +1,228 @@
-from rest_framework.renderers import JSONRenderer
+import calendar
+import hashlib
+import json
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from api import timing
+from core import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+# converts types unknown to encoders (dates, decimals, lazy strings...)
+encoder_default = JSONEncoder().default
+
+
+def dumps(data):
+    """Return compact JSON as bytes, encoded with orjson if installed."""
+    if orjson is not None:
+        try:
+            # dates are formatted by DRF encoder like in stdlib output
+            output = orjson.dumps(
+                data, default=encoder_default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME,
+            )
+        except TypeError:
+            # eg. integers which don't fit in 64 bits
+            pass
+        else:
+            # escape like DRF does, to keep JSON valid JavaScript
+            return output.replace(b'\xe2\x80\xa8', b'\\u2028').replace(
+                b'\xe2\x80\xa9', b'\\u2029'
+            )
+    return json.dumps(
+        data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')
+    ).replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode()
+
+
+def get_details_hash(details):
+    """Return hash of movie details independent of keys order."""
+    return hashlib.sha1(
+        json.dumps(details, sort_keys=True).encode()
+    ).hexdigest()
+
+
+def is_flag_set(params, name):
+    """Return True if param of QueryDict is set to 1, true or yes."""
+    return params.get(name, '').lower() in ('1', 'true', 'yes')
+
+
+def query_flag(request, name):
+    """Return True if query param is set to 1, true or yes."""
+    return is_flag_set(request.query_params, name)
 
 
 class IndentedJSONRenderer(JSONRenderer):
-    """JSONRenderer with default indent"""
+    """JSONRenderer indenting output for browsers and debugging.
+
+    Other clients get compact JSON, unless they send `pretty` query param
+    or `indent` parameter of media type (eg. `application/json; indent=4`).
+    """
     default_indent = 2
+    pretty_query_param = 'pretty'
 
     def get_indent(self, accepted_media_type, renderer_context):
         indent = super().get_indent(accepted_media_type, renderer_context)
-        return indent or self.default_indent
+        if indent:
+            return indent
+        request = renderer_context.get('request')
+        if request is None:
+            return None
+        if query_flag(request, self.pretty_query_param) or (
+                'text/html' in request.META.get('HTTP_ACCEPT', '')):
+            return self.default_indent
+        return None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timing.timed('render'):
+            if data is None:
+                return b''
+            indent = self.get_indent(
+                accepted_media_type, renderer_context or {}
+            )
+            if indent is None:
+                return dumps(data)
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Render data as MessagePack, it requires msgpack package."""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timing.timed('render'):
+            if data is None:
+                return b''
+            return msgpack.packb(
+                data, default=encoder_default, use_bin_type=True
+            )
+
+
+def get_timestamp(value):
+    """Return POSIX timestamp of datetime in current or UTC time zone."""
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return calendar.timegm(value.utctimetuple())
+
+
+class ConditionalGetMixin:
+    """Answer GET with 304 Not Modified if client has current response.
+
+    View returns cheap state of its data and time of the last change from
+    `get_validators`. ETag is hash of the state, query string and
+    accepted media type, so it's computed without building the response.
+    """
+    def get_validators(self, request):
+        """Return state of data (str) and last modified datetime or None."""
+        raise NotImplementedError
+
+    def get_etag(self, request, state):
+        key = '\n'.join([
+            state, request.get_full_path(), request.META.get('HTTP_ACCEPT', '')
+        ])
+        return quote_etag(hashlib.sha1(key.encode()).hexdigest())
+
+    def conditional_response(self, request, view, *args, **kwargs):
+        """Return 304 or 412 response if preconditions match or call view."""
+        state, last_modified = self.get_validators(request)
+        etag = self.get_etag(request, state)
+        if last_modified is not None:
+            last_modified = get_timestamp(last_modified)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = view(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(
+                response, public=True, must_revalidate=True,
+                max_age=settings.CONDITIONAL_GET_MAX_AGE,
+            )
+            patch_vary_headers(response, ['Accept'])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, super().list, *args, **kwargs
+        )
+
+
+class IdCursorPagination(CursorPagination):
+    """Keyset pagination on `id`.
+
+    Lists are paginated only if client sends `cursor` or `page_size`
+    query param, otherwise whole list is returned as before.
+    """
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if (self.cursor_query_param not in params and
+                self.page_size_query_param not in params):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class SearchPagination(PageNumberPagination):
+    """Pagination of search results ordered by relevance."""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class StreamingListMixin:
+    """Stream whole list as JSON array if `stream` query param is set.
+
+    Objects are fetched with `.iterator()` and serialized one by one, so
+    memory usage doesn't depend on list length. They're ordered by `id`,
+    unless filtered queryset is already ordered.
+    """
+    stream_query_param = 'stream'
+    stream_chunk_size = 500
+
+    def list(self, request, *args, **kwargs):
+        if not query_flag(request, self.stream_query_param):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        if not queryset.ordered:
+            queryset = queryset.order_by('id')
+        # database is picked now, response is streamed after the view
+        queryset = queryset.using(queryset.db)
+        return StreamingHttpResponse(
+            self.stream_json(queryset), content_type='application/json'
+        )
+
+    def stream_json(self, queryset):
+        yield b'['
+        separator = b''
+        for instance in queryset.iterator(chunk_size=self.stream_chunk_size):
+            yield separator + dumps(self.get_serializer(instance).data)
+            separator = b','
+        yield b']'
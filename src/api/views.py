@@ -1,44 +1,145 @@
 import datetime
+import hmac
 import logging
 
+from django.http import Http404, HttpResponse
+from django.utils import timezone
 from django.utils.text import slugify
-from django.db import IntegrityError
-from django.db.models import Case, F, Sum, When
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, FilteredRelation, Max, Q, Sum
 from django.db.models.expressions import Window
-from django.db.models.fields import IntegerField
 from django.db.models.functions import DenseRank, Coalesce
 from django.shortcuts import get_object_or_404
-from requests.exceptions import HTTPError, RequestException
+from requests.exceptions import RequestException
 from rest_framework import exceptions, mixins, status, viewsets, views
+from rest_framework.decorators import action
+from rest_framework.relations import PrimaryKeyRelatedField
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 
-from api.models import Comment, Movie
-from api.serializers import CommentSerializer
-from api.serializers import MovieSerializer, MovieRequestSerializer
+from api import cache as top_cache
+from api import db, leaderboards, metrics, series
+from api import search as movie_search
+from api import timing
+from api.asgi import PREFETCHED_OMDB_MOVIE
+from api.filters import MovieFilter
+from api.importer import import_movies, movie_exists_error, omdb_error
+from api.jobs import enqueue_movie, get_pending_job
+from api.locks import AdvisoryLock
+from api.models import Comment, DailyCommentCount, Movie, MovieAlias
+from api.models import MovieJob, Version
+from api.projection import MovieProjection
+from api.serializers import CommentBulkItemSerializer, CommentSerializer
+from api.serializers import MovieBulkRequestSerializer, MovieJobSerializer
+from api.serializers import MovieSearchSerializer, MovieSerializer
+from api.serializers import MovieRequestSerializer
+from api.serializers import MovieValuesSerializer
 from api.services import get_omdb_movie
+from api.signals import update_comment_counts
+from api.utils import ConditionalGetMixin, IdCursorPagination
+from api.utils import SearchPagination, StreamingListMixin, query_flag
+from core import settings
 
 
 logger = logging.getLogger(__name__)
 
+MOVIE_DOES_NOT_EXIST = PrimaryKeyRelatedField.default_error_messages[
+    'does_not_exist'
+]
 
-class MovieViewSet(mixins.ListModelMixin,
+
+class MovieViewSet(ConditionalGetMixin,
+                   StreamingListMixin,
+                   mixins.ListModelMixin,
                    mixins.RetrieveModelMixin,
                    viewsets.GenericViewSet):
     """View set providing handlers for POST and GET on /movies"""
-    queryset = Movie.objects.all()
+    # pending movies wait for details from OMDB API
+    queryset = Movie.objects.filter(pending=False)
     serializer_class = MovieSerializer
+    pagination_class = IdCursorPagination
+
+    def get_validators(self, request):
+        """Movies version is bumped on every write of movie, comment
+        counters change with time of the last comment (read from index)
+        or comment deletes version.
+        """
+        movies, deletes = Version.objects.current_all(
+            [Version.MOVIES, Version.COMMENT_DELETES]
+        )
+        last_comment_at = Movie.objects.aggregate(
+            last_comment_at=Max('last_comment_at')
+        )['last_comment_at']
+        modified = [
+            value
+            for value in (movies.modified, deletes.modified, last_comment_at)
+            if value is not None
+        ]
+        return (
+            '{}:{}:{}'.format(movies.number, deletes.number, last_comment_at),
+            max(modified, default=None),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, super().retrieve, *args, **kwargs
+        )
+
+    def get_projection(self):
+        """Return projection requested by `fields` and `details_keys`."""
+        if not hasattr(self, '_projection'):
+            self._projection = MovieProjection.from_query_params(
+                self.request.query_params
+            )
+        return self._projection
+
+    def get_movie_filter(self):
+        """Return filters and ordering requested by query params."""
+        if not hasattr(self, '_movie_filter'):
+            self._movie_filter = MovieFilter.from_query_params(
+                self.request.query_params
+            )
+        return self._movie_filter
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        queryset = self.get_movie_filter().apply(queryset)
+        projection = self.get_projection()
+        if projection is None:
+            return queryset
+        return projection.apply(queryset)
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None and self.get_movie_filter().ordering:
+            # cursor pagination keeps its own order by id
+            raise exceptions.ValidationError({
+                'ordering': ['Paginated list is always ordered by id.'],
+            })
+        return page
+
+    def get_serializer_class(self):
+        if self.get_projection() is None:
+            return super().get_serializer_class()
+        return MovieValuesSerializer
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['projection'] = self.get_projection()
+        return context
 
     def create(self, request, *args, **kwargs):
         """Create movie entry based on sent title. Handle POST on /movies
 
-        This method calls `get_omdb_movie` which requests external API.
+        This method calls `get_omdb_movie` which requests external API,
+        unless ASGI application already fetched the movie. With `async`
+        query param movie is created later by `process_movie_jobs` worker.
         """
         movie_request = MovieRequestSerializer(data=request.data)
 
         def movie_exists_response():
-            return Response({
-                'title': ['Movie with given title already exists.']
-            }, status=status.HTTP_409_CONFLICT)
+            response_status, data = movie_exists_error()
+            return Response(data, status=response_status)
 
         if not movie_request.is_valid():
             return Response(
@@ -47,48 +148,138 @@ class MovieViewSet(mixins.ListModelMixin,
 
         # get title from request
         title = movie_request.validated_data['title']
+        if query_flag(request, 'async'):
+            return self.create_async(title)
         # slugify title and try to validate it's existence
-        if Movie.objects.filter(slug=slugify(title)).exists():
+        # known title variants are rejected without calling omdbapi
+        slug = slugify(title)
+        if Movie.objects.get_known_slugs([slug]):
             return movie_exists_response()
+        # title queued by async request may still fail, so client gets
+        # its job instead of conflict
+        job = get_pending_job(slug)
+        if job is not None:
+            return self.job_response(job)
 
-        # try to get movie from omdbapi and notify if it's not possible
-        try:
-            details = get_omdb_movie(title)
-        except HTTPError as e:
-            logging.error('omdabpi http error: %s - %r', e.errno, e.strerror)
-            return Response({
-                'OMDB API': [
-                    e.strerror,
-                ],
-            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-        except RequestException as e:
-            logging.error('omdbapi raised exception: %r', e)
-            return Response({
-                'OMDB API': [
-                    'External service is unavailable. Please try again later.',
-                ],
-            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        # concurrent requests for the same title wait for the first one,
+        # which calls omdbapi and caches the lookup for the others
+        with AdvisoryLock('movie:' + slug,
+                          settings.MOVIES_CREATE_LOCK_TIMEOUT) as lock:
+            if lock.waited and Movie.objects.get_known_slugs([slug]):
+                return movie_exists_response()
 
-        title = details['Title']
-        movie = Movie(title=title, details=details, slug=slugify(title))
-        # it should throw error when slugified title exists in database
-        # and couldn't be verfied earlier (eg. incomplete title)
-        try:
-            movie.save()
-        except IntegrityError:
-            return movie_exists_response()
+            # try to get movie from omdbapi and notify if it's not possible
+            try:
+                details = self.get_omdb_movie(request, title)
+            except RequestException as e:
+                response_status, data = omdb_error(e)
+                return Response(data, status=response_status)
+
+            title = details['Title']
+            movie = Movie(title=title, slug=slugify(title))
+            movie.set_details(details)
+            # it should throw error when slugified title exists in database
+            # and couldn't be verfied earlier (eg. incomplete title)
+            try:
+                with transaction.atomic():
+                    movie.save()
+            except IntegrityError:
+                job = get_pending_job(movie.slug)
+                if job is not None:
+                    return self.job_response(job)
+                MovieAlias.objects.add({slug: movie.slug})
+                return movie_exists_response()
+            MovieAlias.objects.add({slug: movie.slug})
         logger.info('Created new movie: %s', movie.title)
         # return new movie in response
         return Response(
             MovieSerializer(movie).data, status=status.HTTP_201_CREATED
         )
 
+    def create_async(self, title):
+        """Create pending movie, respond with 202 and status of its job."""
+        job, _ = enqueue_movie(title)
+        if job is None:
+            response_status, data = movie_exists_error()
+            return Response(data, status=response_status)
+        return self.job_response(job)
+
+    def job_response(self, job):
+        """Respond with 202 and status of job creating the movie."""
+        url = reverse('moviejob-detail', args=[job.id], request=self.request)
+        data = dict(MovieJobSerializer(job).data, url=url)
+        return Response(
+            data, status=status.HTTP_202_ACCEPTED, headers={'Location': url}
+        )
+
+    @staticmethod
+    def get_omdb_movie(request, title):
+        prefetched = request.META.get(PREFETCHED_OMDB_MOVIE)
+        if prefetched is None:
+            return get_omdb_movie(title)
+        if isinstance(prefetched, Exception):
+            raise prefetched
+        return prefetched
 
-class CommentsViewSet(mixins.ListModelMixin,
+    @action(detail=False, methods=['get'], url_path='search')
+    def search(self, request, *args, **kwargs):
+        """Search movies by `q` query param. Handle GET on /movies/search
+
+        Title and details are searched by full text search, or only title
+        is compared by trigram similarity with `fuzzy` query param.
+        """
+        return self.conditional_response(request, self.search_response)
+
+    def search_response(self, request):
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            raise exceptions.ValidationError({
+                'q': ['Query parameter "q" is required.'],
+            })
+        queryset = self.get_movie_filter().filter(self.get_queryset())
+        if query_flag(request, 'fuzzy'):
+            if not movie_search.trigram_available():
+                raise exceptions.ValidationError({
+                    'fuzzy': ['Fuzzy search is not available.'],
+                })
+            queryset = movie_search.fuzzy_search(queryset, text)
+        else:
+            queryset = movie_search.search(queryset, text)
+        paginator = SearchPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = MovieSearchSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request, *args, **kwargs):
+        """Create movies for list of titles. Handle POST on /movies/bulk
+
+        Titles are fetched from external API concurrently. Response holds
+        result of each title in the same shape as POST on /movies.
+        """
+        bulk_request = MovieBulkRequestSerializer(data=request.data)
+        if not bulk_request.is_valid():
+            return Response(
+                bulk_request.errors, status=status.HTTP_400_BAD_REQUEST
+            )
+        results = import_movies(bulk_request.validated_data['titles'])
+        return Response(results)
+
+
+class MovieJobViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """View set providing handler for GET on /movies/jobs/<id>"""
+    queryset = MovieJob.objects.all()
+    serializer_class = MovieJobSerializer
+
+
+class CommentsViewSet(ConditionalGetMixin,
+                      StreamingListMixin,
+                      mixins.ListModelMixin,
                       mixins.CreateModelMixin,
                       viewsets.GenericViewSet):
     """View set providing handlers for POST and GET on /comments"""
     serializer_class = CommentSerializer
+    pagination_class = IdCursorPagination
 
     def get_queryset(self):
         """Optionally filter to `movie_id` passed in querystring."""
@@ -103,12 +294,126 @@ class CommentsViewSet(mixins.ListModelMixin,
                         'Incorrect movie_id type. Expected int.',
                     ],
                 })
-            movie = get_object_or_404(Movie, id=movie_id)
-            queryset = queryset.filter(movie_id=movie)
+            self.movie = get_object_or_404(
+                Movie.objects.filter(pending=False).only(
+                    'comment_count', 'last_comment_at'
+                ),
+                id=movie_id,
+            )
+            queryset = queryset.filter(movie_id=self.movie)
         return queryset
 
+    def get_validators(self, request):
+        """Comments are never updated, so new or deleted comment changes
+        max id or count of the list.
+
+        Comments of a movie are validated by its comment counters, read
+        together with checking the movie exists. Time of the last comment
+        doesn't move forward on deletes, so Last-Modified is the later of
+        it and the last delete of any comment.
+        """
+        queryset = self.get_queryset()
+        movie = getattr(self, 'movie', None)
+        if movie is not None:
+            state = '{}:{}'.format(movie.comment_count, movie.last_comment_at)
+            last_created = movie.last_comment_at
+        else:
+            aggregated = queryset.aggregate(
+                max_id=Max('id'), count=Count('*'),
+                last_created=Max('created'),
+            )
+            state = '{max_id}:{count}'.format(**aggregated)
+            last_created = aggregated['last_created']
+        deleted = Version.objects.current(Version.COMMENT_DELETES).modified
+        modified = [
+            value for value in (last_created, deleted) if value is not None
+        ]
+        return state, max(modified, default=None)
+
+    def create(self, request, *args, **kwargs):
+        """Create comment or list of comments. Handle POST on /comments"""
+        if isinstance(request.data, list):
+            return self.create_many(request.data)
+        return super().create(request, *args, **kwargs)
+
+    def create_many(self, items):
+        """Create comments sent as JSON array.
+
+        Movies of all comments are validated with one query and comments
+        are inserted in batches. Invalid comments don't stop creation of
+        the valid ones - result of each comment is returned in response.
+        """
+        max_items = settings.COMMENTS_BULK_MAX_ITEMS
+        if not items or len(items) > max_items:
+            return Response({
+                'non_field_errors': [
+                    'Expected list of 1 to {} comments.'.format(max_items),
+                ],
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        item_serializers = [
+            CommentBulkItemSerializer(data=item) for item in items
+        ]
+        existing_movie_ids = set(Movie.objects.filter(pending=False, id__in={
+            item_serializer.validated_data['movie_id']
+            for item_serializer in item_serializers
+            if item_serializer.is_valid()
+        }).values_list('id', flat=True))
+
+        results = []
+        # new comments by their index in results
+        comments = {}
+        for item_serializer in item_serializers:
+            if not item_serializer.is_valid():
+                results.append({
+                    'status': status.HTTP_400_BAD_REQUEST,
+                    'data': item_serializer.errors,
+                })
+                continue
+            movie_id = item_serializer.validated_data['movie_id']
+            if movie_id not in existing_movie_ids:
+                results.append({
+                    'status': status.HTTP_400_BAD_REQUEST,
+                    'data': {'movie_id': [MOVIE_DOES_NOT_EXIST.format(
+                        pk_value=movie_id
+                    )]},
+                })
+                continue
+            comments[len(results)] = Comment(
+                movie_id_id=movie_id,
+                comment=item_serializer.validated_data['comment'],
+            )
+            results.append(None)
+
+        with transaction.atomic():
+            Comment.objects.bulk_create(
+                comments.values(), batch_size=settings.COMMENTS_BULK_BATCH_SIZE
+            )
+            # signals aren't sent by bulk_create
+            update_comment_counts(comments.values(), 1)
+        for index, comment in comments.items():
+            results[index] = {
+                'status': status.HTTP_201_CREATED,
+                'data': CommentSerializer(comment).data,
+            }
+        return Response(results)
+
+
+def get_rollup_validators(start, end):
+    """Return state and last update of rollup rows from `start` to `end`
+    (exclusive), which change on every write of comment from the range.
+    """
+    rollup = DailyCommentCount.objects.filter(
+        day__gte=start, day__lt=end,
+    ).aggregate(
+        rows=Count('*'), total=Sum('count'), last_updated=Max('updated'),
+    )
+    return '{rows}:{total}:{last_updated}'.format(**rollup), (
+        rollup['last_updated']
+    )
 
-class TopMovies(views.APIView):
+
+class TopMovies(ConditionalGetMixin, views.APIView):
     """View to list top movies in specified date range."""
     def get_start_end_date_from_request(self, request):
         """Validate start and end date."""
@@ -131,6 +436,7 @@ class TopMovies(views.APIView):
         date_format = '%Y-%m-%d'
         try:
             start_date = datetime.datetime.strptime(start, date_format)
+            start = start_date.strftime(date_format)
         except ValueError:
             invalid_date['start'] = [
                 'Query parameter "start" is not in YYYY-MM-DD format.'
@@ -155,30 +461,251 @@ class TopMovies(views.APIView):
             })
         return start, end
 
-    def get(self, request):
-        """Extract dates range from query_params and return top movies."""
-        start, end = self.get_start_end_date_from_request(request)
-        # pull ranked movies sorted by number of comments in given date range
-        movies_query = Movie.objects.annotate(
-            total_comments=Coalesce(
-                Sum(Case(
-                    When(comment__created__range=[start, end], then=1),
-                    output_field=IntegerField()
-                )),
-                0
+    def get_queryset(self, start, end):
+        """Return ranked movies sorted by number of comments in range."""
+        # comments are counted from daily rollup instead of Comment table,
+        # only rollup rows from the range are joined
+        movies_query = Movie.objects.filter(pending=False).annotate(
+            range_counts=FilteredRelation(
+                'daily_comment_counts',
+                condition=Q(
+                    daily_comment_counts__day__gte=start,
+                    daily_comment_counts__day__lt=end,
+                ),
             ),
+        ).annotate(
+            total_comments=Coalesce(Sum('range_counts__count'), 0),
             rank=Window(
                 expression=DenseRank(),
                 order_by=F('total_comments').desc(),
             )
         ).order_by('-total_comments', 'id')
-        # extract needed fields to response
-        # it's too trivial to use Serializer here
+        return movies_query
+
+    def get_limits(self, request):
+        """Validate optional `limit` of ranks and `min_comments`."""
+        errors = {}
+        limits = {}
+        for param, minimum, default in [
+                ('limit', 1, None), ('min_comments', 0, 0)]:
+            value = request.query_params.get(param, None)
+            if value is None:
+                limits[param] = default
+                continue
+            try:
+                limits[param] = int(value)
+            except ValueError:
+                limits[param] = None
+            if limits[param] is None or limits[param] < minimum:
+                errors[param] = [
+                    'Query parameter "{}" should be integer greater than '
+                    'or equal {}.'.format(param, minimum)
+                ]
+        if errors:
+            raise exceptions.ValidationError(errors)
+        return limits['limit'], limits['min_comments']
+
+    def get_range_totals(self, start, end):
+        """Return query of comments number of movies commented in range."""
+        return DailyCommentCount.objects.filter(
+            day__gte=start, day__lt=end,
+        ).values('movie_id').annotate(
+            total_comments=Sum('count'),
+        ).filter(total_comments__gt=0)
+
+    def get_threshold(self, start, end, limit):
+        """Return comments number of `limit`-th rank or None if fewer
+        ranks have comments, then movies without comments are in top too.
+        """
+        totals = self.get_range_totals(start, end).values_list(
+            'total_comments', flat=True
+        ).distinct().order_by('-total_comments')
+        return next(iter(totals[limit - 1:limit]), None)
+
+    def get_commented_queryset(self, start, end, min_comments):
+        """Return ranked movies with at least `min_comments` in range.
+
+        Only rollup rows of the range are read, movies without comments
+        aren't joined.
+        """
+        return self.get_range_totals(start, end).filter(
+            total_comments__gte=min_comments,
+        ).annotate(
+            rank=Window(
+                expression=DenseRank(),
+                order_by=F('total_comments').desc(),
+            )
+        ).order_by('-total_comments', 'movie_id')
+
+    def get_validators(self, request):
+        """Every top list contains all movies, so it changes with rollup
+        rows in range and movies version.
+        """
+        start, end = self.get_start_end_date_from_request(request)
+        state, last_modified = get_rollup_validators(start, end)
+        movies = Version.objects.current(Version.MOVIES)
+        modified = [
+            value for value in (last_modified, movies.modified)
+            if value is not None
+        ]
+        return (
+            '{}:{}'.format(state, movies.number), max(modified, default=None)
+        )
+
+    def get(self, request):
+        """Extract dates range from query_params and return top movies."""
+        return self.conditional_response(request, self.get_top)
+
+    def get_top(self, request):
+        start, end = self.get_start_end_date_from_request(request)
+        limit, min_comments = self.get_limits(request)
+        variant = '' if limit is None and not min_comments else (
+            '{}:{}'.format(limit, min_comments)
+        )
+        key = top_cache.make_key(start, end, variant)
+        movies = top_cache.get_top(key)
+        if movies is not None:
+            return Response(movies)
+        # cached list is shared by all requests, so it's counted from the
+        # primary, a lagging replica could cache list older than comments
+        # which already invalidated it
+        with db.reading_primary():
+            movies = self.count_top(start, end, limit, min_comments)
+        top_cache.set_top(key, end, movies)
+        return Response(movies)
+
+    def count_top(self, start, end, limit, min_comments):
+        """Return ranked movies of range as list of dicts."""
+        # movies ranked below limit have less comments than threshold,
+        # dense ranks of movies above it don't depend on them
+        if limit is not None:
+            threshold = self.get_threshold(start, end, limit)
+            if threshold is not None:
+                min_comments = max(min_comments, threshold)
+        if min_comments > 0:
+            movies = list(self.get_commented_queryset(
+                start, end, min_comments
+            ))
+        else:
+            movies_query = list(self.get_queryset(start, end))
+            # extract needed fields to response
+            # it's too trivial to use Serializer here
+            with timing.timed('serialize'):
+                movies = [
+                    {
+                        'movie_id': movie.id,
+                        'total_comments': movie.total_comments,
+                        'rank': movie.rank
+                    } for movie in movies_query
+                ]
+        return movies
+
+
+class TopSeries(ConditionalGetMixin, views.APIView):
+    """View to list top movies in every day, week or month of a range."""
+    date_format = '%Y-%m-%d'
+
+    def get_params(self, request):
+        """Validate `period`, `count` of buckets and `end` day."""
+        errors = {}
+        params = request.query_params
+        period = params.get('period', series.DAY)
+        if period not in series.PERIODS:
+            errors['period'] = [
+                'Query parameter "period" should be one of: {}.'.format(
+                    ', '.join(series.PERIODS)
+                )
+            ]
+        max_count = settings.TOP_SERIES_MAX_BUCKETS
+        try:
+            count = int(params.get('count', 7))
+        except ValueError:
+            count = None
+        if count is None or not 0 < count <= max_count:
+            errors['count'] = [
+                'Query parameter "count" should be integer from 1 to '
+                '{}.'.format(max_count)
+            ]
+        end = params.get('end', None)
+        try:
+            end = timezone.now().date() if end is None else (
+                datetime.datetime.strptime(end, self.date_format).date()
+            )
+        except ValueError:
+            errors['end'] = [
+                'Query parameter "end" is not in YYYY-MM-DD format.'
+            ]
+        if errors:
+            raise exceptions.ValidationError(errors)
+        try:
+            # buckets and the day after `end` are read, near the limits of
+            # dates they may not exist
+            series.get_buckets(end, period, count)
+            end + datetime.timedelta(days=1)
+        except (OverflowError, ValueError):
+            message = 'Periods ending on "end" are out of supported dates.'
+            raise exceptions.ValidationError({
+                'end': [message], 'count': [message],
+            })
+        return period, count, end
+
+    def get_validators(self, request):
+        period, count, end = self.get_params(request)
+        start = series.get_buckets(end, period, count)[0][0]
+        return get_rollup_validators(
+            start, end + datetime.timedelta(days=1)
+        )
+
+    def get(self, request):
+        """Return top lists of the last `count` periods ending on `end`."""
+        return self.conditional_response(request, self.get_series)
+
+    def get_series(self, request):
+        period, count, end = self.get_params(request)
+        with timing.timed('serialize'):
+            data = series.get_series(end, period, count)
+        return Response(data)
+
+
+class TopRolling(views.APIView):
+    """View to list top movies by comments in the last days.
+
+    Rolling window leaderboards are counted incrementally as comments
+    arrive, see `api.leaderboards`.
+    """
+    def get(self, request):
+        days = request.query_params.get('days', None)
+        windows = settings.TOP_ROLLING_WINDOWS
+        if days not in [str(window) for window in windows]:
+            raise exceptions.ValidationError({
+                'days': [
+                    'Query parameter "days" should be one of: {}.'.format(
+                        ', '.join(str(window) for window in windows)
+                    )
+                ]
+            })
         movies = [
             {
-                'movie_id': movie.id,
-                'total_comments': movie.total_comments,
-                'rank': movie.rank
-            } for movie in movies_query
+                'movie_id': row['movie_id'],
+                'total_comments': row['count'],
+                'rank': row['rank'],
+            } for row in leaderboards.get_leaderboard(int(days))
         ]
-        return Response(movies)
\ No newline at end of file
+        return Response(movies)
+
+
+def metrics_view(request):
+    """Return metrics of all processes in Prometheus text format.
+
+    Metrics are served only when METRICS_TOKEN is set and request sends
+    it as bearer token.
+    """
+    if not settings.METRICS_TOKEN:
+        raise Http404
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    expected = 'Bearer ' + settings.METRICS_TOKEN
+    if not hmac.compare_digest(authorization.encode(), expected.encode()):
+        response = HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+        response['WWW-Authenticate'] = 'Bearer'
+        return response
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
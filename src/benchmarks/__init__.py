@@ -0,0 +1,13 @@
+"""Benchmarks of Movies API.
+
+They create lots of rows in database configured in settings, so point
+`DATABASE_URL` to a separate database before running them.
+"""
+import os
+
+
+def setup_django():
+    import django
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+    django.setup()
@@ -0,0 +1,55 @@
+"""Compare two JSON reports of benchmarks.endpoints.
+
+    python -m benchmarks.compare old.json new.json --threshold 10
+
+Prints change of p50, p95 and rps of endpoints present in both reports
+and exits with status 1 if any p95 got worse by more than threshold %.
+"""
+import argparse
+import json
+import sys
+
+
+def change(old, new):
+    return (new - old) / old * 100 if old else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument(
+        '--threshold', type=float, default=10,
+        help='allowed p95 regression in percents',
+    )
+    args = parser.parse_args()
+    with open(args.old) as old_file, open(args.new) as new_file:
+        old, new = json.load(old_file), json.load(new_file)
+    print('{} -> {}'.format(old.get('commit'), new.get('commit')))
+
+    regressions = 0
+    for scale, modes in new['scales'].items():
+        for mode, endpoints in modes.items():
+            old_endpoints = old['scales'].get(scale, {}).get(mode, {})
+            for name, result in endpoints.items():
+                if name not in old_endpoints:
+                    continue
+                old_result = old_endpoints[name]
+                p95_change = change(old_result['p95_ms'], result['p95_ms'])
+                regression = p95_change > args.threshold
+                regressions += regression
+                print(
+                    '{:<6} {:<10} {:<24} p50 {:>+7.1f}% p95 {:>+7.1f}% '
+                    'rps {:>+7.1f}%{}'.format(
+                        scale, mode, name,
+                        change(old_result['p50_ms'], result['p50_ms']),
+                        p95_change,
+                        change(old_result['rps'], result['rps']),
+                        '  REGRESSION' if regression else '',
+                    )
+                )
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
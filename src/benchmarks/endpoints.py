@@ -0,0 +1,342 @@
+"""Measure latency, throughput, queries and memory of API endpoints.
+
+    python -m benchmarks.endpoints --scale 1k --scale 100k --gunicorn \
+        --output bench.json
+
+For every scale database is seeded with synthetic movies and comments,
+which are deleted after it. Database has to be empty, unless `--flush`
+is given to delete its movies and comments first, so run it against a
+separate database. Endpoints are requested in-process through Django
+test client and optionally through local gunicorn. OMDB API is replaced
+with local stub server. Results are saved as JSON which can be compared
+with `python -m benchmarks.compare old.json new.json`.
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import setup_django
+from benchmarks.seed import flush, seed
+
+
+SCALES = {
+    '1k': (100, 1000),
+    '100k': (1000, 100000),
+    '1m': (10000, 1000000),
+}
+
+
+def get_requests(movie_id):
+    """Return benchmarked requests by name as (method, path, data)."""
+    today = datetime.date.today()
+    month_ago = today - datetime.timedelta(days=30)
+    top = '/top?start={}&end={}'.format(month_ago, today)
+    return {
+        'GET /movies': ('GET', '/movies/', None),
+        'GET /movies page': ('GET', '/movies/?page_size=100', None),
+        'GET /movies stream': ('GET', '/movies/?stream=1', None),
+        'GET /movies fields': (
+            'GET', '/movies/?fields=id,title&details_keys=Year', None
+        ),
+        'GET /movies/search': ('GET', '/movies/search/?q=hacker', None),
+        'GET /movies/<id>': ('GET', '/movies/{}/'.format(movie_id), None),
+        'GET /comments?movie_id': (
+            'GET', '/comments/?movie_id={}'.format(movie_id), None
+        ),
+        'GET /comments page': ('GET', '/comments/?page_size=100', None),
+        'GET /top': ('GET', top, None),
+        'GET /top limit': ('GET', top + '&limit=10', None),
+        'POST /movies': ('POST', '/movies/', 'title'),
+        'POST /comments': (
+            'POST', '/comments/', {'movie_id': movie_id, 'comment': 'Nice'}
+        ),
+    }
+
+
+# numbers of created movies titles shared by all runners
+titles_counter = itertools.count()
+
+
+def make_data(data):
+    # every created movie needs new title
+    if data == 'title':
+        title = 'Benchmark New Movie {}'.format(next(titles_counter))
+        return {'title': title}
+    return data
+
+
+def percentile(timings, percent):
+    """Return nearest-rank percentile of sorted timings."""
+    index = max(0, int(round(percent / 100 * len(timings))) - 1)
+    return timings[index]
+
+
+def summarize(timings, elapsed):
+    timings = sorted(timings)
+    return {
+        'requests': len(timings),
+        'p50_ms': percentile(timings, 50),
+        'p95_ms': percentile(timings, 95),
+        'p99_ms': percentile(timings, 99),
+        'rps': len(timings) / elapsed,
+    }
+
+
+class InProcessRunner:
+    """Request endpoints with Django test client in the current process."""
+    mode = 'in-process'
+
+    def __init__(self):
+        from django.test import Client
+
+        self.client = Client()
+
+    def request(self, method, path, data):
+        data = make_data(data)
+        if method == 'GET':
+            response = self.client.get(path)
+        else:
+            response = self.client.post(
+                path, json.dumps(data), content_type='application/json'
+            )
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        response.close()
+        assert response.status_code < 400, (path, response.status_code)
+
+    def run(self, request, count):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        # warm up caches and connection
+        self.request(*request)
+        with CaptureQueriesContext(connection) as queries:
+            self.request(*request)
+        query_count = len(queries)
+
+        tracemalloc.start()
+        self.request(*request)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        timings = []
+        started = time.perf_counter()
+        for _ in range(count):
+            request_started = time.perf_counter()
+            self.request(*request)
+            timings.append((time.perf_counter() - request_started) * 1000)
+        result = summarize(timings, time.perf_counter() - started)
+        result.update({
+            'queries': query_count,
+            'peak_memory_kb': peak_memory / 1024,
+        })
+        return result
+
+
+def get_free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class GunicornRunner:
+    """Request endpoints of local gunicorn with concurrent clients."""
+    mode = 'gunicorn'
+
+    def __init__(self, workers, concurrency, omdb_url):
+        import requests
+
+        port = get_free_port()
+        self.url = 'http://127.0.0.1:{}'.format(port)
+        self.concurrency = concurrency
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=concurrency)
+        self.session.mount('http://', adapter)
+        env = dict(os.environ, OMDB_API_URL=omdb_url)
+        self.process = subprocess.Popen(
+            [
+                sys.executable, '-c',
+                'from gunicorn.app.wsgiapp import run; run()',
+                'core.wsgi',
+                '--bind', '127.0.0.1:{}'.format(port),
+                '--workers', str(workers),
+                '--log-level', 'warning',
+            ],
+            env=env,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+        self.wait_until_ready()
+
+    def wait_until_ready(self, timeout=30):
+        import requests
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                self.session.get(self.url + '/movies/?page_size=1')
+                return
+            except requests.exceptions.ConnectionError:
+                time.sleep(0.2)
+        raise RuntimeError('gunicorn did not start')
+
+    def request(self, method, path, data):
+        data = make_data(data)
+        started = time.perf_counter()
+        response = self.session.request(
+            method, self.url + path, json=data, stream=True
+        )
+        for _ in response.iter_content(64 * 1024):
+            pass
+        assert response.status_code < 400, (path, response.status_code)
+        return (time.perf_counter() - started) * 1000
+
+    def get_peak_memory(self):
+        """Return sum of peak resident memory of gunicorn processes."""
+        pids = [self.process.pid]
+        children = '/proc/{}/task/{}/children'.format(
+            self.process.pid, self.process.pid
+        )
+        try:
+            with open(children) as children_file:
+                pids.extend(int(pid) for pid in children_file.read().split())
+            total = 0
+            for pid in pids:
+                with open('/proc/{}/status'.format(pid)) as status:
+                    for line in status:
+                        if line.startswith('VmHWM:'):
+                            total += int(line.split()[1])
+            return total
+        except OSError:
+            # /proc is not available on this system
+            return None
+
+    def run(self, request, count):
+        self.request(*request)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            started = time.perf_counter()
+            timings = list(executor.map(
+                lambda _: self.request(*request), range(count)
+            ))
+            elapsed = time.perf_counter() - started
+        result = summarize(timings, elapsed)
+        result['peak_memory_kb'] = self.get_peak_memory()
+        return result
+
+    def close(self):
+        self.process.send_signal(signal.SIGTERM)
+        self.process.wait()
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_scale(runners, count, endpoints):
+    from api.models import Movie
+
+    movie_id = Movie.objects.order_by('id').values_list('id', flat=True)[0]
+    requests = get_requests(movie_id)
+    results = {}
+    for runner in runners:
+        results[runner.mode] = {}
+        for name, request in requests.items():
+            if endpoints and name not in endpoints:
+                continue
+            result = runner.run(request, count)
+            results[runner.mode][name] = result
+            print('{:<10} {:<24} p50 {:>8.2f}ms p95 {:>8.2f}ms '
+                  'p99 {:>8.2f}ms {:>8.1f} rps'.format(
+                      runner.mode, name, result['p50_ms'], result['p95_ms'],
+                      result['p99_ms'], result['rps'],
+                  ))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--scale', action='append', choices=sorted(SCALES),
+        help='number of seeded comments, can be repeated (default: 1k)',
+    )
+    parser.add_argument(
+        '--requests', type=int, default=100,
+        help='number of requests per endpoint',
+    )
+    parser.add_argument(
+        '--endpoint', action='append',
+        help='benchmark only endpoint with given name, can be repeated',
+    )
+    parser.add_argument(
+        '--gunicorn', action='store_true',
+        help='benchmark also local gunicorn server',
+    )
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--output', help='save results as JSON to file')
+    parser.add_argument(
+        '--flush', action='store_true',
+        help='delete existing movies and comments first',
+    )
+    args = parser.parse_args()
+
+    from api.tests.omdb_stub import OMDBStubServer
+
+    with OMDBStubServer(find_all=True) as omdb:
+        os.environ['OMDB_API_URL'] = omdb.url
+        setup_django()
+        from api.models import Movie
+
+        if args.flush:
+            flush()
+        elif Movie.objects.exists():
+            parser.error(
+                'database contains movies, run with --flush to delete them'
+            )
+        report = {
+            'commit': get_commit(),
+            'date': datetime.datetime.now().isoformat(),
+            'requests': args.requests,
+            'scales': {},
+        }
+        for scale in args.scale or ['1k']:
+            movies, comments = SCALES[scale]
+            seed(movies, comments)
+            print('=== {} movies, {} comments'.format(movies, comments))
+            runners = [InProcessRunner()]
+            if args.gunicorn:
+                runners.append(GunicornRunner(
+                    args.workers, args.concurrency, omdb.url
+                ))
+            try:
+                report['scales'][scale] = run_scale(
+                    runners, args.requests, args.endpoint
+                )
+            finally:
+                for runner in runners[1:]:
+                    runner.close()
+                # only seeded rows are in the database
+                flush()
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
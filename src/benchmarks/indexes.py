@@ -0,0 +1,126 @@
+"""Compare query plans and timings without and with api indexes.
+
+    python -m benchmarks.indexes --movies 1000 --comments 100000
+
+Indexes declared in Meta of rollup model are dropped for the first run
+and created again for the second one, so they exist afterwards. Only
+queries which can use them are compared.
+"""
+import argparse
+import datetime
+import statistics
+import time
+
+from benchmarks import setup_django
+from benchmarks.seed import analyze, seed
+
+
+def get_queries():
+    """Return benchmarked querysets by name."""
+    from api.views import TopMovies
+
+    today = datetime.date.today()
+    week_ago = today - datetime.timedelta(days=7)
+    return {
+        'top 7 days': TopMovies().get_queryset(
+            week_ago.isoformat(), today.isoformat()
+        ),
+        'top 7 days commented': TopMovies().get_commented_queryset(
+            week_ago.isoformat(), today.isoformat(), 1
+        ),
+    }
+
+
+def get_indexes():
+    from api.models import DailyCommentCount
+
+    return [
+        (DailyCommentCount, index)
+        for index in DailyCommentCount._meta.indexes
+    ]
+
+
+def drop_indexes():
+    from django.db import connection
+
+    with connection.schema_editor() as editor:
+        for model, index in get_indexes():
+            editor.remove_index(model, index)
+    analyze()
+
+
+def create_indexes():
+    from django.db import connection
+
+    with connection.schema_editor() as editor:
+        for model, index in get_indexes():
+            editor.add_index(model, index)
+    analyze()
+
+
+def explain(queryset):
+    from django.db import connection
+
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (ANALYZE, BUFFERS) ' + sql, params)
+        return '\n'.join(row[0] for row in cursor.fetchall())
+
+
+def measure(queryset, repeat):
+    """Return median time of query execution in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        # evaluate fresh copy of queryset to skip its results cache
+        list(queryset.all())
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def run(repeat, verbose):
+    results = {}
+    for name, queryset in get_queries().items():
+        results[name] = measure(queryset, repeat)
+        if verbose:
+            print('--- {}\n{}\n'.format(name, explain(queryset)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--movies', type=int, default=0,
+        help='number of movies to seed before benchmark',
+    )
+    parser.add_argument(
+        '--comments', type=int, default=0,
+        help='number of comments to seed before benchmark',
+    )
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument(
+        '--quiet', action='store_true', help="don't print query plans",
+    )
+    args = parser.parse_args()
+    setup_django()
+    if args.movies:
+        seed(args.movies, args.comments)
+
+    print('=== without indexes\n')
+    drop_indexes()
+    before = run(args.repeat, not args.quiet)
+    print('=== with indexes\n')
+    create_indexes()
+    after = run(args.repeat, not args.quiet)
+
+    print('{:<20} {:>12} {:>12} {:>8}'.format(
+        'query', 'before [ms]', 'after [ms]', 'speedup'
+    ))
+    for name in before:
+        print('{:<20} {:>12.2f} {:>12.2f} {:>7.1f}x'.format(
+            name, before[name], after[name], before[name] / after[name]
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Compare speed and size of responses rendered by available renderers.
+
+    python -m benchmarks.renderers --movies 10000
+
+Movies list with OMDB API like details is rendered without database as
+indented JSON (previous default), compact JSON encoded by stdlib and by
+orjson, and MessagePack - if optional packages are installed.
+"""
+import argparse
+import statistics
+import time
+from unittest.mock import patch
+
+from benchmarks import setup_django
+
+
+def make_movies(count):
+    return [
+        {
+            'id': index,
+            'title': 'Movie {}'.format(index),
+            'details': {
+                'Title': 'Movie {}'.format(index),
+                'Year': '1985',
+                'Rated': 'N/A',
+                'Runtime': '4 min',
+                'Genre': 'Short, Music',
+                'Director': 'Steve Barron',
+                'Actors': 'A-Ha, Bunty Bailey, Morten Harket',
+                'Plot': 'This classic clip presents the story of a young '
+                        'girl who is drawn into a comic book.',
+                'Ratings': [{'Source': 'IMDB', 'Value': '8.5/10'}],
+                'imdbRating': '8.5',
+                'imdbVotes': '416',
+                'imdbID': 'tt{:07}'.format(index),
+                'Response': 'True',
+            },
+        }
+        for index in range(count)
+    ]
+
+
+def get_renderers():
+    """Return render functions by name."""
+    from rest_framework.renderers import JSONRenderer
+
+    from api import utils
+
+    def indented(data):
+        return JSONRenderer().render(data, renderer_context={'indent': 2})
+
+    def stdlib(data):
+        with patch.object(utils, 'orjson', None):
+            return utils.dumps(data)
+
+    renderers = {'indented json': indented, 'compact json': stdlib}
+    if utils.orjson is not None:
+        renderers['compact json (orjson)'] = utils.dumps
+    if utils.msgpack is not None:
+        renderers['msgpack'] = utils.MessagePackRenderer().render
+    return renderers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--movies', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+    setup_django()
+
+    movies = make_movies(args.movies)
+    for name, render in get_renderers().items():
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            output = render(movies)
+            timings.append((time.perf_counter() - started) * 1000)
+        print('{:<24} {:>10.2f}ms {:>12} bytes'.format(
+            name, statistics.median(timings), len(output)
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""Seed database with synthetic movies and comments.
+
+    python -m benchmarks.seed --movies 1000 --comments 100000
+"""
+import argparse
+import time
+
+from benchmarks import setup_django
+
+
+# size of details is close to real OMDB API response
+DETAILS = {
+    'Year': '1999',
+    'Rated': 'R',
+    'Released': '31 Mar 1999',
+    'Runtime': '136 min',
+    'Genre': 'Action, Sci-Fi',
+    'Director': 'Lana Wachowski, Lilly Wachowski',
+    'Writer': 'Lilly Wachowski, Lana Wachowski',
+    'Actors': 'Keanu Reeves, Laurence Fishburne, Carrie-Anne Moss',
+    'Plot': 'A computer hacker learns from mysterious rebels about the '
+            'true nature of his reality and his role in the war against '
+            'its controllers.',
+    'Language': 'English',
+    'Country': 'USA',
+    'Awards': 'Won 4 Oscars. Another 37 wins & 50 nominations.',
+    'Poster': 'https://m.media-amazon.com/images/M/'
+              'MV5BNzQzOTk3OTAtNDQ0Zi00ZTVkLWI0MTEtMDllZjNkYzNjNTc4L2ltYWdl'
+              'XkEyXkFqcGdeQXVyNjU0OTQ0OTY@._V1_SX300.jpg',
+    'Ratings': [
+        {'Source': 'Internet Movie Database', 'Value': '8.7/10'},
+        {'Source': 'Rotten Tomatoes', 'Value': '88%'},
+        {'Source': 'Metacritic', 'Value': '73/100'},
+    ],
+    'Metascore': '73',
+    'imdbRating': '8.7',
+    'imdbVotes': '1,496,538',
+    'Type': 'movie',
+    'DVD': '21 Sep 1999',
+    'BoxOffice': 'N/A',
+    'Production': 'Warner Bros. Pictures',
+    'Website': 'http://www.whatisthematrix.com',
+    'Response': 'True',
+}
+# comments are spread over this number of days before today
+DAYS = 365
+
+
+def seed_movies(count, batch_size=5000):
+    """Create `count` movies with realistic details, return their ids."""
+    from api.models import Movie
+
+    first = Movie.objects.count()
+    movies = []
+    for i in range(first, first + count):
+        title = 'Benchmark Movie {}'.format(i)
+        movies.append(Movie(
+            title=title,
+            details=dict(DETAILS, Title=title, imdbID='tt{:07d}'.format(i)),
+            slug='benchmark-movie-{}'.format(i),
+        ))
+    Movie.objects.bulk_create(movies, batch_size=batch_size)
+    return [movie.id for movie in movies]
+
+
+def seed_comments(count, movie_ids, days=DAYS):
+    """Create `count` comments randomly assigned to movies and days.
+
+    Comments are generated by PostgreSQL, so it's fast even for millions
+    of rows. Signals aren't sent, so comment counters of movies are set
+    by one query and rollup used by /top is rebuilt afterwards.
+    """
+    from django.core.management import call_command
+    from django.db import connection
+
+    if count:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO api_comment (movie_id_id, created, comment)
+                SELECT (%(ids)s::int[])[1 + floor(random() * %(n)s)::int],
+                       now() - random() * %(days)s * interval '1 day',
+                       'Benchmark comment ' || i
+                FROM generate_series(1, %(count)s) AS i
+                """,
+                {
+                    'ids': movie_ids,
+                    'n': len(movie_ids),
+                    'days': days,
+                    'count': count,
+                },
+            )
+            cursor.execute(
+                """
+                UPDATE api_movie
+                SET comment_count = counts.count,
+                    last_comment_at = counts.last_created
+                FROM (
+                    SELECT movie_id_id, count(*) AS count,
+                           max(created) AS last_created
+                    FROM api_comment
+                    WHERE movie_id_id = ANY(%(ids)s::int[])
+                    GROUP BY movie_id_id
+                ) AS counts
+                WHERE api_movie.id = counts.movie_id_id
+                """,
+                {'ids': movie_ids},
+            )
+    call_command('rebuild_comment_counts', batch_size=5000)
+
+
+def analyze():
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def flush():
+    """Delete all movies, comments and their rollup.
+
+    Tables are truncated, deleting through ORM would load every comment
+    and run its signals. Tables referencing movies are truncated too.
+    """
+    from django.db import connection
+
+    from api.cache import invalidate_top
+    from api.models import Comment, DailyCommentCount, Movie, Version
+
+    tables = [
+        connection.ops.quote_name(model._meta.db_table)
+        for model in (Movie, Comment, DailyCommentCount)
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute('TRUNCATE {} CASCADE'.format(', '.join(tables)))
+    # signals bumping them aren't sent
+    Version.objects.bump(Version.MOVIES)
+    invalidate_top()
+
+
+def seed(movies, comments, days=DAYS):
+    """Create movies and comments and return time it took in seconds."""
+    started = time.perf_counter()
+    movie_ids = seed_movies(movies)
+    seed_comments(comments, movie_ids, days)
+    analyze()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--movies', type=int, default=1000)
+    parser.add_argument('--comments', type=int, default=100000)
+    parser.add_argument('--days', type=int, default=DAYS)
+    parser.add_argument(
+        '--flush', action='store_true',
+        help='delete existing movies and comments first',
+    )
+    args = parser.parse_args()
+    setup_django()
+    if args.flush:
+        flush()
+    elapsed = seed(args.movies, args.comments, args.days)
+    print('Seeded {} movies and {} comments in {:.1f}s'.format(
+        args.movies, args.comments, elapsed
+    ))
+
+
+if __name__ == '__main__':
+    main()
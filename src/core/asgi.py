@@ -0,0 +1,20 @@
+"""
+ASGI config for core project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Django 2.1 has no ASGI support, requests are handled by the WSGI application
+in a thread pool, see `api.asgi`.
+"""
+
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+wsgi_application = get_wsgi_application()
+
+# api modules can be imported after Django setup
+from api.asgi import ASGIHandler  # noqa: E402
+
+application = ASGIHandler(wsgi_application)
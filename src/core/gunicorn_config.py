@@ -0,0 +1,28 @@
+"""Gunicorn settings used by web process of Procfile.
+
+    gunicorn core.wsgi --pythonpath=src --config=src/core/gunicorn_config.py
+
+Workers of one server share METRICS_DIR, by default a new directory of
+every server start (deploy), so /metrics doesn't sum counters of
+processes of previous releases.
+"""
+import os
+import tempfile
+
+
+# set before workers are forked and read settings
+os.environ.setdefault('METRICS_DIR', os.path.join(
+    tempfile.gettempdir(), 'movies-metrics-{}'.format(os.getpid())
+))
+
+
+def on_starting(server):
+    from api import metrics
+
+    metrics.clear_dir()
+
+
+def on_exit(server):
+    from api import metrics
+
+    metrics.clear_dir()